@@ -3,7 +3,7 @@ import { Container, Row, Col, Button, Alert, Spinner } from "react-bootstrap";
 import { useNavigate } from "react-router-dom"; // <-- IMPORTA useNavigate
 import AddDoctorForms from "../../components/addDoctorForms";
 import EditDoctorForm from "../../components/editDoctor";
-import { getToken, getUserRole } from "../../utils/auth";
+import { fetchPage, getUserRole } from "../../utils/auth";
 import ListDoctors from "../../components/listDoctors";
 import SearchDoctors from "../../components/searchDoctors";
 import { Doctor } from "../../utils/types";
@@ -15,6 +15,9 @@ export default function Doctors() {
   const [error, setError] = useState<string | null>(null);
   const [showForm, setShowForm] = useState(false);
   const [editingDoctor, setEditingDoctor] = useState<Doctor | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [searchTerm, setSearchTerm] = useState("");
 
   
   
@@ -23,22 +26,11 @@ export default function Doctors() {
     setError(null);
 
     try {
-      const token = getToken();
-
-      const res = await fetch("/api/doctors", {
-        headers: {
-          "Authorization": `Bearer ${token}`,
-          "Content-Type": "application/json"
-        }
-      });
-
-      if (!res.ok) {
-        throw new Error(`HTTP error ${res.status}`);
-      }
-
-      const data: Doctor[] = await res.json();
-      setDoctors(data);
-      setFilteredDoctors(data);
+      // Només la primera pàgina; la resta es demana amb "Carregar-ne més"
+      const page = await fetchPage<Doctor>("/api/doctors");
+      setDoctors(page.items);
+      setFilteredDoctors(filterDoctors(page.items, searchTerm));
+      setNextCursor(page.next);
     } catch (err) {
       console.error(err);
       setError("No s'han pogut carregar els doctors");
@@ -47,26 +39,45 @@ export default function Doctors() {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+
+    try {
+      const page = await fetchPage<Doctor>("/api/doctors", nextCursor);
+      const loaded = [...doctors, ...page.items];
+      setDoctors(loaded);
+      setFilteredDoctors(filterDoctors(loaded, searchTerm));
+      setNextCursor(page.next);
+    } catch (err) {
+      console.error(err);
+      setError("No s'han pogut carregar més doctors");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchDoctors();
   }, []);
 
-  const handleSearch = (searchTerm: string) => {
-    if (!searchTerm.trim()) {
-      setFilteredDoctors(doctors);
-      return;
-    }
+  // El servidor no té cerca de doctors: es filtren les pàgines ja carregades
+  const filterDoctors = (list: Doctor[], term: string): Doctor[] => {
+    if (!term.trim()) return list;
 
-    const lowerSearch = searchTerm.toLowerCase();
-    const filtered = doctors.filter((doctor) => {
+    const lowerSearch = term.toLowerCase();
+    return list.filter((doctor) => {
       const matchName = doctor.name?.toLowerCase().includes(lowerSearch);
       const matchUsername = doctor.username?.toLowerCase().includes(lowerSearch);
       const matchSpecialty = doctor.specialty?.toLowerCase().includes(lowerSearch);
 
       return matchName || matchUsername || matchSpecialty;
     });
+  };
 
-    setFilteredDoctors(filtered);
+  const handleSearch = (term: string) => {
+    setSearchTerm(term);
+    setFilteredDoctors(filterDoctors(doctors, term));
   };
 
   if (loading) {
@@ -157,6 +168,13 @@ export default function Doctors() {
               }}
             />
           )}
+          {nextCursor && (
+            <div className="text-center mt-3">
+              <Button variant="outline-primary" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? "Carregant…" : "Carregar-ne més"}
+              </Button>
+            </div>
+          )}
         </Col>
       </Row>
     </Container>
@@ -5,7 +5,7 @@ import { Patient } from "../../utils/types";
 import ListPatients from "../../components/listPatients";
 import SearchPatients from "../../components/searchPatinents";
 import EditPatientForm from "../../components/editPatient";
-import { getToken, getUserRole } from "../../utils/auth";
+import { fetchPage, getToken, getUserRole } from "../../utils/auth";
 import { useNavigate } from "react-router-dom"; 
 
 export default function Patients() {
@@ -15,6 +15,9 @@ export default function Patients() {
   const [error, setError] = useState<string | null>(null);
   const [showForm, setShowForm] = useState(false);EditPatientForm
   const [editingPatient, setEditingPatient] = useState<Patient | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [searching, setSearching] = useState(false);
 
 
   const fetchPatients = async () => {
@@ -22,23 +25,12 @@ export default function Patients() {
     setError(null);
 
     try {
-      const token = getToken();
-
-      const res = await fetch("api/patients", {
-        headers: {
-          "Authorization": `Bearer ${token}`,
-          "Content-Type": "application/json"
-        }
-      });
-
-      if (!res.ok) {
-        throw new Error(`HTTP error ${res.status}`);
-      }
-
-      const data: Patient[] = await res.json();
-      console.log("Patients data:", data);
-      setPatients(data);
-      setFilteredPatients(data); // ← AÑADE ESTA LÍNEA
+      // Només la primera pàgina; la resta es demana amb "Carregar-ne més"
+      const page = await fetchPage<Patient>("api/patients");
+      setPatients(page.items);
+      setFilteredPatients(page.items);
+      setNextCursor(page.next);
+      setSearching(false);
     } catch (err) {
       console.error(err);
       setError("No s'han pogut carregar els pacients");
@@ -47,6 +39,24 @@ export default function Patients() {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+
+    try {
+      const page = await fetchPage<Patient>("api/patients", nextCursor);
+      const loaded = [...patients, ...page.items];
+      setPatients(loaded);
+      setFilteredPatients(loaded);
+      setNextCursor(page.next);
+    } catch (err) {
+      console.error(err);
+      setError("No s'han pogut carregar més pacients");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchPatients();
   }, []);
@@ -64,22 +74,35 @@ export default function Patients() {
     return age;
   };
 
-  const handleSearch = (searchTerm: string) => {
+  const handleSearch = async (searchTerm: string) => {
     if (!searchTerm.trim()) {
       setFilteredPatients(patients);
+      setSearching(false);
       return;
     }
 
-    const lowerSearch = searchTerm.toLowerCase();
-    const filtered = patients.filter((patient) => {
-      const matchName = patient.name?.toLowerCase().includes(lowerSearch);
-      const matchUsername = patient.username?.toLowerCase().includes(lowerSearch);
-      const matchBirthdate = patient.birthdate?.toLowerCase().includes(lowerSearch);
-      
-      return matchName || matchUsername || matchBirthdate;
-    });
+    // La cerca es fa al servidor (índex de trigrames), no sobre la llista descarregada
+    try {
+      const token = getToken();
+
+      const params = new URLSearchParams({ q: searchTerm.trim(), limit: "100" });
+      const res = await fetch(`api/patients/search?${params}`, {
+        headers: {
+          "Authorization": `Bearer ${token}`,
+        }
+      });
 
-    setFilteredPatients(filtered);
+      if (!res.ok) {
+        throw new Error(`HTTP error ${res.status}`);
+      }
+
+      const data: Patient[] = await res.json();
+      setFilteredPatients(data);
+      setSearching(true);
+    } catch (err) {
+      console.error(err);
+      setError("No s'ha pogut fer la cerca de pacients");
+    }
   };
 
   const formatDate = (dateString: string): string => {
@@ -179,6 +202,13 @@ export default function Patients() {
           />
      
           )}
+          {!searching && nextCursor && (
+            <div className="text-center mt-3">
+              <Button variant="outline-primary" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? "Carregant…" : "Carregar-ne més"}
+              </Button>
+            </div>
+          )}
         </Col>
       </Row>
     </Container>
@@ -24,3 +24,26 @@ export const authFetcher = <T>(url: string): Promise<T> => {
     return res.json() as Promise<T>;
   });
 };
+
+// Una pàgina d'un llistat paginat i el cursor de la següent (null si és l'última)
+export interface Page<T> {
+  items: T[];
+  next: string | null;
+}
+
+// Descarrega una sola pàgina d'un llistat paginat amb JWT; `after` és el
+// cursor de la capçalera X-Next-Cursor de la pàgina anterior
+export const fetchPage = async <T>(
+  url: string,
+  after: string | null = null,
+  pageSize = 100,
+): Promise<Page<T>> => {
+  const token = getToken();
+  const params = new URLSearchParams({ limit: String(pageSize) });
+  if (after) params.set("after", after);
+  const res = await fetch(`${url}?${params}`, {
+    headers: { Authorization: `Bearer ${token}` },
+  });
+  if (!res.ok) throw new Error(`HTTP error ${res.status}`);
+  return { items: (await res.json()) as T[], next: res.headers.get("X-Next-Cursor") };
+};
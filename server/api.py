@@ -9,28 +9,78 @@ It includes dependencies for database access, OAuth2 authentication,
 and role-based access control (RBAC) to secure routes.
 """
 
-from fastapi import APIRouter, Depends, Body, Path, Query, Request, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, Depends, Body, Path, Query, Request, Response, UploadFile, File, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 import asyncpg
-from asyncpg.exceptions import UniqueViolationError
+from asyncpg.exceptions import CheckViolationError, ExclusionViolationError, UniqueViolationError
 import uuid
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, List, Optional, Tuple
 from loguru import logger
-import time
 
-from storage import client, settings
-from users import verify_password, create_access_token, get_user, decode_access_token, create_user
+from db import RECENT_WRITE_COOKIE, RLS_ROLES, PoolTimeoutError, recent_write_marker, rls_connection
+from cache import MISSING, TTLCache, notify_invalidation, register_invalidator
+from storage import storage, settings
+from pagination import NEXT_CURSOR_HEADER, PageParams, decode_cursor, encode_cursor, paginate
+from streaming import StreamParams, ndjson_response
+from serializers import FastJSONResponse, RowSerializer, json_response
+from etag import ETAG_HEADER, etag_matches, make_etag, table_versions
+from bulk import import_patients, parse_upload
+from batch import IdsParams, order_by_ids
+from metrics import InstrumentedRoute
+from users import verify_password_async, create_access_token, get_user, decode_access_token, create_user
 from model import (
     Patient, PatientCreate, PatientUpdate,
-    Doctor, DoctorCreate, DoctorUpdate,
+    Doctor, DoctorCreate, DoctorUpdate, WorkingHours, FreeInterval,
     Diagnosis, DiagnosisCreate, DiagnosisUpdate,
-    Appointment, AppointmentUpdate, AppointmentCreate,
+    Appointment, AppointmentUpdate, AppointmentCreate, AppointmentConflict,
     FileDB,
+    BulkImportReport, PatientTimeline,
     TokenResponse, UserToken
 )
 
-clinic_router = APIRouter()
+clinic_router = APIRouter(route_class=InstrumentedRoute)
+
+# Trusted row serializers used by the read endpoints (single validation pass)
+patient_rows = RowSerializer(Patient)
+doctor_rows = RowSerializer(Doctor)
+diagnosis_rows = RowSerializer(Diagnosis)
+appointment_rows = RowSerializer(Appointment)
+file_rows = RowSerializer(FileDB)
+working_hours_rows = RowSerializer(WorkingHours)
+free_interval_rows = RowSerializer(FreeInterval)
+
+# Doctor directory caches (single rows by username, list pages by (limit, after)).
+# They hold the unfiltered admin view and are invalidated by every doctor write.
+# Entries are (table versions, body[, next cursor]): the ETag of a hit is
+# derived from the versions, so hits need no database round trip.
+doctor_cache = TTLCache(settings.doctor_cache_size, settings.doctor_cache_ttl)
+doctor_page_cache = TTLCache(settings.doctor_cache_size, settings.doctor_cache_ttl)
+
+# Methods that do not write
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def invalidate_doctor(username: Optional[str]) -> None:
+    """
+    Drop the cached reads affected by a write to a doctor.
+
+    Called directly by the write handlers and, for writes made by any
+    worker, by the cache invalidation listener.
+
+    Args:
+        username (Optional[str]): Username of the doctor created, updated or
+            deleted, or None to drop every cached doctor.
+    """
+    if username is None:
+        doctor_cache.clear()
+    else:
+        doctor_cache.invalidate(username)
+    doctor_page_cache.clear()
+
+
+register_invalidator("doctor", invalidate_doctor)
 
 # -------------------------------
 # DATABASE DEPENDENCY
@@ -53,11 +103,17 @@ def get_postgres(request: Request) -> asyncpg.Pool:
 # -------------------------------
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserToken:
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> UserToken:
     """
     Decode JWT token and return the current user.
 
+    Requests other than GET/HEAD/OPTIONS are recorded as writes of the user
+    in ``request.state.writer``; their response then carries the recent
+    write cookie, which keeps the user's reads on the primary for a while
+    (see db.ReadYourWritesMiddleware and get_read_postgres).
+
     Args:
+        request (Request): FastAPI request object.
         token (str): JWT token from Authorization header.
 
     Raises:
@@ -73,9 +129,35 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserToken:
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if request.method not in SAFE_METHODS:
+        request.state.writer = user.username
     return user
 
 
+# -------------------------------
+# READ POOL DEPENDENCY
+# -------------------------------
+def get_read_postgres(request: Request, user: UserToken = Depends(get_current_user)) -> asyncpg.Pool:
+    """
+    Dependency to provide the pool read handlers query.
+
+    That is the read replica pool when one is configured, except for users
+    who wrote in the last ``settings.read_your_writes_window`` seconds, as
+    told by the recent write cookie their write set: they are served by
+    the primary so they see their own changes.
+
+    Args:
+        request (Request): FastAPI request object.
+        user (UserToken): Authenticated user.
+
+    Returns:
+        asyncpg.Pool: Replica or primary pool.
+    """
+    if request.cookies.get(RECENT_WRITE_COOKIE) == recent_write_marker(user.username):
+        return request.app.state.pool
+    return request.app.state.read_pool
+
+
 # -------------------------------
 # ROLE DEPENDENCY
 # -------------------------------
@@ -96,6 +178,122 @@ def require_role(allowed_roles: List[str]):
     return role_checker
 
 
+# -------------------------------
+# USER-SCOPED CONNECTION DEPENDENCY
+# -------------------------------
+async def get_db_connection(
+    user: UserToken = Depends(get_current_user),
+    db_pool: asyncpg.Pool = Depends(get_read_postgres),
+) -> AsyncIterator[asyncpg.Connection]:
+    """
+    Dependency providing a connection that runs as the user's database role.
+
+    Read handlers use it so the row-level security policies filter what
+    patients and doctors can see. The connection comes from the read pool
+    (see get_read_postgres) and is released after the response has been
+    sent.
+
+    Args:
+        user (UserToken): Authenticated user.
+        db_pool (asyncpg.Pool): Pool to read from.
+
+    Yields:
+        asyncpg.Connection: Connection inside a read-only, role-scoped transaction.
+    """
+    async with rls_connection(db_pool, user) as conn:
+        yield conn
+
+
+async def get_read_connection(
+    db_pool: asyncpg.Pool = Depends(get_read_postgres),
+) -> AsyncIterator[asyncpg.Connection]:
+    """
+    Dependency providing a read-pool connection without role scoping.
+
+    For read handlers whose answer does not depend on what the caller may
+    see (e.g. a doctor's free time). The connection is released after the
+    response has been sent.
+
+    Args:
+        db_pool (asyncpg.Pool): Pool to read from.
+
+    Yields:
+        asyncpg.Connection: Connection from the read pool.
+    """
+    async with db_pool.acquire() as conn:
+        yield conn
+
+
+# -------------------------------
+# CONDITIONAL GET DEPENDENCY
+# -------------------------------
+# Tables each family of read endpoints depends on: its own table plus the
+# ones its RLS policies look at.
+PATIENT_TABLES = ("patients", "diagnosis")
+DOCTOR_TABLES = ("doctors", "diagnosis")
+DIAGNOSIS_TABLES = ("diagnosis",)
+APPOINTMENT_TABLES = ("appointments",)
+FILE_TABLES = ("files", "diagnosis", "appointments")
+TIMELINE_TABLES = ("patients", "diagnosis", "appointments", "files")
+WORKING_HOURS_TABLES = ("doctor_working_hours",)
+AVAILABILITY_TABLES = ("doctor_working_hours", "appointments")
+
+
+def apply_etag(request: Request, response: Response, user: UserToken, versions: Tuple[int, ...]) -> None:
+    """
+    Answer 304 if the client already holds this response, else set its ETag.
+
+    Args:
+        request (Request): FastAPI request object.
+        response (Response): Response on which the ETag is set.
+        user (UserToken): Authenticated user.
+        versions (Tuple[int, ...]): Change counters the response was built from.
+
+    Raises:
+        HTTPException: 304 when If-None-Match matches the ETag.
+    """
+    etag = make_etag(
+        versions, user.username, user.role,
+        request.url.path, request.url.query, request.headers.get("accept", ""),
+    )
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers={ETAG_HEADER: etag})
+    response.headers[ETAG_HEADER] = etag
+
+
+def conditional_get(tables: Tuple[str, ...], connection: Callable = get_db_connection):
+    """
+    Dependency factory adding ETag / If-None-Match support to a read route.
+
+    The ETag is derived from the change counters of ``tables``, the caller
+    and the request URL. If the client already holds the current version
+    the request ends here with 304, before the body is queried or
+    serialized; otherwise the ETag is set on the response.
+
+    The counters are read on the request's own connection: ``connection``
+    must be the dependency the handler takes its connection from, so that
+    FastAPI resolves it once and a conditional read holds a single pool
+    connection. It also means the counters come from the same pool as the
+    body, so a lagging replica never pairs a new ETag with an old body.
+
+    Declare it after ``require_role`` so forbidden requests still get 403.
+
+    Args:
+        tables (Tuple[str, ...]): Tables the response depends on.
+        connection (Callable): Connection dependency of the handler,
+            get_db_connection (role-scoped) or get_read_connection.
+
+    Returns:
+        Callable: A dependency that raises HTTP 304 when the client copy is current.
+    """
+    async def check_etag(
+        request: Request,
+        response: Response,
+        user: UserToken = Depends(get_current_user),
+        conn: asyncpg.Connection = Depends(connection),
+    ) -> None:
+        apply_etag(request, response, user, await table_versions(conn, tables))
+    return check_etag
 
 
 # -------------------------------
@@ -120,7 +318,7 @@ async def login_for_access_token(
         TokenResponse: Access token for authenticated user.
     """
     user_row = await get_user(form_data.username, pool)
-    if not user_row or not verify_password(form_data.password, user_row["hashed_password"]):
+    if not user_row or not await verify_password_async(form_data.password, user_row["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -221,50 +419,167 @@ async def create_patient(
 
     except UniqueViolationError:
         raise HTTPException(status_code=400, detail="Username already exists")
+    except PoolTimeoutError:
+        raise  # 503 from the handler in main.py
     except Exception as e:
         logger.error(f"Error creating patient: {e}")
         raise HTTPException(status_code=500, detail="Internal error creating patient")
 
 
-@clinic_router.get("/patients", response_model=List[Patient], dependencies=[Depends(require_role(["admin", "doctor", "patient"]))])
-async def list_patients(
+@clinic_router.post("/patients/bulk", response_model=BulkImportReport, dependencies=[Depends(require_role(["admin"]))])
+async def bulk_create_patients(
+    request: Request,
     db_pool: asyncpg.Pool = Depends(get_postgres),
-) -> List[Patient]:
+) -> BulkImportReport:
     """
-    Retrieve a list of all patients.
+    Create many patients from a CSV or NDJSON upload.
+
+    The body is streamed: CSV (``text/csv``, header row with username,
+    name and birthDate) or NDJSON (``application/x-ndjson``, one
+    PatientCreate object per line). Rows are validated, copied into a
+    staging table and merged in one transaction; invalid, repeated and
+    already existing usernames are skipped and reported.
 
     Args:
+        request (Request): FastAPI request object (body read as a stream).
         db_pool (asyncpg.Pool): Database connection pool.
 
     Raises:
-        HTTPException: If database query fails.
+        HTTPException: 415 for an unsupported Content-Type.
 
     Returns:
-        List[Patient]: List of all patients in the system.
+        BulkImportReport: Counters and details of the skipped rows.
     """
-    query = "SELECT username, name, birthDate FROM patients ORDER BY username"
+    rows = parse_upload(request.headers.get("content-type", ""), request.stream())
 
-    try:
-        async with db_pool.acquire() as conn:
-            rows = await conn.fetch(query)
-        return [Patient(**r) for r in rows]
+    async with db_pool.acquire() as conn:
+        async with conn.transaction():
+            report = await import_patients(conn, rows)
 
-    except Exception as e:
-        logger.error(f"Error fetching patients: {e}")
-        raise HTTPException(status_code=500, detail="Error fetching patients")
+    logger.info(
+        f"Bulk patient import: {report.inserted} inserted, "
+        f"{report.conflicts} conflicts, {report.invalid} invalid"
+    )
+    return report
+
+
+@clinic_router.get("/patients", response_model=List[Patient], dependencies=[Depends(require_role(["admin", "doctor", "patient"])), Depends(conditional_get(PATIENT_TABLES))])
+async def list_patients(
+    response: Response,
+    page: PageParams = Depends(),
+    conn: asyncpg.Connection = Depends(get_db_connection),
+) -> List[Patient]:
+    """
+    Retrieve a page of patients ordered by username.
+
+    Args:
+        response (Response): Response on which the next cursor header is set.
+        page (PageParams): Page size and cursor of the previous page.
+        conn (asyncpg.Connection): Connection scoped to the user's database role.
+
+    Raises:
+        HTTPException: 400 if the cursor is invalid.
+
+    Returns:
+        List[Patient]: Patients of the requested page.
+    """
+    if page.after:
+        (after_username,) = decode_cursor(page.after, (str,))
+        query = """
+            SELECT username, name, birthDate FROM patients
+            WHERE username > $2
+            ORDER BY username LIMIT $1
+        """
+        args = (page.limit + 1, after_username)
+    else:
+        query = "SELECT username, name, birthDate FROM patients ORDER BY username LIMIT $1"
+        args = (page.limit + 1,)
+
+    rows = await conn.fetch(query, *args)
+    rows = paginate(rows, page.limit, ("username",), response)
+    return json_response(patient_rows.dump_many(rows), response)
+
+
+@clinic_router.get("/patients/search", response_model=List[Patient], dependencies=[Depends(require_role(["admin", "doctor", "patient"])), Depends(conditional_get(PATIENT_TABLES))])
+async def search_patients(
+    response: Response,
+    q: Optional[str] = Query(None, max_length=100),
+    year: Optional[int] = Query(None, ge=1800, le=9999),
+    limit: int = Query(20, ge=1, le=100),
+    conn: asyncpg.Connection = Depends(get_db_connection),
+) -> List[Patient]:
+    """
+    Search patients by name or username, optionally filtered by birth year.
+
+    Name and username are matched by substring or trigram similarity using
+    the pg_trgm GIN indexes, and results are ranked by similarity. A query
+    made only of a four-digit number is treated as a birth year.
+
+    Args:
+        response (Response): Response carrying the ETag header.
+        q (Optional[str]): Text to search in name and username.
+        year (Optional[int]): Birth year to filter on.
+        limit (int): Maximum number of results.
+        conn (asyncpg.Connection): Connection scoped to the user's database role.
+
+    Raises:
+        HTTPException: If neither a search term nor a year is given.
+
+    Returns:
+        List[Patient]: Best matching patients, most similar first.
+    """
+    term = (q or "").strip()
+    if year is None and term.isdigit() and len(term) == 4:
+        year, term = int(term), ""
+
+    if not term and year is None:
+        raise HTTPException(status_code=400, detail="A search term or year is required")
+
+    conditions = []
+    args: list = [limit]
+
+    if term:
+        args.append(term)
+        escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        args.append(f"%{escaped}%")
+        conditions.append(
+            "(name ILIKE $3 OR username ILIKE $3 OR name % $2 OR username % $2)"
+        )
+        order_by = "GREATEST(similarity(name, $2), similarity(username, $2)) DESC, username"
+    else:
+        order_by = "username"
+
+    if year is not None:
+        args.append(year)
+        n = len(args)
+        conditions.append(f"birthDate >= make_date(${n}, 1, 1) AND birthDate < make_date(${n} + 1, 1, 1)")
+
+    query = f"""
+        SELECT username, name, birthDate
+        FROM patients
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {order_by}
+        LIMIT $1
+    """
 
+    rows = await conn.fetch(query, *args)
 
-@clinic_router.get("/patients/{username}", response_model=Patient, dependencies=[Depends(require_role(["admin", "doctor", "patient"]))])
+    return json_response(patient_rows.dump_many(rows), response)
+
+
+@clinic_router.get("/patients/{username}", response_model=Patient, dependencies=[Depends(require_role(["admin", "doctor", "patient"])), Depends(conditional_get(PATIENT_TABLES))])
 async def get_patient(
     username: str,
-    db_pool: asyncpg.Pool = Depends(get_postgres),
+    response: Response,
+    conn: asyncpg.Connection = Depends(get_db_connection),
 ):
     """
     Retrieve a single patient by username.
 
     Args:
         username (str): Patient username to query.
-        db_pool (asyncpg.Pool): Database connection pool.
+        response (Response): Response carrying the ETag header.
+        conn (asyncpg.Connection): Connection scoped to the user's database role.
 
     Raises:
         HTTPException: If patient not found or database error occurs.
@@ -275,19 +590,143 @@ async def get_patient(
     query = "SELECT username, name, birthDate FROM patients WHERE username=$1"
 
     try:
-        async with db_pool.acquire() as conn:
-            row = await conn.fetchrow(query, username)
+        row = await conn.fetchrow(query, username)
 
         if not row:
             raise HTTPException(status_code=404, detail="Patient not found")
 
-        return Patient(**row)
+        return json_response(patient_rows.dump_one(row), response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching patient: {e}")
         raise HTTPException(status_code=500, detail="Internal error fetching patient")
 
 
+# Events of a patient merged into one date-ordered stream. Each branch of
+# the UNION ALL reads at most one page (plus one row) of its table, newest
+# first, through its (patient_id, date, id) index; the cursor predicate
+# ({diagnosis_after}, ... see TIMELINE_AFTER) is applied inside each branch,
+# so later pages start the index scans at the cursor. The page CTE then
+# merges the three short lists.
+TIMELINE_QUERY = """
+    WITH events AS (
+        (SELECT 'diagnosis' AS type, id_diagnosis AS id, diagnosis_date::timestamp AS event_date,
+            json_build_object(
+                'id_diagnosis', id_diagnosis, 'diagnosis_date', diagnosis_date, 'icd', icd,
+                'description', description, 'patient_id', patient_id, 'doctor_id', doctor_id
+            ) AS data
+        FROM diagnosis WHERE patient_id = $1 {diagnosis_after}
+        ORDER BY diagnosis_date DESC, id_diagnosis DESC
+        LIMIT $2 + 1)
+        UNION ALL
+        (SELECT 'appointment', id_appointment, appointment_date,
+            json_build_object(
+                'id_appointment', id_appointment, 'appointment_date', appointment_date,
+                'duration_minutes', duration_minutes, 'status', status, 'reason', reason,
+                'patient_id', patient_id, 'doctor_id', doctor_id
+            )
+        FROM appointments WHERE patient_id = $1 {appointment_after}
+        ORDER BY appointment_date DESC, id_appointment DESC
+        LIMIT $2 + 1)
+        UNION ALL
+        (SELECT 'file', id_file, uploaded_at,
+            json_build_object(
+                'id_file', id_file, 'file_name', file_name, 'original_name', original_name,
+                'url', url, 'mime_type', mime_type, 'uploaded_at', uploaded_at,
+                'patient_id', patient_id, 'doctor_id', doctor_id,
+                'diagnosis_id', diagnosis_id, 'appointment_id', appointment_id
+            )
+        FROM files WHERE patient_id = $1 {file_after}
+        ORDER BY uploaded_at DESC, id_file DESC
+        LIMIT $2 + 1)
+    ),
+    page AS (
+        SELECT *, row_number() OVER (ORDER BY event_date DESC, type DESC, id DESC) AS n
+        FROM events
+        ORDER BY event_date DESC, type DESC, id DESC
+        LIMIT $2 + 1
+    )
+    SELECT
+        json_build_object(
+            'patient', json_build_object('username', p.username, 'name', p.name, 'birthdate', p.birthdate),
+            'events', (
+                SELECT COALESCE(
+                    json_agg(json_build_object('type', type, 'id', id, 'date', event_date, 'data', data) ORDER BY n),
+                    '[]'
+                )
+                FROM page WHERE n <= $2
+            )
+        )::text AS body,
+        last.event_date, last.type, last.id
+    FROM patients p
+    LEFT JOIN page last ON last.n = $2 AND EXISTS (SELECT 1 FROM page WHERE n > $2)
+    WHERE p.username = $1
+"""
+
+# Cursor predicate of one timeline branch: events before ($3 date, $4 type,
+# $5 id) in the (event_date, type, id) order. The plain date bound is
+# implied by the row comparison and lets the index scan start at the cursor.
+TIMELINE_AFTER = (
+    "AND {date} <= $3::timestamp "
+    "AND ({date}::timestamp, '{type}'::text, {id}) < ($3::timestamp, $4::text, $5::int)"
+)
+TIMELINE_BRANCHES = {
+    "diagnosis": ("diagnosis_date", "id_diagnosis"),
+    "appointment": ("appointment_date", "id_appointment"),
+    "file": ("uploaded_at", "id_file"),
+}
+
+
+@clinic_router.get("/patients/{username}/timeline", response_model=PatientTimeline, dependencies=[Depends(require_role(["admin", "doctor", "patient"])), Depends(conditional_get(TIMELINE_TABLES))])
+async def get_patient_timeline(
+    username: str,
+    response: Response,
+    page: PageParams = Depends(),
+    conn: asyncpg.Connection = Depends(get_db_connection),
+):
+    """
+    Retrieve a patient with their diagnoses, appointments and files merged
+    into one history, most recent first.
+
+    The whole document is built by a single query (UNION ALL of the three
+    tables, aggregated with json_agg) and sent without re-serializing it.
+    Pages are cut by date: the X-Next-Cursor header holds the position of
+    the last event returned.
+
+    Args:
+        username (str): Patient username.
+        response (Response): Response on which the next cursor header is set.
+        page (PageParams): Number of events and cursor of the previous page.
+        conn (asyncpg.Connection): Connection scoped to the user's database role.
+
+    Raises:
+        HTTPException: 404 if the patient is not found, 400 if the cursor is invalid.
+
+    Returns:
+        PatientTimeline: The patient and a page of their history.
+    """
+    if page.after:
+        after = decode_cursor(page.after, (datetime.fromisoformat, str, int))
+        query = TIMELINE_QUERY.format(**{
+            f"{kind}_after": TIMELINE_AFTER.format(date=date, type=kind, id=key)
+            for kind, (date, key) in TIMELINE_BRANCHES.items()
+        })
+        args = (username, page.limit, *after)
+    else:
+        query = TIMELINE_QUERY.format(**{f"{kind}_after": "" for kind in TIMELINE_BRANCHES})
+        args = (username, page.limit)
+
+    row = await conn.fetchrow(query, *args)
+    if not row:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    if row["id"] is not None:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([row["event_date"], row["type"], row["id"]])
+    return json_response(row["body"].encode(), response)
+
+
 @clinic_router.patch("/patients/{username}", response_model=Patient, dependencies=[Depends(require_role(["admin"]))])
 async def update_patient(
     username: str,
@@ -325,6 +764,10 @@ async def update_patient(
 
         return Patient(**row)
 
+    except HTTPException:
+        raise
+    except PoolTimeoutError:
+        raise  # 503 from the handler in main.py
     except Exception as e:
         logger.error(f"Error updating patient: {e}")
         raise HTTPException(status_code=500, detail="Internal error updating patient")
@@ -359,6 +802,10 @@ async def delete_patient(
 
         return {"message": f"Patient {username} deleted"}
 
+    except HTTPException:
+        raise
+    except PoolTimeoutError:
+        raise  # 503 from the handler in main.py
     except Exception as e:
         logger.error(f"Error deleting patient: {e}")
         raise HTTPException(status_code=500, detail="Internal error deleting patient")
@@ -395,36 +842,107 @@ async def create_doctor(
     try:
         async with db_pool.acquire() as conn:
             row = await conn.fetchrow(query, doctor.username, doctor.name, doctor.specialty)
+            if row:
+                await notify_invalidation(conn, "doctor", doctor.username)
 
         if not row:
             raise HTTPException(status_code=500, detail="Failed to create doctor")
 
+        # Local caches are dropped right away; other workers follow the NOTIFY
+        invalidate_doctor(doctor.username)
         return Doctor(**row)
 
     except UniqueViolationError:
         raise HTTPException(status_code=400, detail="Doctor username already exists")
+    except PoolTimeoutError:
+        raise  # 503 from the handler in main.py
     except Exception as e:
         logger.error(f"Error creating doctor: {e}")
         raise HTTPException(status_code=500, detail="Internal error creating doctor")
 
 
 @clinic_router.get("/doctors", response_model=List[Doctor], dependencies=[Depends(require_role(["admin"]))])
-async def list_doctors(db_pool: asyncpg.Pool = Depends(get_postgres)):
-    query = "SELECT username, name, specialty FROM doctors ORDER BY username"
-    async with db_pool.acquire() as conn:
-        rows = await conn.fetch(query)
-    return [Doctor(**r) for r in rows]
+async def list_doctors(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    user: UserToken = Depends(get_current_user),
+    db_pool: asyncpg.Pool = Depends(get_read_postgres),
+):
+    """
+    Retrieve a page of doctors ordered by username.
+
+    Pages are served from the doctor directory cache when possible. A hit
+    needs no database connection at all: entries keep the table counters
+    they were read with, and the ETag is derived from those, so a cached
+    body is always sent under its own ETag. Entries live until a doctor
+    write invalidates them (directly in this worker, by NOTIFY in the
+    others) or their TTL runs out.
+
+    Args:
+        request (Request): FastAPI request object.
+        response (Response): Response on which the next cursor header is set.
+        page (PageParams): Page size and cursor of the previous page.
+        user (UserToken): Authenticated user.
+        db_pool (asyncpg.Pool): Pool to read from on a cache miss.
+
+    Returns:
+        List[Doctor]: Doctors of the requested page.
+    """
+    key = (page.limit, page.after)
+    generation = doctor_page_cache.generation
+    cached = doctor_page_cache.get(key)
+
+    if cached is MISSING:
+        if page.after:
+            (after_username,) = decode_cursor(page.after, (str,))
+            query = """
+                SELECT username, name, specialty FROM doctors
+                WHERE username > $2
+                ORDER BY username LIMIT $1
+            """
+            args = (page.limit + 1, after_username)
+        else:
+            query = "SELECT username, name, specialty FROM doctors ORDER BY username LIMIT $1"
+            args = (page.limit + 1,)
+
+        async with rls_connection(db_pool, user) as conn:
+            versions = await table_versions(conn, DOCTOR_TABLES)
+            rows = await conn.fetch(query, *args)
+        rows = paginate(rows, page.limit, ("username",), response)
+        cached = (versions, doctor_rows.dump_many(rows), response.headers.get(NEXT_CURSOR_HEADER))
+        doctor_page_cache.set(key, cached, generation)
 
+    versions, body, next_cursor = cached
+    apply_etag(request, response, user, versions)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return json_response(body, response)
 
 
 @clinic_router.get("/doctors/{username}", response_model=Doctor, dependencies=[Depends(require_role(["admin", "doctor", "patient"]))])
-async def get_doctor(username: str, db_pool: asyncpg.Pool = Depends(get_postgres)):
+async def get_doctor(
+    username: str,
+    request: Request,
+    response: Response,
+    user: UserToken = Depends(get_current_user),
+    db_pool: asyncpg.Pool = Depends(get_read_postgres),
+):
     """
     Retrieve a single doctor by username.
 
+    Admin reads go through the doctor directory cache like list_doctors: a
+    hit is answered, 304 included, without touching the database.
+    Patient and doctor reads always query the database, since what their
+    RLS policies let them see also depends on the diagnosis table; they
+    still get 304 before the doctor is queried.
+
     Args:
         username (str): Doctor username to query.
-        db_pool (asyncpg.Pool): Database connection pool.
+        request (Request): FastAPI request object.
+        response (Response): Response carrying the ETag header.
+        user (UserToken): Authenticated user.
+        db_pool (asyncpg.Pool): Pool to read from on a cache miss.
 
     Raises:
         HTTPException: If doctor not found.
@@ -432,15 +950,27 @@ async def get_doctor(username: str, db_pool: asyncpg.Pool = Depends(get_postgres
     Returns:
         Doctor: Doctor data for the specified username.
     """
-    query = "SELECT username, name, specialty FROM doctors WHERE username=$1"
+    cacheable = user.role not in RLS_ROLES
+    if cacheable:
+        generation = doctor_cache.generation
+        cached = doctor_cache.get(username)
+        if cached is not MISSING:
+            versions, body = cached
+            apply_etag(request, response, user, versions)
+            return json_response(body, response)
 
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow(query, username)
+    async with rls_connection(db_pool, user) as conn:
+        versions = await table_versions(conn, DOCTOR_TABLES)
+        apply_etag(request, response, user, versions)
+        row = await conn.fetchrow("SELECT username, name, specialty FROM doctors WHERE username=$1", username)
 
     if not row:
         raise HTTPException(status_code=404, detail="Doctor not found")
 
-    return Doctor(**row)
+    body = doctor_rows.dump_one(row)
+    if cacheable:
+        doctor_cache.set(username, (versions, body), generation)
+    return json_response(body, response)
 
 
 @clinic_router.patch("/doctors/{username}", response_model=Doctor, dependencies=[Depends(require_role(["admin"]))])
@@ -473,10 +1003,13 @@ async def update_doctor(
 
     async with db_pool.acquire() as conn:
         row = await conn.fetchrow(query, updates.name, updates.specialty, username)
+        if row:
+            await notify_invalidation(conn, "doctor", username)
 
     if not row:
         raise HTTPException(status_code=404, detail="Doctor not found")
 
+    invalidate_doctor(username)
     return Doctor(**row)
 
 
@@ -499,13 +1032,166 @@ async def delete_doctor(username: str, db_pool: asyncpg.Pool = Depends(get_postg
 
     async with db_pool.acquire() as conn:
         row = await conn.fetchrow(query, username)
+        if row:
+            await notify_invalidation(conn, "doctor", username)
 
     if not row:
         raise HTTPException(status_code=404, detail="Doctor not found")
 
+    invalidate_doctor(username)
     return {"message": f"Doctor {username} deleted"}
 
 
+# -------------------------------
+# WORKING HOURS AND AVAILABILITY
+# -------------------------------
+# Longest period an availability search may cover
+MAX_AVAILABILITY_DAYS = 92
+
+# Free time of a doctor in [$2, $3): the working-hours template expanded
+# over the days of the period (generate_series), merged into one
+# multirange (range_agg), minus the merged slots of the doctor's live
+# appointments. range_agg sorts and coalesces the intervals and the
+# multirange difference walks both lists in order, so the whole search is
+# a merge of two sorted interval lists done inside Postgres.
+AVAILABILITY_QUERY = """
+    WITH bounds AS (
+        SELECT tsrange($2::timestamp, $3::timestamp) AS period
+    ),
+    working AS (
+        SELECT range_agg(tsrange(day + wh.start_time, day + wh.end_time) * bounds.period) AS hours
+        FROM bounds,
+            generate_series(date_trunc('day', $2::timestamp), $3::timestamp, INTERVAL '1 day') AS day,
+            doctor_working_hours wh
+        WHERE wh.doctor_id = $1 AND wh.weekday = EXTRACT(ISODOW FROM day)
+    ),
+    busy AS (
+        SELECT range_agg(slot) AS slots
+        FROM appointments, bounds
+        WHERE doctor_id = $1 AND status <> 'cancelled' AND slot && bounds.period
+          -- appointments last at most 480 minutes (0009): lets the
+          -- (doctor_id, appointment_date) index bound the scan
+          AND appointment_date >= $2::timestamp - INTERVAL '480 minutes'
+          AND appointment_date < $3::timestamp
+    )
+    SELECT lower(free) AS start, upper(free) AS "end"
+    FROM working, busy,
+        unnest(COALESCE(working.hours, '{}') - COALESCE(busy.slots, '{}')) AS free
+    WHERE upper(free) - lower(free) >= $4::int * INTERVAL '1 minute'
+    ORDER BY start
+"""
+
+
+@clinic_router.get("/doctors/{username}/working-hours", response_model=List[WorkingHours], dependencies=[Depends(require_role(["admin", "doctor", "patient"])), Depends(conditional_get(WORKING_HOURS_TABLES, get_read_connection))])
+async def get_working_hours(
+    username: str,
+    response: Response,
+    conn: asyncpg.Connection = Depends(get_read_connection),
+):
+    """
+    Retrieve the weekly working-hours template of a doctor.
+
+    Args:
+        username (str): Username of the doctor.
+        response (Response): Response carrying the ETag header.
+        conn (asyncpg.Connection): Read-pool connection.
+
+    Returns:
+        List[WorkingHours]: Working intervals ordered by weekday and start.
+    """
+    query = """
+        SELECT weekday, start_time, end_time
+        FROM doctor_working_hours
+        WHERE doctor_id = $1
+        ORDER BY weekday, start_time
+    """
+    rows = await conn.fetch(query, username)
+    return json_response(working_hours_rows.dump_many(rows), response)
+
+
+@clinic_router.put("/doctors/{username}/working-hours", response_model=List[WorkingHours], dependencies=[Depends(require_role(["admin"]))])
+async def set_working_hours(
+    username: str,
+    hours: List[WorkingHours],
+    db_pool: asyncpg.Pool = Depends(get_postgres),
+):
+    """
+    Replace the weekly working-hours template of a doctor.
+
+    Args:
+        username (str): Username of the doctor.
+        hours (List[WorkingHours]): New template (may be empty).
+        db_pool (asyncpg.Pool): Database connection pool.
+
+    Raises:
+        HTTPException: 404 if the doctor does not exist, 400 if an interval
+            ends before it starts or two start at the same time.
+
+    Returns:
+        List[WorkingHours]: The stored template.
+    """
+    async with db_pool.acquire() as conn:
+        async with conn.transaction():
+            if not await conn.fetchval("SELECT 1 FROM doctors WHERE username = $1", username):
+                raise HTTPException(status_code=404, detail="Doctor not found")
+            await conn.execute("DELETE FROM doctor_working_hours WHERE doctor_id = $1", username)
+            try:
+                await conn.executemany(
+                    "INSERT INTO doctor_working_hours (doctor_id, weekday, start_time, end_time) VALUES ($1, $2, $3, $4)",
+                    [(username, h.weekday, h.start_time, h.end_time) for h in hours],
+                )
+            except CheckViolationError:
+                raise HTTPException(status_code=400, detail="Working hours must end after they start")
+            except UniqueViolationError:
+                raise HTTPException(status_code=400, detail="Two intervals start at the same time")
+
+    return sorted(hours, key=lambda h: (h.weekday, h.start_time))
+
+
+@clinic_router.get("/doctors/{username}/availability", response_model=List[FreeInterval], dependencies=[Depends(require_role(["admin", "doctor", "patient"])), Depends(conditional_get(AVAILABILITY_TABLES, get_read_connection))])
+async def get_availability(
+    username: str,
+    response: Response,
+    start: datetime = Query(..., alias="from"),
+    end: datetime = Query(..., alias="to"),
+    duration: int = Query(30, gt=0, le=480, description="Minutes the free interval must last"),
+    conn: asyncpg.Connection = Depends(get_read_connection),
+):
+    """
+    Find the free intervals of a doctor long enough for an appointment.
+
+    Runs on a plain read-pool connection rather than the caller's
+    RLS-scoped one: the busy time of a doctor depends on every appointment,
+    not only the ones the caller may see, and the answer exposes no
+    appointment data.
+
+    Args:
+        username (str): Username of the doctor.
+        response (Response): Response carrying the ETag header.
+        start (datetime): Start of the search period (``?from=``).
+        end (datetime): End of the search period, exclusive (``?to=``).
+        duration (int): Minimum length of the free intervals, in minutes.
+        conn (asyncpg.Connection): Read-pool connection.
+
+    Raises:
+        HTTPException: 404 if the doctor does not exist, 400 if the period
+            is empty or longer than MAX_AVAILABILITY_DAYS.
+
+    Returns:
+        List[FreeInterval]: Free intervals in chronological order.
+    """
+    start, end = _naive_utc(start), _naive_utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be later than 'from'")
+    if end - start > timedelta(days=MAX_AVAILABILITY_DAYS):
+        raise HTTPException(status_code=400, detail=f"At most {MAX_AVAILABILITY_DAYS} days per search")
+
+    if not await conn.fetchval("SELECT 1 FROM doctors WHERE username = $1", username):
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    rows = await conn.fetch(AVAILABILITY_QUERY, username, start, end, duration)
+    return json_response(free_interval_rows.dump_many(rows), response)
+
+
 # =====================================================================
 #                               DIAGNOSIS
 # =====================================================================
@@ -546,37 +1232,76 @@ async def create_diagnosis(
     return Diagnosis(**row)
 
 
-@clinic_router.get("/diagnosis", response_model=List[Diagnosis], dependencies=[Depends(require_role(["admin", "doctor", "patient"]))])
-async def list_diagnosis(db_pool: asyncpg.Pool = Depends(get_postgres)):
+@clinic_router.get("/diagnosis", response_model=List[Diagnosis], dependencies=[Depends(require_role(["admin", "doctor", "patient"])), Depends(conditional_get(DIAGNOSIS_TABLES))])
+async def list_diagnosis(
+    response: Response,
+    page: PageParams = Depends(),
+    batch: IdsParams = Depends(),
+    conn: asyncpg.Connection = Depends(get_db_connection),
+):
     """
-    Retrieve a list of all diagnoses.
+    Retrieve a page of diagnoses ordered by ID.
+
+    With ``?ids=1,2,3`` those diagnoses are returned instead, in the order
+    requested; IDs not found are listed in the X-Missing-Ids header.
 
     Args:
-        db_pool (asyncpg.Pool): Database connection pool.
+        response (Response): Response on which the next cursor header is set.
+        page (PageParams): Page size and cursor of the previous page.
+        batch (IdsParams): IDs to fetch, if any.
+        conn (asyncpg.Connection): Connection scoped to the user's database role.
 
     Returns:
-        List[Diagnosis]: List of all diagnosis records.
-    """
-    query = """
-        SELECT id_diagnosis, diagnosis_date, icd, description, patient_id, doctor_id
-        FROM diagnosis
-        ORDER BY id_diagnosis
-    """
-
-    async with db_pool.acquire() as conn:
-        rows = await conn.fetch(query)
-
-    return [Diagnosis(**r) for r in rows]
-
-
-@clinic_router.get("/diagnosis/{id_diagnosis}", response_model=Diagnosis, dependencies=[Depends(require_role(["doctor", "patient"]))])
-async def get_diagnosis(id_diagnosis: int, db_pool: asyncpg.Pool = Depends(get_postgres)):
+        List[Diagnosis]: Diagnosis records of the requested page.
+    """
+    if batch.ids is not None:
+        query = """
+            SELECT id_diagnosis, diagnosis_date, icd, description, patient_id, doctor_id
+            FROM diagnosis
+            WHERE id_diagnosis = ANY($1::int[])
+        """
+        rows = await conn.fetch(query, batch.ids)
+        rows = order_by_ids(rows, "id_diagnosis", batch.ids, response)
+        return json_response(diagnosis_rows.dump_many(rows), response)
+
+    if page.after:
+        (after_id,) = decode_cursor(page.after, (int,))
+        query = """
+            SELECT id_diagnosis, diagnosis_date, icd, description, patient_id, doctor_id
+            FROM diagnosis
+            WHERE id_diagnosis > $2
+            ORDER BY id_diagnosis
+            LIMIT $1
+        """
+        args = (page.limit + 1, after_id)
+    else:
+        query = """
+            SELECT id_diagnosis, diagnosis_date, icd, description, patient_id, doctor_id
+            FROM diagnosis
+            ORDER BY id_diagnosis
+            LIMIT $1
+        """
+        args = (page.limit + 1,)
+
+    rows = await conn.fetch(query, *args)
+
+    rows = paginate(rows, page.limit, ("id_diagnosis",), response)
+    return json_response(diagnosis_rows.dump_many(rows), response)
+
+
+@clinic_router.get("/diagnosis/{id_diagnosis}", response_model=Diagnosis, dependencies=[Depends(require_role(["doctor", "patient"])), Depends(conditional_get(DIAGNOSIS_TABLES))])
+async def get_diagnosis(
+    id_diagnosis: int,
+    response: Response,
+    conn: asyncpg.Connection = Depends(get_db_connection),
+):
     """
     Retrieve a single diagnosis by its ID.
 
     Args:
         id_diagnosis (int): ID of the diagnosis.
-        db_pool (asyncpg.Pool): Database connection pool.
+        response (Response): Response carrying the ETag header.
+        conn (asyncpg.Connection): Connection scoped to the user's database role.
 
     Raises:
         HTTPException: If diagnosis not found.
@@ -590,13 +1315,12 @@ async def get_diagnosis(id_diagnosis: int, db_pool: asyncpg.Pool = Depends(get_p
         WHERE id_diagnosis = $1
     """
 
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow(query, id_diagnosis)
+    row = await conn.fetchrow(query, id_diagnosis)
 
     if not row:
         raise HTTPException(status_code=404, detail="Diagnosis not found")
 
-    return Diagnosis(**row)
+    return json_response(diagnosis_rows.dump_one(row), response)
 
 
 @clinic_router.patch("/diagnosis/{id_diagnosis}", response_model=Diagnosis, dependencies=[Depends(require_role(["doctor"]))])
@@ -680,7 +1404,50 @@ async def delete_diagnosis(
 #                             APPOINTMENTS
 # =====================================================================
 
-@clinic_router.post("/appointments", response_model=Appointment, dependencies=[Depends(require_role(["admin"]))])
+async def conflict_response(
+    conn: asyncpg.Connection,
+    doctor_id: str,
+    start: datetime,
+    duration_minutes: int,
+    exclude_id: Optional[int] = None,
+) -> Response:
+    """
+    Build the 409 answer for an appointment rejected by the no-overlap
+    constraint, naming the appointment that holds the slot.
+
+    Args:
+        conn (asyncpg.Connection): Database connection.
+        doctor_id (str): Doctor of the rejected appointment.
+        start (datetime): Start of the rejected appointment.
+        duration_minutes (int): Length of the rejected appointment.
+        exclude_id (Optional[int]): ID of the appointment being updated.
+
+    Raises:
+        HTTPException: 409 without details if the clashing appointment is
+            gone by the time it is looked up.
+
+    Returns:
+        Response: 409 response with an AppointmentConflict body.
+    """
+    row = await conn.fetchrow("""
+        SELECT id_appointment, appointment_date, duration_minutes, status, reason, patient_id, doctor_id
+        FROM appointments
+        WHERE doctor_id = $1
+          AND status <> 'cancelled'
+          AND slot && tsrange($2::timestamp, $2::timestamp + $3::int * INTERVAL '1 minute')
+          AND id_appointment IS DISTINCT FROM $4::int
+        ORDER BY appointment_date
+        LIMIT 1
+    """, doctor_id, start, duration_minutes, exclude_id)
+
+    detail = "The doctor already has an appointment at that time"
+    if not row:
+        raise HTTPException(status_code=409, detail=detail)
+    body = AppointmentConflict(detail=detail, conflict=Appointment(**row))
+    return FastJSONResponse(status_code=409, content=body.model_dump(mode="json"))
+
+
+@clinic_router.post("/appointments", response_model=Appointment, responses={409: {"model": AppointmentConflict}}, dependencies=[Depends(require_role(["admin"]))])
 async def create_appointment(
     ap: AppointmentCreate,
     db_pool: asyncpg.Pool = Depends(get_postgres),
@@ -688,6 +1455,10 @@ async def create_appointment(
     """
     Create a new appointment record.
 
+    Overlaps are rejected by the appointments_no_overlap exclusion
+    constraint, which Postgres enforces atomically even for concurrent
+    bookings of the same slot.
+
     Args:
         ap (AppointmentCreate): Appointment data to insert.
         db_pool (asyncpg.Pool): Database connection pool.
@@ -696,16 +1467,21 @@ async def create_appointment(
         HTTPException: If creation fails.
 
     Returns:
-        Appointment: Created appointment record.
+        Appointment: Created appointment record, or a 409 AppointmentConflict
+        if the doctor is already booked at that time.
     """
     query = """
-        INSERT INTO appointments (appointment_date, reason, patient_id, doctor_id)
-        VALUES ($1, $2, $3, $4)
-        RETURNING id_appointment, appointment_date, reason, patient_id, doctor_id
+        INSERT INTO appointments (appointment_date, duration_minutes, reason, patient_id, doctor_id)
+        VALUES ($1, $2, $3, $4, $5)
+        RETURNING id_appointment, appointment_date, duration_minutes, status, reason, patient_id, doctor_id
     """
+    start = _naive_utc(ap.appointment_date)
 
     async with db_pool.acquire() as conn:
-        row = await conn.fetchrow(query, ap.appointment_date, ap.reason, ap.patient_id, ap.doctor_id)
+        try:
+            row = await conn.fetchrow(query, start, ap.duration_minutes, ap.reason, ap.patient_id, ap.doctor_id)
+        except ExclusionViolationError:
+            return await conflict_response(conn, ap.doctor_id, start, ap.duration_minutes)
 
     if not row:
         raise HTTPException(status_code=500, detail="Failed to create appointment")
@@ -713,40 +1489,164 @@ async def create_appointment(
     return Appointment(**row)
 
 
-@clinic_router.get("/appointments", response_model=List[Appointment], dependencies=[Depends(require_role(["admin", "doctor", "patient"]))])
-async def list_appointments(db_pool: asyncpg.Pool = Depends(get_postgres)):
+class AppointmentFilters:
+    """
+    Dependency collecting the filters of the appointment list.
+
+    Dates without a timezone are taken as stored; aware ones are converted
+    to UTC.
+
+    Attributes:
+        start (Optional[datetime]): Earliest appointment date, inclusive (``?from=``).
+        end (Optional[datetime]): Appointment dates before this one (``?to=``).
+        doctor_id (Optional[str]): Only appointments with this doctor.
+        patient_id (Optional[str]): Only appointments of this patient.
+        status (Optional[str]): Only appointments in this status.
+    """
+
+    def __init__(
+        self,
+        start: Optional[datetime] = Query(None, alias="from"),
+        end: Optional[datetime] = Query(None, alias="to"),
+        doctor_id: Optional[str] = Query(None, max_length=50),
+        patient_id: Optional[str] = Query(None, max_length=50),
+        status: Optional[str] = Query(None, max_length=20),
+    ):
+        self.start = _naive_utc(start)
+        self.end = _naive_utc(end)
+        if self.start is not None and self.end is not None and self.end <= self.start:
+            raise HTTPException(status_code=400, detail="'to' must be later than 'from'")
+        self.doctor_id = doctor_id
+        self.patient_id = patient_id
+        self.status = status
+
+    def where(self, args: list) -> List[str]:
+        """
+        Build the SQL conditions of the filters that were given.
+
+        Args:
+            args (list): Query arguments so far; the filter values are
+                appended and their placeholders numbered after them.
+
+        Returns:
+            List[str]: Conditions to AND into the WHERE clause.
+        """
+        conditions = []
+        for condition, value in (
+            ("appointment_date >= ${}", self.start),
+            ("appointment_date < ${}", self.end),
+            ("doctor_id = ${}", self.doctor_id),
+            ("patient_id = ${}", self.patient_id),
+            ("status = ${}", self.status),
+        ):
+            if value is not None:
+                args.append(value)
+                conditions.append(condition.format(len(args)))
+        return conditions
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert an aware datetime to naive UTC (the columns are TIMESTAMP)."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _where(conditions: List[str]) -> str:
+    """Join conditions into a WHERE clause (empty if there are none)."""
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+@clinic_router.get("/appointments", response_model=List[Appointment], dependencies=[Depends(require_role(["admin", "doctor", "patient"])), Depends(conditional_get(APPOINTMENT_TABLES))])
+async def list_appointments(
+    response: Response,
+    page: PageParams = Depends(),
+    stream: StreamParams = Depends(),
+    batch: IdsParams = Depends(),
+    filters: AppointmentFilters = Depends(),
+    conn: asyncpg.Connection = Depends(get_db_connection),
+):
     """
-    Retrieve a list of all appointments.
+    Retrieve a page of appointments, most recent first.
+
+    ``?from=`` / ``?to=`` restrict the dates (``to`` exclusive) and
+    ``?doctor_id=``, ``?patient_id=`` and ``?status=`` the participants and
+    state; the doctor and patient filters are served by the
+    (doctor_id|patient_id, appointment_date) indexes as range scans in
+    list order.
+
+    With ``?ids=1,2,3`` those appointments are returned instead, in the
+    order requested; IDs not found are listed in the X-Missing-Ids header.
+    With ``?stream=1`` or ``Accept: application/x-ndjson`` every matching
+    appointment is streamed as NDJSON, ignoring the page parameters.
 
     Args:
-        db_pool (asyncpg.Pool): Database connection pool.
+        response (Response): Response on which the next cursor header is set.
+        page (PageParams): Page size and cursor of the previous page.
+        stream (StreamParams): Whether the client asked for an NDJSON stream.
+        batch (IdsParams): IDs to fetch, if any.
+        filters (AppointmentFilters): Date range, doctor, patient and status.
+        conn (asyncpg.Connection): Connection scoped to the user's database role.
 
     Returns:
-        List[Appointment]: List of all appointments.
-    """
-    query = """
-        SELECT id_appointment, appointment_date, reason, patient_id, doctor_id
+        List[Appointment]: Appointments of the requested page.
+    """
+    if batch.ids is not None:
+        query = """
+            SELECT id_appointment, appointment_date, duration_minutes, status, reason, patient_id, doctor_id
+            FROM appointments
+            WHERE id_appointment = ANY($1::int[])
+        """
+        rows = await conn.fetch(query, batch.ids)
+        rows = order_by_ids(rows, "id_appointment", batch.ids, response)
+        return json_response(appointment_rows.dump_many(rows), response)
+
+    if stream.enabled:
+        args: list = []
+        query = f"""
+            SELECT id_appointment, appointment_date, duration_minutes, status, reason, patient_id, doctor_id
+            FROM appointments
+            {_where(filters.where(args))}
+            ORDER BY appointment_date DESC, id_appointment DESC
+        """
+        return ndjson_response(
+            conn, query, args, appointment_rows.dump_one, response.headers
+        )
+
+    args = [page.limit + 1]
+    conditions = []
+    if page.after:
+        after_date, after_id = decode_cursor(page.after, (datetime.fromisoformat, int))
+        args += [after_date, after_id]
+        conditions.append("(appointment_date, id_appointment) < ($2, $3)")
+    conditions += filters.where(args)
+
+    query = f"""
+        SELECT id_appointment, appointment_date, duration_minutes, status, reason, patient_id, doctor_id
         FROM appointments
-        ORDER BY appointment_date DESC
+        {_where(conditions)}
+        ORDER BY appointment_date DESC, id_appointment DESC
+        LIMIT $1
     """
+    rows = await conn.fetch(query, *args)
 
-    async with db_pool.acquire() as conn:
-        rows = await conn.fetch(query)
-
-    return [Appointment(**r) for r in rows]
+    rows = paginate(rows, page.limit, ("appointment_date", "id_appointment"), response)
+    return json_response(appointment_rows.dump_many(rows), response)
 
 
-@clinic_router.get("/{id_appointment}", response_model=Appointment, dependencies=[Depends(require_role(["admin", "doctor", "patient"]))])
+@clinic_router.get("/appointments/{id_appointment}", response_model=Appointment, dependencies=[Depends(require_role(["admin", "doctor", "patient"])), Depends(conditional_get(APPOINTMENT_TABLES))])
 async def get_appointment(
     id_appointment: int,
-    db_pool: asyncpg.Pool = Depends(get_postgres),
+    response: Response,
+    conn: asyncpg.Connection = Depends(get_db_connection),
 ):
     """
     Retrieve a single appointment by its ID.
 
     Args:
         id_appointment (int): ID of the appointment.
-        db_pool (asyncpg.Pool): Database connection pool.
+        response (Response): Response carrying the ETag header.
+        conn (asyncpg.Connection): Connection scoped to the user's database role.
 
     Raises:
         HTTPException: If appointment not found.
@@ -755,21 +1655,20 @@ async def get_appointment(
         Appointment: Appointment record for the given ID.
     """
     query = """
-        SELECT id_appointment, appointment_date, reason, patient_id, doctor_id
+        SELECT id_appointment, appointment_date, duration_minutes, status, reason, patient_id, doctor_id
         FROM appointments
         WHERE id_appointment = $1
     """
 
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow(query, id_appointment)
+    row = await conn.fetchrow(query, id_appointment)
 
     if not row:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
-    return Appointment(**row)
+    return json_response(appointment_rows.dump_one(row), response)
 
 
-@clinic_router.patch("/appointments/{id_appointment}", response_model=Appointment, dependencies=[Depends(require_role(["admin"]))])
+@clinic_router.patch("/appointments/{id_appointment}", response_model=Appointment, responses={409: {"model": AppointmentConflict}}, dependencies=[Depends(require_role(["admin"]))])
 async def update_appointment(
     id_appointment: int,
     updates: AppointmentUpdate,
@@ -778,6 +1677,9 @@ async def update_appointment(
     """
     Update an existing appointment record.
 
+    Setting ``status`` to ``"cancelled"`` frees the slot for other bookings;
+    setting it back is checked for overlaps like any other change.
+
     Args:
         id_appointment (int): ID of the appointment to update.
         updates (AppointmentUpdate): Fields to update (optional).
@@ -787,27 +1689,49 @@ async def update_appointment(
         HTTPException: If appointment not found.
 
     Returns:
-        Appointment: Updated appointment record.
+        Appointment: Updated appointment record, or a 409 AppointmentConflict
+        if the new time overlaps another appointment of the doctor.
     """
     query = """
         UPDATE appointments
         SET appointment_date = COALESCE($1, appointment_date),
-            reason = COALESCE($2, reason),
-            patient_id = COALESCE($3, patient_id),
-            doctor_id = COALESCE($4, doctor_id)
-        WHERE id_appointment = $5
-        RETURNING id_appointment, appointment_date, reason, patient_id, doctor_id
+            duration_minutes = COALESCE($2, duration_minutes),
+            reason = COALESCE($3, reason),
+            patient_id = COALESCE($4, patient_id),
+            doctor_id = COALESCE($5, doctor_id),
+            status = COALESCE($6, status)
+        WHERE id_appointment = $7
+        RETURNING id_appointment, appointment_date, duration_minutes, status, reason, patient_id, doctor_id
     """
+    start = _naive_utc(updates.appointment_date)
 
     async with db_pool.acquire() as conn:
-        row = await conn.fetchrow(
-            query,
-            updates.appointment_date,
-            updates.reason,
-            updates.patient_id,
-            updates.doctor_id,
-            id_appointment
-        )
+        try:
+            row = await conn.fetchrow(
+                query,
+                start,
+                updates.duration_minutes,
+                updates.reason,
+                updates.patient_id,
+                updates.doctor_id,
+                updates.status,
+                id_appointment
+            )
+        except ExclusionViolationError:
+            current = await conn.fetchrow(
+                "SELECT appointment_date, duration_minutes, doctor_id FROM appointments WHERE id_appointment = $1",
+                id_appointment,
+            )
+            if current is None:
+                # Deleted between the failed UPDATE and this read
+                raise HTTPException(status_code=404, detail="Appointment not found")
+            return await conflict_response(
+                conn,
+                updates.doctor_id or current["doctor_id"],
+                start or current["appointment_date"],
+                updates.duration_minutes or current["duration_minutes"],
+                id_appointment,
+            )
 
     if not row:
         raise HTTPException(status_code=404, detail="Appointment not found")
@@ -880,8 +1804,7 @@ async def upload_file(
 
     # ---------- Upload to Filebase ----------
     try:
-        client.put_object(
-            bucket_name=settings.bucket_name,
+        await storage.put_object(
             object_name=file_name,
             data=file.file,
             length=-1,  # streaming upload
@@ -892,7 +1815,7 @@ async def upload_file(
 
     # ---------- Retrieve IPFS CID from Filebase ----------
     try:
-        stat = client.stat_object(settings.bucket_name, file_name)
+        stat = await storage.stat_object(file_name)
         cid = stat.metadata.get("x-amz-meta-cid")
 
         if not cid:
@@ -928,39 +1851,98 @@ async def upload_file(
     return FileDB(**row)
 
 
-@clinic_router.get("/files", response_model=List[FileDB], dependencies=[Depends(require_role(["admin", "doctor", "patient"]))])
-async def list_files(db_pool: asyncpg.Pool = Depends(get_postgres)):
+@clinic_router.get("/files", response_model=List[FileDB], dependencies=[Depends(require_role(["admin", "doctor", "patient"])), Depends(conditional_get(FILE_TABLES))])
+async def list_files(
+    response: Response,
+    page: PageParams = Depends(),
+    stream: StreamParams = Depends(),
+    batch: IdsParams = Depends(),
+    conn: asyncpg.Connection = Depends(get_db_connection),
+):
     """
-    Retrieve a list of all files.
+    Retrieve a page of files, most recently uploaded first.
+
+    With ``?ids=1,2,3`` those files are returned instead, in the order
+    requested; IDs not found are listed in the X-Missing-Ids header.
+    With ``?stream=1`` or ``Accept: application/x-ndjson`` every file is
+    streamed as NDJSON, ignoring the page parameters.
 
     Args:
-        db_pool (asyncpg.Pool): Database connection pool.
+        response (Response): Response on which the next cursor header is set.
+        page (PageParams): Page size and cursor of the previous page.
+        stream (StreamParams): Whether the client asked for an NDJSON stream.
+        batch (IdsParams): IDs to fetch, if any.
+        conn (asyncpg.Connection): Connection scoped to the user's database role.
 
     Returns:
-        List[FileDB]: List of all uploaded files.
-    """
-    query = """
-        SELECT
-            id_file, file_name, original_name, url, mime_type, uploaded_at,
-            patient_id, doctor_id, diagnosis_id, appointment_id
-        FROM files
-        ORDER BY uploaded_at DESC
-    """
-
-    async with db_pool.acquire() as conn:
-        rows = await conn.fetch(query)
-
-    return [FileDB(**r) for r in rows]
-
+        List[FileDB]: Files of the requested page.
+    """
+    if batch.ids is not None:
+        query = """
+            SELECT
+                id_file, file_name, original_name, url, mime_type, uploaded_at,
+                patient_id, doctor_id, diagnosis_id, appointment_id
+            FROM files
+            WHERE id_file = ANY($1::int[])
+        """
+        rows = await conn.fetch(query, batch.ids)
+        rows = order_by_ids(rows, "id_file", batch.ids, response)
+        return json_response(file_rows.dump_many(rows), response)
+
+    if stream.enabled:
+        query = """
+            SELECT
+                id_file, file_name, original_name, url, mime_type, uploaded_at,
+                patient_id, doctor_id, diagnosis_id, appointment_id
+            FROM files
+            ORDER BY uploaded_at DESC, id_file DESC
+        """
+        return ndjson_response(
+            conn, query, (), file_rows.dump_one, response.headers
+        )
 
-@clinic_router.get("/files/{id_file}", response_model=FileDB, dependencies=[Depends(require_role(["admin", "doctor", "patient"]))])
-async def get_file(id_file: int, db_pool: asyncpg.Pool = Depends(get_postgres)):
+    if page.after:
+        after_uploaded, after_id = decode_cursor(page.after, (datetime.fromisoformat, int))
+        query = """
+            SELECT
+                id_file, file_name, original_name, url, mime_type, uploaded_at,
+                patient_id, doctor_id, diagnosis_id, appointment_id
+            FROM files
+            WHERE (uploaded_at, id_file) < ($2, $3)
+            ORDER BY uploaded_at DESC, id_file DESC
+            LIMIT $1
+        """
+        args = (page.limit + 1, after_uploaded, after_id)
+    else:
+        query = """
+            SELECT
+                id_file, file_name, original_name, url, mime_type, uploaded_at,
+                patient_id, doctor_id, diagnosis_id, appointment_id
+            FROM files
+            ORDER BY uploaded_at DESC, id_file DESC
+            LIMIT $1
+        """
+        args = (page.limit + 1,)
+
+    rows = await conn.fetch(query, *args)
+
+    rows = paginate(rows, page.limit, ("uploaded_at", "id_file"), response)
+    return json_response(file_rows.dump_many(rows), response)
+
+
+@clinic_router.get("/files/{id_file}", response_model=FileDB, dependencies=[Depends(require_role(["admin", "doctor", "patient"])), Depends(conditional_get(FILE_TABLES))])
+async def get_file(
+    id_file: int,
+    response: Response,
+    conn: asyncpg.Connection = Depends(get_db_connection),
+):
     """
     Retrieve metadata for a specific file by its ID.
 
     Args:
         id_file (int): ID of the file.
-        db_pool (asyncpg.Pool): Database connection pool.
+        response (Response): Response carrying the ETag header.
+        conn (asyncpg.Connection): Connection scoped to the user's database role.
 
     Raises:
         HTTPException: If the file is not found.
@@ -976,13 +1958,12 @@ async def get_file(id_file: int, db_pool: asyncpg.Pool = Depends(get_postgres)):
         WHERE id_file = $1
     """
 
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow(query, id_file)
+    row = await conn.fetchrow(query, id_file)
 
     if not row:
         raise HTTPException(status_code=404, detail="File not found")
 
-    return FileDB(**row)
+    return json_response(file_rows.dump_one(row), response)
 
 
 @clinic_router.delete("/files/{id_file}", dependencies=[Depends(require_role(["admin", "doctor"]))])
@@ -1016,7 +1997,7 @@ async def delete_file(
 
     # Delete from Filebase
     try:
-        client.remove_object(settings.bucket_name, object_name)
+        await storage.remove_object(object_name)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Filebase delete error: {e}")
 
@@ -0,0 +1,96 @@
+"""
+batch.py
+--------
+Multi-ID lookups for Clinic Manager list endpoints.
+
+``GET /diagnosis?ids=3,1,2`` (and the appointments and files equivalents)
+fetches several records with a single ``WHERE id = ANY($1)`` query instead
+of one request per record. Rows come back in the order the IDs were
+requested; IDs that do not exist, or that the caller's RLS policies hide,
+are listed in the ``X-Missing-Ids`` response header so the body stays a
+plain list like the paged responses.
+"""
+
+from typing import Any, List, Mapping, Optional, Sequence
+
+from fastapi import HTTPException, Query, Response
+
+# Most IDs accepted in one request
+MAX_BATCH_IDS = 1000
+
+# Largest value of a SERIAL primary key
+MAX_ID = 2**31 - 1
+
+# Response header listing requested IDs that were not returned
+MISSING_IDS_HEADER = "X-Missing-Ids"
+
+
+class IdsParams:
+    """
+    Dependency parsing the ``ids`` query parameter.
+
+    Attributes:
+        ids (Optional[List[int]]): Requested IDs in request order without
+            repetitions, or None if the parameter was not sent.
+    """
+
+    def __init__(self, ids: Optional[str] = Query(None, description="Comma-separated IDs to fetch")):
+        self.ids = None if ids is None else parse_ids(ids)
+
+
+def parse_ids(raw: str) -> List[int]:
+    """
+    Parse a comma-separated list of integer IDs.
+
+    Args:
+        raw (str): Value of the ``ids`` query parameter.
+
+    Raises:
+        HTTPException: 400 if a value is not a valid ID, the list is empty
+            or longer than MAX_BATCH_IDS.
+
+    Returns:
+        List[int]: IDs in request order, repetitions removed.
+    """
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if not ids:
+        raise HTTPException(status_code=400, detail="ids must not be empty")
+    if not all(0 < id_ <= MAX_ID for id_ in ids):
+        raise HTTPException(status_code=400, detail="ids out of range")
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    return ids
+
+
+def order_by_ids(
+    rows: Sequence[Mapping[str, Any]],
+    key: str,
+    ids: Sequence[int],
+    response: Response,
+) -> List[Mapping[str, Any]]:
+    """
+    Put rows in request order and report the IDs that were not found.
+
+    Args:
+        rows (Sequence[Mapping[str, Any]]): Rows fetched with ``= ANY($1)``.
+        key (str): Name of the ID column.
+        ids (Sequence[int]): Requested IDs, in order.
+        response (Response): Response on which the missing IDs header is set.
+
+    Returns:
+        List[Mapping[str, Any]]: Rows following the order of ``ids``.
+    """
+    by_id = {row[key]: row for row in rows}
+    ordered, missing = [], []
+    for id_ in ids:
+        row = by_id.get(id_)
+        if row is None:
+            missing.append(id_)
+        else:
+            ordered.append(row)
+    if missing:
+        response.headers[MISSING_IDS_HEADER] = ",".join(map(str, missing))
+    return ordered
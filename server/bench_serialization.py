@@ -0,0 +1,93 @@
+"""
+bench_serialization.py
+----------------------
+Microbenchmark of the per-row CPU cost of list responses.
+
+Compares, for 10k synthetic rows of each entity:
+    - before: ``[Model(**r) for r in rows]`` followed by what FastAPI does
+      with ``response_model`` (dump, re-validate, jsonable_encoder, json.dumps)
+    - after: RowSerializer.dump_many (one pydantic-core validation + dump)
+
+and the final render step of routes that still go through ``response_model``
+(Starlette's JSONResponse vs the orjson-backed FastJSONResponse).
+
+Run from the server directory:
+    uv run python bench_serialization.py [rows]
+"""
+
+import json
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from model import Appointment, FileDB, Patient
+from serializers import FastJSONResponse, RowSerializer
+
+
+def make_rows(n: int) -> dict:
+    """Build n synthetic rows per entity, shaped like asyncpg records."""
+    base = datetime(2025, 1, 1)
+    return {
+        Patient: [
+            {"username": f"patient{i:06d}", "name": f"Patient Name {i}", "birthdate": date(1990, 1, 1)}
+            for i in range(n)
+        ],
+        Appointment: [
+            {"id_appointment": i, "appointment_date": base + timedelta(days=i % 365, minutes=30 * (i % 16)),
+             "duration_minutes": 30, "status": "scheduled", "reason": "Routine check", "patient_id": f"patient{i:06d}", "doctor_id": "drtest"}
+            for i in range(n)
+        ],
+        FileDB: [
+            {"id_file": i, "file_name": f"{i}_scan.pdf", "original_name": "scan.pdf",
+             "url": f"https://gateway.example/ipfs/bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzdi{i}",
+             "mime_type": "application/pdf", "uploaded_at": base + timedelta(seconds=i),
+             "patient_id": f"patient{i:06d}", "doctor_id": "drtest", "diagnosis_id": None, "appointment_id": i}
+            for i in range(n)
+        ],
+    }
+
+
+def before(model, rows) -> bytes:
+    """Handler builds models, FastAPI dumps, re-validates and encodes them."""
+    adapter = TypeAdapter(List[model])
+    models = [model(**r) for r in rows]
+    content = [m.model_dump(by_alias=True) for m in models]
+    validated = adapter.validate_python(content)
+    encoded = jsonable_encoder(adapter.dump_python(validated, by_alias=True))
+    return json.dumps(encoded, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def bench(label: str, n: int, old_fn, new_fn, repeat: int) -> None:
+    """Time both callables and print the per-row cost."""
+    old = min(timeit.repeat(old_fn, number=1, repeat=repeat))
+    new = min(timeit.repeat(new_fn, number=1, repeat=repeat))
+    print(
+        f"{label:<20} {n} rows: "
+        f"before {old / n * 1e6:6.2f} us/row, after {new / n * 1e6:6.2f} us/row "
+        f"({old / new:4.1f}x)"
+    )
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeat = 5
+
+    for model, rows in make_rows(n).items():
+        serializer = RowSerializer(model)
+        assert json.loads(before(model, rows)) == json.loads(serializer.dump_many(rows))
+
+        bench(model.__name__, n, lambda: before(model, rows), lambda: serializer.dump_many(rows), repeat)
+
+        # Content as handed to the response class after response_model serialization
+        content = TypeAdapter(List[model]).dump_python([model(**r) for r in rows], mode="json", by_alias=True)
+        assert JSONResponse(content).body == FastJSONResponse(content).body
+        bench(f"{model.__name__} render", n, lambda: JSONResponse(content), lambda: FastJSONResponse(content), repeat)
+
+
+if __name__ == "__main__":
+    main()
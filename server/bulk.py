@@ -0,0 +1,246 @@
+"""
+bulk.py
+-------
+Bulk patient import for Clinic Manager.
+
+The upload (CSV with a header row, or NDJSON) is read from the request
+stream chunk by chunk and never held in memory as a whole. Each row is
+validated against PatientCreate; valid rows are sent in batches with
+``COPY`` (``copy_records_to_table``) into a temporary staging table, and
+once the stream ends they are merged into ``patients`` with a single
+``INSERT ... SELECT ... ON CONFLICT DO NOTHING``. Rows that fail
+validation, repeat a username of the same file or clash with an existing
+patient are skipped and reported with their line number.
+
+Everything runs in one transaction: either the whole merge is applied or
+nothing is.
+"""
+
+import codecs
+import csv
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import asyncpg
+import orjson
+from fastapi import HTTPException
+from pydantic import TypeAdapter, ValidationError
+
+from model import BulkImportReport, BulkRowIssue, PatientCreate
+from streaming import NDJSON_MEDIA_TYPE
+
+CSV_MEDIA_TYPE = "text/csv"
+
+# Valid rows sent per COPY
+COPY_BATCH_SIZE = 5000
+
+# Skipped rows described in the report (the counters are always exact)
+MAX_REPORTED_ISSUES = 500
+
+_patient = TypeAdapter(PatientCreate)
+
+# CSV header names are matched case-insensitively ("birthdate" -> "birthDate")
+_CSV_FIELDS = {name.lower(): name for name in PatientCreate.model_fields}
+
+
+# -------------------------------------------------------------------
+# Upload parsing
+# -------------------------------------------------------------------
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Split a stream of UTF-8 bytes into text lines as they arrive.
+
+    Args:
+        chunks (AsyncIterator[bytes]): Request body chunks.
+
+    Yields:
+        str: Lines without their line terminator.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_csv(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Optional[dict]]]:
+    """
+    Parse CSV lines (first line is the header) into row dictionaries.
+
+    A quoted field may contain newlines: physical lines are joined until
+    the quotes are balanced before the record is parsed. Header names are
+    matched to the PatientCreate fields case-insensitively.
+
+    Args:
+        lines (AsyncIterator[str]): Lines of the upload.
+
+    Yields:
+        Tuple[int, Optional[dict]]: Line number of the record and its fields
+        (None if the record has the wrong number of columns).
+    """
+    header = None
+    record, start, number = "", 0, 0
+    async for line in lines:
+        number += 1
+        if not record:
+            start = number
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        text, line_no, record = record, start, ""
+
+        if not text.strip():
+            continue
+        fields = next(csv.reader([text]))
+        if header is None:
+            header = [_CSV_FIELDS.get(h.strip().lower(), h.strip()) for h in fields]
+            continue
+        yield line_no, dict(zip(header, fields)) if len(fields) == len(header) else None
+
+
+async def iter_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Optional[dict]]]:
+    """
+    Parse NDJSON lines into row dictionaries.
+
+    Args:
+        lines (AsyncIterator[str]): Lines of the upload.
+
+    Yields:
+        Tuple[int, Optional[dict]]: Line number and the decoded object
+        (None if the line is not a JSON object).
+    """
+    number = 0
+    async for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            value = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            value = None
+        yield number, value if isinstance(value, dict) else None
+
+
+def parse_upload(media_type: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[dict]]]:
+    """
+    Pick the parser for the upload's Content-Type.
+
+    Args:
+        media_type (str): Content-Type of the request.
+        chunks (AsyncIterator[bytes]): Request body chunks.
+
+    Raises:
+        HTTPException: 415 if the media type is not CSV or NDJSON.
+
+    Returns:
+        AsyncIterator[Tuple[int, Optional[dict]]]: Line numbers and rows.
+    """
+    media_type = media_type.split(";")[0].strip().lower()
+    if media_type == CSV_MEDIA_TYPE:
+        return iter_csv(iter_lines(chunks))
+    if media_type in (NDJSON_MEDIA_TYPE, "application/jsonl"):
+        return iter_ndjson(iter_lines(chunks))
+    raise HTTPException(status_code=415, detail=f"Expected {CSV_MEDIA_TYPE} or {NDJSON_MEDIA_TYPE}")
+
+
+def _validation_detail(e: ValidationError) -> str:
+    """Summarize a pydantic error in one line."""
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+
+# -------------------------------------------------------------------
+# Import
+# -------------------------------------------------------------------
+async def import_patients(
+    conn: asyncpg.Connection,
+    rows: AsyncIterator[Tuple[int, Optional[dict]]],
+) -> BulkImportReport:
+    """
+    Validate, stage and merge patient rows.
+
+    Must run inside a transaction (the staging table is dropped on commit).
+
+    Args:
+        conn (asyncpg.Connection): Connection inside a transaction.
+        rows (AsyncIterator[Tuple[int, Optional[dict]]]): Parsed upload.
+
+    Returns:
+        BulkImportReport: Counters and details of the skipped rows.
+    """
+    await conn.execute("""
+        CREATE TEMP TABLE patient_import (
+            line INTEGER NOT NULL,
+            username VARCHAR(50) NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            birthdate DATE NOT NULL
+        ) ON COMMIT DROP
+    """)
+
+    issues: List[BulkRowIssue] = []
+    received = invalid = 0
+    seen: Dict[str, int] = {}
+    batch: List[tuple] = []
+
+    def skip(line: int, username: Optional[str], detail: str) -> None:
+        if len(issues) < MAX_REPORTED_ISSUES:
+            issues.append(BulkRowIssue(line=line, username=username, detail=detail))
+
+    async def flush() -> None:
+        await conn.copy_records_to_table(
+            "patient_import", records=batch, columns=["line", "username", "name", "birthdate"]
+        )
+        batch.clear()
+
+    async for line, data in rows:
+        received += 1
+        if data is None:
+            invalid += 1
+            skip(line, None, "Malformed row")
+            continue
+        try:
+            patient = _patient.validate_python(data)
+        except ValidationError as e:
+            invalid += 1
+            username = data.get("username")
+            skip(line, username if isinstance(username, str) else None, _validation_detail(e))
+            continue
+        if patient.username in seen:
+            invalid += 1
+            skip(line, patient.username, f"Duplicate of line {seen[patient.username]}")
+            continue
+
+        seen[patient.username] = line
+        batch.append((line, patient.username, patient.name, patient.birthDate))
+        if len(batch) >= COPY_BATCH_SIZE:
+            await flush()
+
+    if batch:
+        await flush()
+
+    conflicts = await conn.fetch("""
+        WITH inserted AS (
+            INSERT INTO patients (username, name, birthDate)
+            SELECT username, name, birthdate FROM patient_import
+            ON CONFLICT (username) DO NOTHING
+            RETURNING username
+        )
+        SELECT s.line, s.username
+        FROM patient_import s
+        WHERE NOT EXISTS (SELECT 1 FROM inserted i WHERE i.username = s.username)
+        ORDER BY s.line
+    """)
+    for row in conflicts:
+        skip(row["line"], row["username"], "Username already exists")
+
+    issues.sort(key=lambda issue: issue.line)
+    return BulkImportReport(
+        received=received,
+        inserted=len(seen) - len(conflicts),
+        invalid=invalid,
+        conflicts=len(conflicts),
+        issues=issues,
+    )
@@ -0,0 +1,181 @@
+"""
+cache.py
+--------
+Bounded in-process cache for Clinic Manager read endpoints.
+
+A TTLCache keeps at most ``maxsize`` entries, evicts the least recently
+used one when full and treats entries older than ``ttl`` seconds as
+missing. It is meant for small, rarely written tables (the doctor
+directory) whose write handlers invalidate it synchronously, so a single
+worker never serves data older than its own last write.
+
+Each invalidation bumps a generation counter. A reader takes the
+generation before querying the database and passes it back to ``set``;
+if a write invalidated the cache in between, the (possibly stale) result
+is not stored.
+
+With several uvicorn workers each process has its own caches. Write
+handlers therefore also publish the changed key with ``NOTIFY`` on
+CACHE_CHANNEL (see notify_invalidation); every worker listens on that
+channel (db.CacheListener) and applies the invalidation locally.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import asyncpg
+from loguru import logger
+
+# Returned by TTLCache.get when the key is absent or expired
+MISSING = object()
+
+# Postgres channel carrying "<entity>:<key>" invalidation messages
+CACHE_CHANNEL = "cache_invalidate"
+
+
+class TTLCache:
+    """
+    Size- and time-bounded LRU cache with hit/miss counters.
+
+    Attributes:
+        maxsize (int): Maximum number of entries kept.
+        ttl (float): Seconds an entry stays valid.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that had to go to the database.
+        evictions (int): Entries dropped because the cache was full.
+        generation (int): Incremented on every invalidation.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Look up a key.
+
+        Args:
+            key (Hashable): Cache key.
+
+        Returns:
+            Any: Cached value, or MISSING if absent or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """
+        Store a value, evicting the least recently used entry if full.
+
+        Args:
+            key (Hashable): Cache key.
+            value (Any): Value to store.
+            generation (Optional[int]): Generation read before the value was
+                fetched; the value is dropped if the cache was invalidated since.
+        """
+        if generation is not None and generation != self.generation:
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drop a single key.
+
+        Args:
+            key (Hashable): Cache key.
+        """
+        self.generation += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the cache counters.
+
+        Returns:
+            Dict[str, int]: Size, hits, misses and evictions.
+        """
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# -------------------------------------------------------------------
+# Cross-worker invalidation
+# -------------------------------------------------------------------
+# Invalidation callbacks by entity name. A callback receives the changed
+# key, or None when every entry of the entity must be dropped.
+_invalidators: Dict[str, Callable[[Optional[str]], None]] = {}
+
+
+def register_invalidator(entity: str, func: Callable[[Optional[str]], None]) -> None:
+    """
+    Register the callback that invalidates the caches of an entity.
+
+    Args:
+        entity (str): Entity name used in the notification payload (e.g. "doctor").
+        func (Callable[[Optional[str]], None]): Invalidation callback.
+    """
+    _invalidators[entity] = func
+
+
+def apply_invalidation(payload: str) -> None:
+    """
+    Apply an invalidation message received on CACHE_CHANNEL.
+
+    Args:
+        payload (str): Message in the form "<entity>:<key>".
+    """
+    entity, _, key = payload.partition(":")
+    func = _invalidators.get(entity)
+    if func is None:
+        logger.warning(f"Cache invalidation for unknown entity: {payload!r}")
+        return
+    func(key)
+
+
+def invalidate_all() -> None:
+    """Drop every registered cache (e.g. after missing notifications)."""
+    for func in _invalidators.values():
+        func(None)
+
+
+async def notify_invalidation(conn: asyncpg.Connection, entity: str, key: str) -> None:
+    """
+    Tell every worker (this one included) that a cached key changed.
+
+    Args:
+        conn (asyncpg.Connection): Connection used for the write.
+        entity (str): Entity name (e.g. "doctor").
+        key (str): Key of the changed row.
+    """
+    await conn.execute("SELECT pg_notify($1, $2)", CACHE_CHANNEL, f"{entity}:{key}")
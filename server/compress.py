@@ -0,0 +1,240 @@
+"""
+compress.py
+-----------
+Response compression middleware for Clinic Manager.
+
+Negotiates the content coding from ``Accept-Encoding``: zstd and brotli
+when their optional packages (``zstandard``, ``Brotli``) are installed,
+gzip always. Responses are compressed only when it pays off:
+
+    - bodies smaller than the configured threshold are sent as-is
+    - bodies that already have a Content-Encoding, or whose media type is
+      already compressed (images, archives, PDFs...), are sent as-is
+    - streaming responses (e.g. the NDJSON exports) are compressed chunk
+      by chunk and flushed after every chunk, never buffered
+
+Strong ETags get a ``-<coding>`` suffix whenever a coding is negotiated,
+since the encoded bytes differ from the identity representation (see
+etag.py).
+"""
+
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from etag import ETAG_HEADER, encoded_etag
+
+try:
+    import brotli
+except ImportError:  # pragma: nocover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: nocover
+    zstandard = None
+
+
+# Media types that are already compressed and gain nothing from another pass
+INCOMPRESSIBLE_TYPES = (
+    "image/", "video/", "audio/",
+    "application/zip", "application/gzip", "application/x-gzip",
+    "application/x-7z-compressed", "application/x-rar-compressed",
+    "application/zstd", "application/pdf", "application/octet-stream",
+)
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+
+# -------------------------------------------------------------------
+# Compressors
+# -------------------------------------------------------------------
+class _Compressor:
+    """
+    Incremental compressor for one response.
+
+    ``compress`` returns whatever output is ready for a chunk, flushed so
+    the client can decode it right away; ``finish`` ends the stream.
+    """
+
+    def __init__(self, compress: Callable[[bytes], bytes], finish: Callable[[], bytes]):
+        self.compress = compress
+        self.finish = finish
+
+
+def _gzip() -> _Compressor:
+    obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return _Compressor(
+        lambda chunk: obj.compress(chunk) + obj.flush(zlib.Z_SYNC_FLUSH),
+        obj.flush,
+    )
+
+
+def _brotli() -> _Compressor:
+    obj = brotli.Compressor(quality=BROTLI_QUALITY)
+    return _Compressor(
+        lambda chunk: obj.process(chunk) + obj.flush(),
+        obj.finish,
+    )
+
+
+def _zstd() -> _Compressor:
+    obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return _Compressor(
+        lambda chunk: obj.compress(chunk) + obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+        obj.flush,
+    )
+
+
+# Supported codings in server preference order
+CODINGS: List[Tuple[str, Callable[[], _Compressor]]] = [
+    (name, factory)
+    for name, factory, available in (
+        ("zstd", _zstd, zstandard is not None),
+        ("br", _brotli, brotli is not None),
+        ("gzip", _gzip, True),
+    )
+    if available
+]
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the content coding to use from an Accept-Encoding header.
+
+    Args:
+        accept_encoding (str): Header value sent by the client.
+
+    Returns:
+        Optional[str]: Supported coding accepted by the client (server
+        preference first), or None to send the identity representation.
+    """
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip()] = q
+
+    for name, _ in CODINGS:
+        if accepted.get(name, accepted.get("*", 0.0)) > 0:
+            return name
+    return None
+
+
+# -------------------------------------------------------------------
+# Middleware
+# -------------------------------------------------------------------
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with gzip, brotli or zstd.
+
+    Attributes:
+        app (ASGIApp): Wrapped application.
+        minimum_size (int): Smallest complete body (bytes) worth compressing.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(send, coding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Wraps ``send`` for one request and compresses the body it carries."""
+
+    def __init__(self, send: Send, coding: str, minimum_size: int):
+        self._send = send
+        self.coding = coding
+        self.minimum_size = minimum_size
+        self.start: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    def _compressible(self, headers: Headers) -> bool:
+        status = self.start["status"]
+        if status < 200 or status in (204, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        media_type = headers.get("content-type", "").lower()
+        return not media_type.startswith(INCOMPRESSIBLE_TYPES)
+
+    def _set_headers(self, length: Optional[int]) -> None:
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers["Content-Encoding"] = self.coding
+        headers.add_vary_header("Accept-Encoding")
+        if length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(length)
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # The bytes sent depend on the negotiated coding (and on the body,
+            # which the ETag already covers), so 304s and bodies below the
+            # threshold carry the same suffixed ETag as compressed ones.
+            headers = MutableHeaders(raw=message["headers"])
+            if ETAG_HEADER in headers:
+                headers[ETAG_HEADER] = encoded_etag(headers[ETAG_HEADER], self.coding)
+            # Wait for the first body chunk to know the size / streaming mode
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            compressible = self._compressible(Headers(raw=self.start["headers"]))
+            if not compressible or (not more_body and len(body) < self.minimum_size):
+                if compressible:
+                    # Larger bodies of this response would be encoded
+                    MutableHeaders(raw=self.start["headers"]).add_vary_header("Accept-Encoding")
+                self.passthrough = True
+                await self._send(self.start)
+                await self._send(message)
+                return
+
+            self.compressor = dict(CODINGS)[self.coding]()
+            if not more_body:
+                # Whole body available: compress in one go and set its length
+                data = self.compressor.compress(body) + self.compressor.finish()
+                self._set_headers(len(data))
+                await self._send(self.start)
+                await self._send({"type": "http.response.body", "body": data})
+                return
+
+            # Streaming: chunked transfer, compressed and flushed per chunk
+            self._set_headers(None)
+            await self._send(self.start)
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.finish()
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
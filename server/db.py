@@ -3,21 +3,45 @@ db.py
 -----
 Database module for Clinic Manager.
 
-This module handles the database connection pool, table creation,
-role management, grants, and row-level security (RLS) policies. It
-provides a lifespan context for FastAPI and initializes the database
-with required tables, roles, policies, and test users.
+This module handles the database connection pool and database
+initialization. It provides a lifespan context for FastAPI that applies
+pending schema migrations (tables, indexes, roles, grants and row-level
+security policies, see migrate.py) and seeds the test users.
+
+Pool connections time every query: durations and row counts are exported
+by query fingerprint, added to the Server-Timing header of the request
+(see timing.py) and queries slower than ``settings.slow_query_ms`` are
+logged with the route that ran them.
 """
 
+import asyncio
+import hashlib
+import math
+import re
+import time
 from contextlib import asynccontextmanager
+from functools import lru_cache
 from os import environ
-from typing import AsyncIterator
+from urllib.parse import quote
+from typing import AsyncIterator, Optional, Tuple
 
 import asyncpg
 from loguru import logger
-from starlette.types import ASGIApp
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from dotenv import load_dotenv
-from users import hash_password
+from fastapi import HTTPException, Request, Response
+from users import hash_password_async, ensure_user_role, quote_ident
+from migrate import MIGRATION_LOCK_ID, migrate
+from cache import CACHE_CHANNEL, apply_invalidation, invalidate_all
+from model import UserToken
+from storage import settings
+from serializers import FastJSONResponse
+from metrics import (
+    DB_POOL_ACQUIRE, DB_POOL_IDLE, DB_POOL_SIZE, DB_POOL_TIMEOUTS, DB_POOL_WAITERS,
+    DB_QUERY_DURATION, DB_QUERY_ROWS,
+)
+from timing import current_timing
 
 load_dotenv()
 
@@ -31,18 +55,49 @@ async def lifespan(app: ASGIApp) -> AsyncIterator[None]:
     """
     Async context manager for FastAPI lifespan.
 
-    Creates a connection pool, initializes the database, and ensures
-    the pool is closed on shutdown.
+    Creates a connection pool sized from the settings (plus one for the
+    read replica, if configured, as ``app.state.read_pool``; otherwise
+    that is the primary pool), initializes the database, warms the pools
+    (and keeps them warm, see MeteredPool.warm),
+    starts the cache invalidation listener, and ensures both are closed on
+    shutdown.
     """
-    app.state.pool = await asyncpg.create_pool(
-        dsn=DATABASE_URL,
-        min_size=1,
-        max_size=10,
+    pool_options = dict(
+        min_size=settings.db_pool_min_size,
+        max_size=settings.db_pool_max_size,
+        max_inactive_connection_lifetime=settings.db_pool_max_inactive_lifetime,
+        statement_cache_size=settings.db_statement_cache_size,
+        acquire_timeout=settings.db_pool_acquire_timeout,
     )
+    app.state.pool = await create_pool(DATABASE_URL, **pool_options)
+    pool = app.state.pool
+    app.state.read_pool = pool
+    DB_POOL_SIZE.set_function(pool.get_size)
+    DB_POOL_IDLE.set_function(pool.get_idle_size)
+    DB_POOL_WAITERS.set_function(lambda: pool.waiters)
+    cache_listener = CacheListener(DATABASE_URL)
+    keep_warm = []
     try:
         await init_db(app.state.pool)
+        if settings.read_replica_url:
+            app.state.read_pool = await create_pool(settings.read_replica_url, **pool_options)
+            logger.info("Read replica pool created.")
+        pools = [pool] if app.state.read_pool is pool else [pool, app.state.read_pool]
+        for p in pools:
+            await p.warm()
+            if settings.db_pool_max_inactive_lifetime:
+                keep_warm.append(asyncio.create_task(p.keep_warm(settings.db_pool_max_inactive_lifetime / 2)))
+        await cache_listener.start()
         yield
     finally:
+        for task in keep_warm:
+            task.cancel()
+        await cache_listener.close()
+        if getattr(app.state, "read_pool", pool) is not pool:
+            try:
+                await app.state.read_pool.close()
+            except Exception as e:
+                logger.error(f"Error closing read replica pool: {e}")
         if hasattr(app.state, "pool"):
             try:
                 await app.state.pool.close()
@@ -52,242 +107,506 @@ async def lifespan(app: ASGIApp) -> AsyncIterator[None]:
 
 
 # ============================================================
-#                     TABLE DEFINITIONS
+#                         CONNECTION POOL
 # ============================================================
 
-patients_table = """
-CREATE TABLE IF NOT EXISTS patients (
-    username VARCHAR(50) PRIMARY KEY,
-    name VARCHAR(100) NOT NULL,
-    birthDate DATE NOT NULL
-);
-"""
+# String and numeric literals, replaced by "?" in query fingerprints
+# ($n placeholders and digits inside identifiers are kept)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|(?<![\w$.])\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
 
-doctors_table = """
-CREATE TABLE IF NOT EXISTS doctors (
-    username VARCHAR(50) PRIMARY KEY,
-    name VARCHAR(100) NOT NULL,
-    specialty VARCHAR(100)
-);
-"""
 
-diagnosis_table = """
-CREATE TABLE IF NOT EXISTS diagnosis (
-    id_diagnosis SERIAL PRIMARY KEY,
-    diagnosis_date DATE NOT NULL,
-    icd VARCHAR(7),
-    description TEXT,
-    patient_id VARCHAR(50) NOT NULL REFERENCES patients(username) ON DELETE CASCADE,
-    doctor_id VARCHAR(50) REFERENCES doctors(username) ON DELETE SET NULL
-);
-"""
+@lru_cache(maxsize=1024)
+def fingerprint(query: str) -> Tuple[str, str]:
+    """
+    Normalize a query so that its variants group together.
 
-appointments_table = """
-CREATE TABLE IF NOT EXISTS appointments (
-    id_appointment SERIAL PRIMARY KEY,
-    appointment_date TIMESTAMP NOT NULL,
-    status VARCHAR(20) NOT NULL DEFAULT 'scheduled',
-    reason TEXT,
-    patient_id VARCHAR(50) NOT NULL REFERENCES patients(username) ON DELETE CASCADE,
-    doctor_id VARCHAR(50) REFERENCES doctors(username) ON DELETE SET NULL
-);
-"""
+    Literals become ``?`` and whitespace is collapsed; queries differing only
+    in those share a fingerprint. Results are cached, since nearly every
+    query is a constant string.
 
-files_table = """
-CREATE TABLE IF NOT EXISTS files (
-    id_file SERIAL PRIMARY KEY,
-    file_name VARCHAR(255) NOT NULL,
-    original_name VARCHAR(255),
-    url TEXT NOT NULL,
-    mime_type VARCHAR(100),
-    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    patient_id VARCHAR(50) NOT NULL REFERENCES patients(username) ON DELETE CASCADE,
-    doctor_id VARCHAR(50) REFERENCES doctors(username) ON DELETE SET NULL,
-    diagnosis_id INTEGER REFERENCES diagnosis(id_diagnosis) ON DELETE CASCADE,
-    appointment_id INTEGER REFERENCES appointments(id_appointment) ON DELETE CASCADE
-);
-"""
+    Args:
+        query (str): SQL text.
 
-users_table = """
-CREATE TABLE IF NOT EXISTS users (
-    username VARCHAR(50) PRIMARY KEY,
-    hashed_password TEXT NOT NULL,
-    role TEXT NOT NULL CHECK (role IN ('patient', 'doctor', 'admin')),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-"""
+    Returns:
+        Tuple[str, str]: Short hash of the normalized text, and the text.
+    """
+    normalized = _SPACES.sub(" ", _LITERALS.sub("?", query)).strip()
+    return hashlib.blake2b(normalized.encode(), digest_size=4).hexdigest(), normalized
+
+
+def record_query(query: str, elapsed: float, rows: Optional[int]) -> None:
+    """
+    Record one query: metrics, request timing and the slow-query log.
+
+    Queries slower than ``settings.slow_query_ms`` are logged with their
+    fingerprint, row count, the route of the request that ran them and the
+    time that request spent waiting for a pool connection.
+
+    Args:
+        query (str): SQL text.
+        elapsed (float): Duration in seconds.
+        rows (Optional[int]): Rows returned or affected, None if unknown
+            (e.g. the query failed).
+    """
+    key, text = fingerprint(query)
+    DB_QUERY_DURATION.observe(elapsed, (key,))
+    if rows:
+        DB_QUERY_ROWS.inc((key,), rows)
+    timing = current_timing.get()
+    if timing is not None:
+        timing.db += elapsed
+        timing.queries += 1
+    if elapsed * 1000 >= settings.slow_query_ms:
+        route = timing.route if timing is not None else "-"
+        wait = timing.acquire * 1000 if timing is not None else 0.0
+        logger.warning(
+            f"Slow query {key}: {elapsed * 1000:.1f} ms, rows={rows}, route={route}, "
+            f"pool wait={wait:.1f} ms: {text[:500]}"
+        )
+
+
+def _status_rows(status: str) -> Optional[int]:
+    """Row count of a command status such as ``UPDATE 3`` or ``INSERT 0 1``."""
+    count = status.rpartition(" ")[2]
+    return int(count) if count.isdigit() else None
+
+
+class _QueryTimer:
+    __slots__ = ("query", "rows", "start")
+
+    def __init__(self, query: str):
+        self.query = query
+        self.rows = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_query(self.query, time.perf_counter() - self.start, self.rows)
+
+
+class TimedConnection(asyncpg.Connection):
+    """
+    asyncpg connection timing every query it runs (see record_query).
+
+    Covers ``fetch``, ``fetchrow``, ``fetchval``, ``execute``,
+    ``executemany`` and ``copy_records_to_table``; cursors (the streaming
+    exports) are not timed per fetch.
+    """
+
+    async def fetch(self, query, *args, **kwargs):
+        with _QueryTimer(query) as timer:
+            rows = await super().fetch(query, *args, **kwargs)
+            timer.rows = len(rows)
+        return rows
+
+    async def fetchrow(self, query, *args, **kwargs):
+        with _QueryTimer(query) as timer:
+            row = await super().fetchrow(query, *args, **kwargs)
+            timer.rows = 0 if row is None else 1
+        return row
+
+    async def fetchval(self, query, *args, **kwargs):
+        with _QueryTimer(query) as timer:
+            value = await super().fetchval(query, *args, **kwargs)
+            timer.rows = 1
+        return value
+
+    async def execute(self, query, *args, **kwargs):
+        with _QueryTimer(query) as timer:
+            status = await super().execute(query, *args, **kwargs)
+            timer.rows = _status_rows(status)
+        return status
+
+    async def executemany(self, command, args, **kwargs):
+        with _QueryTimer(command) as timer:
+            result = await super().executemany(command, args, **kwargs)
+            timer.rows = len(args) if isinstance(args, (list, tuple)) else None
+        return result
+
+    async def copy_records_to_table(self, table_name, **kwargs):
+        with _QueryTimer(f"COPY {table_name}") as timer:
+            status = await super().copy_records_to_table(table_name, **kwargs)
+            timer.rows = _status_rows(status)
+        return status
+
+
+class PoolTimeoutError(TimeoutError):
+    """No pool connection became free within the acquire timeout."""
+
+
+class _MeteredAcquire:
+    """
+    What MeteredPool.acquire() returns: like asyncpg's own acquire context
+    it can be awaited for a connection or used with ``async with``, which
+    releases the connection on exit.
+    """
+
+    __slots__ = ("pool", "timeout", "connection")
+
+    def __init__(self, pool: "MeteredPool", timeout: Optional[float]):
+        self.pool = pool
+        self.timeout = timeout
+        self.connection = None
+
+    async def __aenter__(self):
+        self.connection = await self.pool._wait_for_connection(self.timeout)
+        return self.connection
+
+    async def __aexit__(self, *exc):
+        connection, self.connection = self.connection, None
+        await self.pool.release(connection)
+
+    def __await__(self):
+        return self.pool._wait_for_connection(self.timeout).__await__()
+
+
+class MeteredPool(asyncpg.Pool):
+    """
+    asyncpg pool that measures how long callers wait for a connection.
+
+    acquire() is wrapped, so every acquisition (``async with
+    pool.acquire()``, ``await pool.acquire()`` and the ``pool.fetch*``
+    shortcuts, which call ``self.acquire()``) counts the callers currently
+    waiting and records the wait in the db_pool_acquire_seconds histogram
+    and in the timing of the current request. Acquisitions without an
+    explicit timeout use ``acquire_timeout``; running out of it raises
+    PoolTimeoutError (a 503 for API requests) instead of queueing forever.
+
+    Attributes:
+        min_size (int): Connections kept open, see warm().
+        acquire_timeout (Optional[float]): Default acquire timeout in
+            seconds, None to wait indefinitely.
+        waiters (int): Callers waiting for a free connection right now.
+    """
+
+    def __init__(self, *args, acquire_timeout: Optional[float] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = kwargs["min_size"]
+        self.acquire_timeout = acquire_timeout
+        self.waiters = 0
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _MeteredAcquire:
+        return _MeteredAcquire(self, self.acquire_timeout if timeout is None else timeout)
+
+    async def _wait_for_connection(self, timeout: Optional[float]):
+        self.waiters += 1
+        start = time.perf_counter()
+        try:
+            return await super().acquire(timeout=timeout)
+        except asyncio.TimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise PoolTimeoutError(f"no database connection free within {timeout} s") from None
+        finally:
+            self.waiters -= 1
+            elapsed = time.perf_counter() - start
+            DB_POOL_ACQUIRE.observe(elapsed)
+            timing = current_timing.get()
+            if timing is not None:
+                timing.acquire += elapsed
+
+    async def warm(self) -> None:
+        """
+        Make sure ``min_size`` connections are open and usable.
+
+        asyncpg connects ``min_size`` connections when the pool starts, but
+        closes every connection idle for ``max_inactive_connection_lifetime``
+        seconds, the minimum included, so the first requests after a quiet
+        period would pay for new connections. Using ``min_size`` connections
+        at once reopens the closed ones and restarts their inactivity timers.
+        """
+        async def touch():
+            async with self.acquire() as conn:
+                await conn.execute("SELECT 1")
+
+        await asyncio.gather(*(touch() for _ in range(self.min_size)))
+
+    async def keep_warm(self, interval: float) -> None:
+        """
+        Call warm() every ``interval`` seconds while no caller is waiting.
+
+        Args:
+            interval (float): Seconds between two warm-ups, shorter than the
+                inactive connection lifetime.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            if self.waiters:
+                continue  # Busy pool, its connections are in use anyway
+            try:
+                await self.warm()
+            except Exception as e:
+                logger.warning(f"Could not warm the database pool: {e}")
+
+
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError) -> Response:
+    """
+    Answer requests that could not get a database connection in time.
+
+    Returns:
+        Response: 503 with a Retry-After header.
+    """
+    logger.warning(f"{request.method} {request.url.path}: {exc}")
+    return FastJSONResponse(
+        status_code=503,
+        content={"detail": "Database busy, please retry"},
+        headers={"Retry-After": str(settings.db_pool_retry_after)},
+    )
+
+
+async def create_pool(dsn: str, **kwargs) -> MeteredPool:
+    """
+    Create and initialize a MeteredPool.
+
+    Takes the same keyword arguments as ``asyncpg.create_pool``, with the
+    same defaults, except that connections are TimedConnections, plus
+    ``acquire_timeout`` (see MeteredPool).
+
+    Args:
+        dsn (str): Database URL.
+        **kwargs: Pool and connection options.
+
+    Returns:
+        MeteredPool: Initialized pool.
+    """
+    options = dict(
+        min_size=10,
+        max_size=10,
+        max_queries=50000,
+        max_inactive_connection_lifetime=300.0,
+        loop=None,
+        connection_class=TimedConnection,
+        record_class=asyncpg.Record,
+    )
+    options.update(kwargs)
+    return await MeteredPool(dsn, **options)
 
 
 # ============================================================
-#                     ROLE CREATION
+#                          READ REPLICA
 # ============================================================
 
-roles_sql = """
-DO $$
-BEGIN
-    IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname='patient') THEN
-        CREATE ROLE patient;
-    END IF;
-
-    IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname='doctor') THEN
-        CREATE ROLE doctor;
-    END IF;
-
-    IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname='anonymous') THEN
-        CREATE ROLE anonymous;
-    END IF;
-
-    IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname='admin') THEN
-        CREATE ROLE admin LOGIN PASSWORD 'admin';
-    END IF;
-END $$;
-"""
+# Cookie carrying a recent write of the user back to any worker
+RECENT_WRITE_COOKIE = "recent_write"
+
+
+def recent_write_marker(username: str) -> str:
+    """Value of RECENT_WRITE_COOKIE for writes by ``username``."""
+    return quote(username, safe="")
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware remembering recent writes in a short-lived cookie.
+
+    Read handlers may be served by a replica that lags behind the primary;
+    a user who just wrote is sent to the primary for ``window`` seconds so
+    they see their own change. Write requests record their user in
+    ``request.state.writer`` (see api.get_current_user) and their response
+    sets RECENT_WRITE_COOKIE to that user for ``window`` seconds. The
+    cookie comes back with the next reads whichever uvicorn worker serves
+    them, which a per-process table of writers could not see. The window
+    starts when the write request is answered, so it should cover the
+    replica lag. A window of 0 disables the cookie.
+
+    Args:
+        app (ASGIApp): Wrapped application.
+        window (float): Seconds a user's reads stay on the primary.
+    """
+
+    def __init__(self, app: ASGIApp, window: float):
+        self.app = app
+        self.max_age = math.ceil(window)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.max_age:
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+
+        async def send_wrapper(message: Message) -> None:
+            writer = state.get("writer")
+            if message["type"] == "http.response.start" and writer is not None:
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{RECENT_WRITE_COOKIE}={recent_write_marker(writer)}; Max-Age={self.max_age}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
 
 # ============================================================
-#                     RLS + POLICIES
+#                     CACHE INVALIDATION LISTENER
 # ============================================================
 
-rls_sql = """
-ALTER TABLE patients ENABLE ROW LEVEL SECURITY;
-ALTER TABLE doctors ENABLE ROW LEVEL SECURITY;
-ALTER TABLE diagnosis ENABLE ROW LEVEL SECURITY;
-
--- PATIENT POLICIES
-DO $$
-BEGIN
-    BEGIN
-        CREATE POLICY patients_patient ON patients
-            FOR SELECT TO patient
-            USING (username = current_user);
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-
-    BEGIN
-        CREATE POLICY diagnosis_patient ON diagnosis
-            FOR SELECT TO patient
-            USING (patient_id = current_user);
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-
-    BEGIN
-        CREATE POLICY doctors_patient ON doctors
-            FOR SELECT TO patient
-            USING (
-                username IN (SELECT doctor_id FROM diagnosis WHERE patient_id = current_user)
-            );
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-    
--- DOCTOR POLICIES
-    BEGIN
-        CREATE POLICY diagnosis_doctor ON diagnosis
-            FOR SELECT TO doctor
-            USING (doctor_id = current_user);
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-
-    BEGIN
-        CREATE POLICY patients_doctor ON patients
-            FOR SELECT TO doctor
-            USING (
-                username IN (SELECT patient_id FROM diagnosis WHERE doctor_id = current_user)
-            );
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-    
--- ANONYMOUS POLICIES
-    BEGIN
-        CREATE POLICY diagnosis_anonymous ON diagnosis
-            FOR SELECT TO anonymous
-            USING (false);
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-END $$;
-"""
+class CacheListener:
+    """
+    Dedicated connection listening for cache invalidations from any worker.
 
-rls_appointments_sql = """
-ALTER TABLE appointments ENABLE ROW LEVEL SECURITY;
-
-DO $$
-BEGIN
-    -- El pacient veu només les seves cites
-    BEGIN
-        CREATE POLICY appointments_patient_select ON appointments
-            FOR SELECT TO patient
-            USING (patient_id = current_user);
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-
-    -- El doctor veu només les cites on participa
-    BEGIN
-        CREATE POLICY appointments_doctor_select ON appointments
-            FOR SELECT TO doctor
-            USING (doctor_id = current_user);
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-
-    -- Anonymous no veu res
-    BEGIN
-        CREATE POLICY appointments_anonymous_noaccess ON appointments
-            FOR SELECT TO anonymous
-            USING (false);
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-END $$;
-"""
+    Messages received on CACHE_CHANNEL are applied to this process's caches.
+    If the connection is lost, notifications sent meanwhile are missed, so
+    every cache is dropped and the listener reconnects with backoff.
+
+    Attributes:
+        dsn (str): Database URL.
+        conn (Optional[asyncpg.Connection]): Listening connection.
+    """
+
+    RECONNECT_DELAYS = (0.5, 1, 2, 5, 10)
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.conn = None
+        self._reconnect = None
+        self._closing = False
+
+    async def start(self) -> None:
+        """Open the connection and LISTEN on the invalidation channel."""
+        self.conn = await asyncpg.connect(self.dsn)
+        await self.conn.add_listener(CACHE_CHANNEL, self._on_notify)
+        self.conn.add_termination_listener(self._on_terminate)
+
+    async def close(self) -> None:
+        """Stop listening and close the connection."""
+        self._closing = True
+        if self._reconnect is not None:
+            self._reconnect.cancel()
+        if self.conn is not None and not self.conn.is_closed():
+            await self.conn.close()
+
+    def _on_notify(self, conn: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        apply_invalidation(payload)
+
+    def _on_terminate(self, conn: asyncpg.Connection) -> None:
+        if self._closing:
+            return
+        logger.warning("Cache listener connection lost; dropping caches and reconnecting.")
+        invalidate_all()
+        self._reconnect = asyncio.create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self) -> None:
+        attempt = 0
+        while not self._closing:
+            await asyncio.sleep(self.RECONNECT_DELAYS[min(attempt, len(self.RECONNECT_DELAYS) - 1)])
+            try:
+                await self.start()
+            except (OSError, asyncpg.PostgresError) as e:
+                attempt += 1
+                logger.warning(f"Cache listener reconnect failed: {e}")
+                continue
+            # Anything written while disconnected was not announced to us
+            invalidate_all()
+            logger.info("Cache listener reconnected.")
+            return
 
-rls_files_sql = """
-ALTER TABLE files ENABLE ROW LEVEL SECURITY;
-
-DO $$
-BEGIN
-    -- Pacient pot veure només fitxers associats a ell
-    BEGIN
-        CREATE POLICY files_patient_select ON files
-            FOR SELECT TO patient
-            USING (patient_id = current_user);
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-
-    -- Doctor pot veure els fitxers associats als seus patients, diagnosis o appointments
-    BEGIN
-        CREATE POLICY files_doctor_select ON files
-            FOR SELECT TO doctor
-            USING (
-                -- Fitxers dels seus pacients
-                patient_id IN (SELECT patient_id FROM diagnosis WHERE doctor_id = current_user)
-                OR
-            
-                -- Fitxers associats a diagnòstics creats pel doctor
-                diagnosis_id IN (SELECT id_diagnosis FROM diagnosis WHERE doctor_id = current_user)
-                OR
-            
-                -- Fitxers associats a cites on participa el doctor
-                appointment_id IN (SELECT id_appointment FROM appointments WHERE doctor_id = current_user)
-            );
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-
-    -- Anonymous no veu res
-    BEGIN
-        CREATE POLICY files_anonymous_noaccess ON files
-            FOR SELECT TO anonymous
-            USING (false);
-    EXCEPTION WHEN duplicate_object THEN NULL;
-    END;
-END $$;
-"""
 
 # ============================================================
-#                     GRANTS
+#                     REQUEST CONNECTIONS
 # ============================================================
 
-grants_sql = """
-GRANT SELECT ON ALL TABLES IN SCHEMA public TO patient;
-GRANT SELECT ON ALL TABLES IN SCHEMA public TO doctor;
-GRANT SELECT ON ALL TABLES IN SCHEMA public TO admin;
-"""
+# Application roles whose reads are filtered by the RLS policies.
+# Admins keep the privileges of the pool owner.
+RLS_ROLES = {"patient", "doctor"}
+
+
+@asynccontextmanager
+async def rls_connection(pool: asyncpg.Pool, user: UserToken) -> AsyncIterator[asyncpg.Connection]:
+    """
+    Acquire a connection whose queries run as the user's database role.
+
+    For patients and doctors, a read-only transaction is opened and switched
+    to the per-user role with SET LOCAL ROLE in a single round trip, so the
+    RLS policies filter every query. The transaction is rolled back on exit,
+    which also drops the role before the connection goes back to the pool.
+    Admins see everything, so their connection is handed out as-is, with no
+    transaction to open or roll back.
+
+    Args:
+        pool (asyncpg.Pool): Database connection pool.
+        user (UserToken): Authenticated user.
+
+    Raises:
+        HTTPException: 403 if the user has no database role.
+
+    Yields:
+        asyncpg.Connection: Connection scoped to the user.
+    """
+    async with pool.acquire() as conn:
+        if user.role not in RLS_ROLES:
+            yield conn
+            return
+
+        try:
+            await conn.execute(f"BEGIN READ ONLY; SET LOCAL ROLE {quote_ident(user.username)}")
+        except asyncpg.exceptions.InvalidParameterValueError:
+            await conn.execute("ROLLBACK")
+            raise HTTPException(status_code=403, detail="No database role for user")
+        try:
+            yield conn
+        finally:
+            await conn.execute("ROLLBACK")
+
+
+# ============================================================
+#                     TEST USERS
+# ============================================================
+
+test_users = [
+    ("test_patient", "pass123", "patient"),
+    ("test_doctor", "pass123", "doctor"),
+    ("test_admin", "pass123", "admin"),
+]
+
+
+async def seed_test_users(pool: asyncpg.Pool) -> None:
+    """
+    Create the test users that do not exist yet, with their Postgres roles.
+
+    Existing users are checked with a single query, so a restart against a
+    seeded database does not compute any Argon2 hash nor take any lock.
+    Otherwise the users are created while holding the migration advisory
+    lock, so workers starting together on a fresh database do not race on
+    CREATE ROLE / GRANT; the check is repeated under the lock. Missing users
+    are hashed in the password hashing thread pool.
+
+    Args:
+        pool (asyncpg.Pool): Connection pool to execute queries.
+    """
+    usernames = [username for username, _, _ in test_users]
+    query = "SELECT username FROM users WHERE username = ANY($1)"
+
+    async with pool.acquire() as conn:
+        existing = {r["username"] for r in await conn.fetch(query, usernames)}
+        if len(existing) == len(usernames):
+            return
+
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            # Another worker may have seeded them while we waited for the lock
+            existing = {r["username"] for r in await conn.fetch(query, usernames)}
+            missing = [user for user in test_users if user[0] not in existing]
+            if not missing:
+                return
+
+            hashes = await asyncio.gather(*(hash_password_async(password) for _, password, _ in missing))
+            await conn.executemany(
+                """
+                INSERT INTO users (username, hashed_password, role)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (username) DO NOTHING
+                """,
+                [(username, hashed, role) for (username, _, role), hashed in zip(missing, hashes)]
+            )
+            for username, _, role in missing:
+                await ensure_user_role(conn, username, role)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+    logger.info(f"Seeded test users: {', '.join(u[0] for u in missing)}")
 
 
 # ============================================================
@@ -296,7 +615,7 @@ GRANT SELECT ON ALL TABLES IN SCHEMA public TO admin;
 
 async def init_db(pool: asyncpg.Pool) -> None:
     """
-    Initialize the database: tables, roles, RLS policies, grants, and test users.
+    Initialize the database: apply pending migrations and seed test users.
 
     Args:
         pool (asyncpg.Pool): Connection pool to execute queries.
@@ -305,43 +624,12 @@ async def init_db(pool: asyncpg.Pool) -> None:
         Exception: If any step of database initialization fails.
     """
     try:
-        async with pool.acquire() as conn:
-            # Create tables
-            await conn.execute(patients_table)
-            await conn.execute(doctors_table)
-            await conn.execute(diagnosis_table)
-            await conn.execute(appointments_table)
-            await conn.execute(files_table)
-            await conn.execute(users_table)
-
-            # Create roles
-            await conn.execute(roles_sql)
-
-            # Apply grants
-            await conn.execute(grants_sql)
-
-            # Apply RLS policies (patients, appointments, files)
-            # Assume RLS SQL strings defined above
-            await conn.execute(rls_sql)
-            await conn.execute(rls_appointments_sql)
-            await conn.execute(rls_files_sql)
-
-            # Create test users
-            test_users = [
-                ("test_patient", "pass123", "patient"),
-                ("test_doctor", "pass123", "doctor"),
-                ("test_admin", "pass123", "admin"),
-            ]
-            for username, password, role in test_users:
-                hashed = hash_password(password)
-                await conn.execute(
-                    """
-                    INSERT INTO users (username, hashed_password, role)
-                    VALUES ($1, $2, $3)
-                    ON CONFLICT (username) DO NOTHING
-                    """,
-                    username, hashed, role
-                )
+        # Tables, indexes, roles, grants and RLS policies
+        await migrate(pool)
+
+        # Test users (disabled in production)
+        if settings.seed_test_users:
+            await seed_test_users(pool)
 
         logger.info("Clinical database initialized successfully.")
 
@@ -0,0 +1,112 @@
+"""
+etag.py
+-------
+HTTP conditional GET support for Clinic Manager read endpoints.
+
+Every write to an entity table bumps one of its counters in
+``table_versions`` (migrations 0007 and 0011); the version of a table is
+the sum of its counters. The ETag of a read is a hash of the counters of the
+tables the response depends on (including the tables its RLS policies
+look at), the caller's identity and the request URL, so it changes
+whenever the response might. A request carrying a matching
+``If-None-Match`` is answered with 304 before the main query runs and
+before anything is serialized.
+
+Responses to clients accepting a compressed coding carry the ETag with a
+``-<coding>`` suffix (see compress.py); If-None-Match matching ignores that suffix, since the
+content behind both representations is the same.
+"""
+
+import hashlib
+from typing import Any, Optional, Sequence, Tuple
+
+import asyncpg
+
+ETAG_HEADER = "ETag"
+
+# Suffixes added to the ETag of compressed representations
+ENCODING_SUFFIXES = ("-gzip", "-br", "-zstd")
+
+
+async def table_versions(db: asyncpg.Pool, tables: Sequence[str]) -> Tuple[int, ...]:
+    """
+    Read the change counters of some tables.
+
+    Args:
+        db (asyncpg.Pool): Pool (or connection) to query.
+        tables (Sequence[str]): Table names, in the order the counters are returned.
+
+    Returns:
+        Tuple[int, ...]: Counter of each table (0 if it has none).
+    """
+    rows = await db.fetch(
+        """
+        SELECT table_name, SUM(version)::bigint AS version
+        FROM table_versions
+        WHERE table_name = ANY($1::text[])
+        GROUP BY table_name
+        """,
+        list(tables),
+    )
+    versions = {r["table_name"]: r["version"] for r in rows}
+    return tuple(versions.get(t, 0) for t in tables)
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Build a strong ETag from the values a response depends on.
+
+    Args:
+        *parts (Any): Values identifying the response (versions, user, URL...).
+
+    Returns:
+        str: Quoted ETag value.
+    """
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def encoded_etag(etag: str, coding: str) -> str:
+    """
+    Derive the ETag of a compressed representation.
+
+    Args:
+        etag (str): ETag of the identity representation.
+        coding (str): Content coding applied ("gzip", "br" or "zstd").
+
+    Returns:
+        str: ETag with the coding appended inside the quotes.
+    """
+    if not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+
+def _identity_etag(tag: str) -> str:
+    """Strip the weak prefix and any content-coding suffix from an ETag."""
+    tag = tag.strip().removeprefix("W/")
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix + '"'):
+            return tag[: -len(suffix) - 1] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against the current ETag.
+
+    Uses the weak comparison RFC 9110 prescribes for If-None-Match, and
+    treats the compressed variants of an ETag as the same entity.
+
+    Args:
+        if_none_match (Optional[str]): Header value sent by the client.
+        etag (str): Current ETag of the resource.
+
+    Returns:
+        bool: True if the client's copy is still current.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (_identity_etag(tag) for tag in if_none_match.split(","))
@@ -8,8 +8,10 @@ and includes the clinic-related API routes. It also provides a way to run
 the app locally using uvicorn.
 """
 
+import secrets
+
 import uvicorn
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -18,11 +20,20 @@ from pydantic import BaseModel
 from typing import List
 
 from api import clinic_router
+from pagination import NEXT_CURSOR_HEADER
+from serializers import FastJSONResponse
+from etag import ETAG_HEADER
+from batch import MISSING_IDS_HEADER
+from compress import CompressionMiddleware
+from storage import settings
+from metrics import metrics_endpoint
+from timing import ServerTimingMiddleware
 
 # Create FastAPI app instance
 app = FastAPI(
     lifespan=db.lifespan,   # Async context manager for database connection pool
-    title="Clinic Manager"
+    title="Clinic Manager",
+    default_response_class=FastJSONResponse,  # orjson-backed JSON rendering
 )
 
 # CORS només per desenvolupament amb React/Vite
@@ -37,11 +48,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER, MISSING_IDS_HEADER],
 )
 
+# gzip/brotli/zstd compression of large and streaming responses
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size)
+
+# Server-Timing header with the db/serialise/storage time of each request
+app.add_middleware(ServerTimingMiddleware)
+
+# Recent write cookie, keeping a user's reads on the primary after a write
+app.add_middleware(db.ReadYourWritesMiddleware, window=settings.read_your_writes_window)
+
 # Include all routes from the clinic API router
 app.include_router(clinic_router, prefix="/api", tags=["Clinic"])
 
+# Requests that time out waiting for a database connection get a 503
+app.add_exception_handler(db.PoolTimeoutError, db.pool_timeout_handler)
+
+
+async def scrape_metrics(request: Request) -> Response:
+    """
+    Serve /metrics to scrapers sending ``Authorization: Bearer <METRICS_TOKEN>``.
+
+    The metrics reveal routes, traffic and pool state, so they are never
+    public: without a token configured the endpoint answers 404, and a
+    missing or wrong token gets 401.
+    """
+    token = settings.metrics_token
+    if token is None:
+        return Response(status_code=404)
+    given = request.headers.get("authorization", "").encode()
+    if not secrets.compare_digest(given, f"Bearer {token}".encode()):
+        return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return await metrics_endpoint(request)
+
+
+# Prometheus scrape endpoint (per-process metrics, see metrics.py)
+app.add_route("/metrics", scrape_metrics, include_in_schema=False)
+
 if __name__ == "__main__":
     # Run the application locally with auto-reload enabled
     uvicorn.run("main:app", host="localhost", port=8080, reload=True)
\ No newline at end of file
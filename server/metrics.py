@@ -0,0 +1,290 @@
+"""
+metrics.py
+----------
+Prometheus metrics for Clinic Manager.
+
+A small implementation of the Prometheus text exposition format (counters,
+gauges and histograms with labels) served at ``/metrics``:
+
+    - per-route request counts, latency histograms and in-flight gauges,
+      recorded by InstrumentedRoute (the route class of the API router)
+    - asyncpg pool size, idle connections, waiters and acquire wait
+    - query duration and row count, by query fingerprint
+    - Argon2 hash/verify duration and queue depth, MinIO call duration
+
+Every update is a couple of dict/list operations done on the event loop
+thread (the Argon2 and MinIO timings are recorded once the worker thread
+hands its result back), so no locks are taken on the hot path. Values are
+per process: with several uvicorn workers each one exposes its own.
+"""
+
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request latency buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+# -------------------------------------------------------------------
+# Metric types
+# -------------------------------------------------------------------
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Base class of the metric types.
+
+    Attributes:
+        name (str): Metric name.
+        documentation (str): HELP text.
+        labelnames (Tuple[str, ...]): Label names, in the order values are passed.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Yield (name, formatted labels, value) for every series."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down, or is read from a function at scrape time.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        self._values[labels] = value
+
+    def set_function(self, function: Optional[Callable[[], float]]) -> None:
+        """Read the (unlabelled) value from ``function`` on every scrape."""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            yield self.name, "", self._function()
+            return
+        for labels, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class _Series:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+
+    Attributes:
+        buckets (Tuple[float, ...]): Upper bounds of the buckets, ascending
+            (+Inf is implicit).
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, _Series] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _Series(len(self.buckets) + 1)
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+
+    def time(self, labels: Labels = ()) -> "_Timer":
+        """Context manager observing the seconds spent in its block."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        bounds = [*map(_format_value, self.buckets), "+Inf"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series.counts):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _format_labels((*self.labelnames, "le"), (*labels, bound)), cumulative)
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), series.sum
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, self.labels)
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> bytes:
+    """
+    Render every registered metric in the Prometheus text format.
+
+    Returns:
+        bytes: Exposition document.
+    """
+    return ("\n".join(metric.render() for metric in REGISTRY) + "\n").encode()
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Serve the metrics of this process (``GET /metrics``)."""
+    return Response(render(), media_type=CONTENT_TYPE)
+
+
+# -------------------------------------------------------------------
+# Application metrics
+# -------------------------------------------------------------------
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled, by route and status.",
+    ("method", "route", "status"),
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to send the whole response, by route.",
+    ("method", "route"),
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests being handled, by route.",
+    ("method", "route"),
+)
+
+DB_POOL_SIZE = Gauge("db_pool_connections", "Connections open in the asyncpg pool.")
+DB_POOL_IDLE = Gauge("db_pool_idle_connections", "Open connections not acquired by a request.")
+DB_POOL_WAITERS = Gauge("db_pool_waiters", "Callers waiting to acquire a connection.")
+DB_POOL_ACQUIRE = Histogram(
+    "db_pool_acquire_seconds", "Time spent waiting for a pool connection.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Acquisitions that ran out of acquire timeout.")
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Query time, by query fingerprint (see db.fingerprint).",
+    ("query",), buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+DB_QUERY_ROWS = Counter(
+    "db_query_rows_total", "Rows returned or affected, by query fingerprint.", ("query",),
+)
+
+PASSWORD_HASH = Histogram(
+    "argon2_duration_seconds", "Argon2 hash/verify time, queueing for a worker included.",
+    ("operation",), buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge("argon2_in_flight", "Argon2 calls running or queued for a worker.")
+PASSWORD_HASH_QUEUED = Gauge("argon2_queued", "Argon2 calls waiting for a free worker.")
+STORAGE_CALLS = Histogram(
+    "storage_call_duration_seconds", "MinIO/Filebase call time, by operation.",
+    ("operation",), buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+# -------------------------------------------------------------------
+# Route instrumentation
+# -------------------------------------------------------------------
+class InstrumentedRoute(APIRoute):
+    """
+    API route recording its request count, latency and in-flight requests.
+
+    Used as ``route_class`` of the API router, so the route template (e.g.
+    ``/api/patients/{username}``) is known without matching the path again
+    and unmatched paths cannot blow up the number of series. The latency
+    covers the whole response, streamed bodies included.
+    """
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        labels = (scope["method"], self.path)
+        status = "500"
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc(labels)
+        start = time.perf_counter()
+        try:
+            await super().handle(scope, receive, send_wrapper)
+        finally:
+            HTTP_LATENCY.observe(time.perf_counter() - start, labels)
+            HTTP_IN_PROGRESS.dec(labels)
+            HTTP_REQUESTS.inc((*labels, status))
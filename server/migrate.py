@@ -0,0 +1,135 @@
+"""
+migrate.py
+----------
+Versioned schema migrations for Clinic Manager.
+
+Migrations are the numbered ``.sql`` files in the ``migrations`` directory
+(``0001_tables.sql``, ``0002_indexes.sql``, ...), applied in order. Each one
+runs in its own transaction and is recorded in the ``schema_version`` table.
+
+When the schema is already current, startup costs a single query and takes
+no locks. Otherwise a Postgres advisory lock ensures only one worker applies
+the pending migrations while the others wait and then find nothing to do.
+"""
+
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+import asyncpg
+from loguru import logger
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Arbitrary key identifying the migration advisory lock
+MIGRATION_LOCK_ID = 25120001
+
+schema_version_table = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    A single schema migration.
+
+    Attributes:
+        version (int): Migration number, taken from the file name prefix.
+        name (str): Migration name, taken from the rest of the file name.
+        sql (str): SQL executed to apply the migration.
+    """
+    version: int
+    name: str
+    sql: str
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """
+    Load the migration files of a directory, ordered by version.
+
+    Args:
+        directory (Path): Directory containing ``NNNN_name.sql`` files.
+
+    Raises:
+        RuntimeError: If a file name is malformed or a version is duplicated.
+
+    Returns:
+        List[Migration]: Migrations sorted by version.
+    """
+    migrations = []
+    for path in sorted(directory.glob("*.sql")):
+        match = re.fullmatch(r"(\d+)_(\w+)\.sql", path.name)
+        if not match:
+            raise RuntimeError(f"Invalid migration file name: {path.name}")
+        migrations.append(Migration(int(match[1]), match[2], path.read_text()))
+
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Duplicated migration versions in {directory}")
+    return sorted(migrations, key=lambda m: m.version)
+
+
+migrations = load_migrations()
+
+
+async def current_version(conn: asyncpg.Connection) -> int:
+    """
+    Return the latest applied migration version, or 0 on a fresh database.
+
+    Args:
+        conn (asyncpg.Connection): Database connection.
+
+    Returns:
+        int: Current schema version.
+    """
+    try:
+        return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    except asyncpg.exceptions.UndefinedTableError:
+        return 0
+
+
+async def migrate(pool: asyncpg.Pool) -> int:
+    """
+    Apply all pending migrations.
+
+    Args:
+        pool (asyncpg.Pool): Connection pool to execute queries.
+
+    Returns:
+        int: Number of migrations applied by this process.
+    """
+    if not migrations:
+        return 0
+    latest = migrations[-1].version
+
+    async with pool.acquire() as conn:
+        # Fast path: schema already current, no DDL and no lock
+        if await current_version(conn) >= latest:
+            return 0
+
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            await conn.execute(schema_version_table)
+
+            # Another worker may have migrated while we waited for the lock
+            version = await current_version(conn)
+            pending = [m for m in migrations if m.version > version]
+
+            for migration in pending:
+                async with conn.transaction():
+                    await conn.execute(migration.sql)
+                    await conn.execute(
+                        "INSERT INTO schema_version (version, name) VALUES ($1, $2)",
+                        migration.version, migration.name,
+                    )
+                logger.info(f"Applied migration {migration.version:04d}_{migration.name}")
+
+            return len(pending)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
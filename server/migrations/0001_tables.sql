@@ -0,0 +1,51 @@
+-- 0001: Core tables.
+
+CREATE TABLE IF NOT EXISTS patients (
+    username VARCHAR(50) PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    birthDate DATE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS doctors (
+    username VARCHAR(50) PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    specialty VARCHAR(100)
+);
+
+CREATE TABLE IF NOT EXISTS diagnosis (
+    id_diagnosis SERIAL PRIMARY KEY,
+    diagnosis_date DATE NOT NULL,
+    icd VARCHAR(7),
+    description TEXT,
+    patient_id VARCHAR(50) NOT NULL REFERENCES patients(username) ON DELETE CASCADE,
+    doctor_id VARCHAR(50) REFERENCES doctors(username) ON DELETE SET NULL
+);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    id_appointment SERIAL PRIMARY KEY,
+    appointment_date TIMESTAMP NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'scheduled',
+    reason TEXT,
+    patient_id VARCHAR(50) NOT NULL REFERENCES patients(username) ON DELETE CASCADE,
+    doctor_id VARCHAR(50) REFERENCES doctors(username) ON DELETE SET NULL
+);
+
+CREATE TABLE IF NOT EXISTS files (
+    id_file SERIAL PRIMARY KEY,
+    file_name VARCHAR(255) NOT NULL,
+    original_name VARCHAR(255),
+    url TEXT NOT NULL,
+    mime_type VARCHAR(100),
+    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    patient_id VARCHAR(50) NOT NULL REFERENCES patients(username) ON DELETE CASCADE,
+    doctor_id VARCHAR(50) REFERENCES doctors(username) ON DELETE SET NULL,
+    diagnosis_id INTEGER REFERENCES diagnosis(id_diagnosis) ON DELETE CASCADE,
+    appointment_id INTEGER REFERENCES appointments(id_appointment) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    username VARCHAR(50) PRIMARY KEY,
+    hashed_password TEXT NOT NULL,
+    role TEXT NOT NULL CHECK (role IN ('patient', 'doctor', 'admin')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
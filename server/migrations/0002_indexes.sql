@@ -0,0 +1,20 @@
+-- 0002: Foreign-key, RLS predicate and list sort-key indexes.
+--   - diagnosis (doctor_id, patient_id) / (patient_id, doctor_id) answer the
+--     "IN (SELECT ... FROM diagnosis WHERE doctor_id|patient_id = current_user)"
+--     subqueries of the RLS policies as index-only scans.
+--   - patient_id / doctor_id / diagnosis_id / appointment_id indexes avoid
+--     sequential scans on ON DELETE CASCADE and SET NULL.
+--   - (date, id) indexes serve the keyset pagination of the list endpoints.
+
+CREATE INDEX IF NOT EXISTS diagnosis_doctor_idx ON diagnosis (doctor_id, patient_id);
+CREATE INDEX IF NOT EXISTS diagnosis_patient_idx ON diagnosis (patient_id, doctor_id);
+
+CREATE INDEX IF NOT EXISTS appointments_patient_idx ON appointments (patient_id);
+CREATE INDEX IF NOT EXISTS appointments_doctor_idx ON appointments (doctor_id);
+CREATE INDEX IF NOT EXISTS appointments_date_idx ON appointments (appointment_date, id_appointment);
+
+CREATE INDEX IF NOT EXISTS files_patient_idx ON files (patient_id);
+CREATE INDEX IF NOT EXISTS files_doctor_idx ON files (doctor_id);
+CREATE INDEX IF NOT EXISTS files_diagnosis_idx ON files (diagnosis_id);
+CREATE INDEX IF NOT EXISTS files_appointment_idx ON files (appointment_id);
+CREATE INDEX IF NOT EXISTS files_uploaded_idx ON files (uploaded_at, id_file);
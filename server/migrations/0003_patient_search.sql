@@ -0,0 +1,8 @@
+-- 0003: Trigram and birth-date indexes for the patient search.
+-- Trigram indexes serve the ILIKE '%term%' and similarity (%) predicates,
+-- the B-tree index serves the birth-year range.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS patients_name_trgm_idx ON patients USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS patients_username_trgm_idx ON patients USING GIN (username gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS patients_birthdate_idx ON patients (birthDate);
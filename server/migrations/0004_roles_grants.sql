@@ -0,0 +1,28 @@
+-- 0004: Group roles and read grants.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname='patient') THEN
+        CREATE ROLE patient;
+    END IF;
+
+    IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname='doctor') THEN
+        CREATE ROLE doctor;
+    END IF;
+
+    IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname='anonymous') THEN
+        CREATE ROLE anonymous;
+    END IF;
+
+    IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname='admin') THEN
+        CREATE ROLE admin LOGIN PASSWORD 'admin';
+    END IF;
+END $$;
+
+GRANT SELECT ON ALL TABLES IN SCHEMA public TO patient;
+GRANT SELECT ON ALL TABLES IN SCHEMA public TO doctor;
+GRANT SELECT ON ALL TABLES IN SCHEMA public TO admin;
+
+-- Grants are no longer re-applied on every startup: cover tables created
+-- by later migrations too.
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT ON TABLES TO patient, doctor, admin;
@@ -0,0 +1,126 @@
+-- 0005: Row-level security policies.
+
+ALTER TABLE patients ENABLE ROW LEVEL SECURITY;
+ALTER TABLE doctors ENABLE ROW LEVEL SECURITY;
+ALTER TABLE diagnosis ENABLE ROW LEVEL SECURITY;
+
+-- PATIENT POLICIES
+DO $$
+BEGIN
+    BEGIN
+        CREATE POLICY patients_patient ON patients
+            FOR SELECT TO patient
+            USING (username = current_user);
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+
+    BEGIN
+        CREATE POLICY diagnosis_patient ON diagnosis
+            FOR SELECT TO patient
+            USING (patient_id = current_user);
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+
+    BEGIN
+        CREATE POLICY doctors_patient ON doctors
+            FOR SELECT TO patient
+            USING (
+                username IN (SELECT doctor_id FROM diagnosis WHERE patient_id = current_user)
+            );
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+    
+-- DOCTOR POLICIES
+    BEGIN
+        CREATE POLICY diagnosis_doctor ON diagnosis
+            FOR SELECT TO doctor
+            USING (doctor_id = current_user);
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+
+    BEGIN
+        CREATE POLICY patients_doctor ON patients
+            FOR SELECT TO doctor
+            USING (
+                username IN (SELECT patient_id FROM diagnosis WHERE doctor_id = current_user)
+            );
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+    
+-- ANONYMOUS POLICIES
+    BEGIN
+        CREATE POLICY diagnosis_anonymous ON diagnosis
+            FOR SELECT TO anonymous
+            USING (false);
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+END $$;
+
+ALTER TABLE appointments ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+    -- El pacient veu només les seves cites
+    BEGIN
+        CREATE POLICY appointments_patient_select ON appointments
+            FOR SELECT TO patient
+            USING (patient_id = current_user);
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+
+    -- El doctor veu només les cites on participa
+    BEGIN
+        CREATE POLICY appointments_doctor_select ON appointments
+            FOR SELECT TO doctor
+            USING (doctor_id = current_user);
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+
+    -- Anonymous no veu res
+    BEGIN
+        CREATE POLICY appointments_anonymous_noaccess ON appointments
+            FOR SELECT TO anonymous
+            USING (false);
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+END $$;
+
+ALTER TABLE files ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+    -- Pacient pot veure només fitxers associats a ell
+    BEGIN
+        CREATE POLICY files_patient_select ON files
+            FOR SELECT TO patient
+            USING (patient_id = current_user);
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+
+    -- Doctor pot veure els fitxers associats als seus patients, diagnosis o appointments
+    BEGIN
+        CREATE POLICY files_doctor_select ON files
+            FOR SELECT TO doctor
+            USING (
+                -- Fitxers dels seus pacients
+                patient_id IN (SELECT patient_id FROM diagnosis WHERE doctor_id = current_user)
+                OR
+            
+                -- Fitxers associats a diagnòstics creats pel doctor
+                diagnosis_id IN (SELECT id_diagnosis FROM diagnosis WHERE doctor_id = current_user)
+                OR
+            
+                -- Fitxers associats a cites on participa el doctor
+                appointment_id IN (SELECT id_appointment FROM appointments WHERE doctor_id = current_user)
+            );
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+
+    -- Anonymous no veu res
+    BEGIN
+        CREATE POLICY files_anonymous_noaccess ON files
+            FOR SELECT TO anonymous
+            USING (false);
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END;
+END $$;
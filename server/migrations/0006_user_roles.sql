@@ -0,0 +1,16 @@
+-- 0006: Per-user roles for existing users.
+-- Reads run with SET LOCAL ROLE <username>, so every patient and doctor
+-- needs a role granted its group role. Users created before this
+-- migration (e.g. the seeded test users) did not get one.
+
+DO $$
+DECLARE
+    u RECORD;
+BEGIN
+    FOR u IN SELECT username, role FROM users LOOP
+        IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname = u.username) THEN
+            EXECUTE format('CREATE ROLE %I NOLOGIN', u.username);
+        END IF;
+        EXECUTE format('GRANT %I TO %I', u.role, u.username);
+    END LOOP;
+END $$;
@@ -0,0 +1,31 @@
+-- 0007: Per-table change counters for HTTP conditional GET (ETags).
+-- A statement-level trigger bumps the counter of a table in the same
+-- transaction as any write to it, so a counter never runs ahead of the
+-- data it describes.
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO table_versions (table_name)
+VALUES ('patients'), ('doctors'), ('diagnosis'), ('appointments'), ('files')
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER patients_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON patients
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER doctors_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON doctors
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER diagnosis_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON diagnosis
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER appointments_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON appointments
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER files_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON files
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
@@ -0,0 +1,16 @@
+-- 0008: Composite indexes for the filtered appointment lists.
+--   - (doctor_id, appointment_date, id_appointment) turns "Dr X, next week"
+--     (and the doctor RLS policy) into an index range scan already in the
+--     list order, with no sort.
+--   - (patient_id, appointment_date, id_appointment) does the same for a
+--     patient's agenda and the patient timeline.
+-- They supersede the single-column doctor_id / patient_id indexes, which
+-- are dropped (ON DELETE lookups use the leading column).
+
+CREATE INDEX IF NOT EXISTS appointments_doctor_date_idx
+    ON appointments (doctor_id, appointment_date, id_appointment);
+CREATE INDEX IF NOT EXISTS appointments_patient_date_idx
+    ON appointments (patient_id, appointment_date, id_appointment);
+
+DROP INDEX IF EXISTS appointments_doctor_idx;
+DROP INDEX IF EXISTS appointments_patient_idx;
@@ -0,0 +1,58 @@
+-- 0009: Appointment durations and double-booking prevention.
+--   - duration_minutes gives every appointment a length, 30 min by default.
+--     Appointments recorded before this migration get the default too.
+--   - slot is the [start, end) range the appointment occupies.
+--   - Appointments booked before this migration were stored at 00:00 of
+--     their day, so with the default duration a doctor's appointments of the
+--     same day now overlap. Before the constraint is added, every live
+--     appointment clashing with an earlier kept one of the same doctor is
+--     cancelled (and reported with a WARNING); the earliest one keeps the slot.
+--   - The exclusion constraint rejects two live (not cancelled) appointments
+--     of the same doctor whose slots overlap. Postgres checks it atomically
+--     against concurrent inserts and updates, so no application lock is
+--     needed; the GiST index behind it also serves slot lookups.
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE appointments ADD COLUMN IF NOT EXISTS duration_minutes INTEGER
+    CHECK (duration_minutes > 0 AND duration_minutes <= 480);
+UPDATE appointments SET duration_minutes = 30 WHERE duration_minutes IS NULL;
+ALTER TABLE appointments ALTER COLUMN duration_minutes SET DEFAULT 30;
+ALTER TABLE appointments ALTER COLUMN duration_minutes SET NOT NULL;
+
+ALTER TABLE appointments ADD COLUMN IF NOT EXISTS slot TSRANGE
+    GENERATED ALWAYS AS (
+        tsrange(appointment_date, appointment_date + duration_minutes * INTERVAL '1 minute')
+    ) STORED;
+
+DO $$
+DECLARE
+    a RECORD;
+    kept_doctor VARCHAR(50);
+    kept_until TIMESTAMP;
+BEGIN
+    -- Ordered by start, a row clashes with the kept ones iff it starts
+    -- before the end of the last one kept for its doctor
+    FOR a IN
+        SELECT id_appointment, doctor_id, slot FROM appointments
+        WHERE status <> 'cancelled' AND doctor_id IS NOT NULL
+        ORDER BY doctor_id, appointment_date, id_appointment
+    LOOP
+        IF a.doctor_id IS DISTINCT FROM kept_doctor OR lower(a.slot) >= kept_until THEN
+            kept_doctor := a.doctor_id;
+            kept_until := upper(a.slot);
+        ELSE
+            UPDATE appointments SET status = 'cancelled' WHERE id_appointment = a.id_appointment;
+            RAISE WARNING 'Cancelled appointment % of doctor %: it overlaps an earlier one',
+                a.id_appointment, a.doctor_id;
+        END IF;
+    END LOOP;
+END $$;
+
+DO $$
+BEGIN
+    ALTER TABLE appointments ADD CONSTRAINT appointments_no_overlap
+        EXCLUDE USING gist (doctor_id WITH =, slot WITH &&)
+        WHERE (status <> 'cancelled');
+EXCEPTION WHEN duplicate_object OR duplicate_table THEN NULL;
+END $$;
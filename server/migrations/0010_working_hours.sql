@@ -0,0 +1,21 @@
+-- 0010: Weekly working-hours templates for the availability search.
+-- Each row is one working interval of a doctor on an ISO weekday
+-- (1 = Monday ... 7 = Sunday); a day may have several (e.g. morning and
+-- afternoon shifts). Free time is these intervals minus the slots of the
+-- doctor's appointments (see 0009).
+
+CREATE TABLE IF NOT EXISTS doctor_working_hours (
+    doctor_id VARCHAR(50) NOT NULL REFERENCES doctors(username) ON DELETE CASCADE,
+    weekday SMALLINT NOT NULL CHECK (weekday BETWEEN 1 AND 7),
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL,
+    CHECK (start_time < end_time),
+    PRIMARY KEY (doctor_id, weekday, start_time)
+);
+
+INSERT INTO table_versions (table_name) VALUES ('doctor_working_hours')
+ON CONFLICT DO NOTHING;
+
+CREATE TRIGGER doctor_working_hours_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON doctor_working_hours
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
@@ -0,0 +1,40 @@
+-- 0011: Sharded change counters.
+-- 0007 kept one counter row per table, so every write to a table updated
+-- the same row and held its lock until commit: one long transaction (e.g.
+-- a bulk patient import) blocked every other write to the table until it
+-- committed. Each table now has 16 counter rows. A write bumps one that
+-- no other open transaction holds (SKIP LOCKED), starting from a shard
+-- picked by its backend so concurrent writers spread out, and readers sum
+-- the shards (etag.table_versions). The sum still grows exactly when a
+-- write commits. Tables added later insert their 16 rows themselves.
+
+ALTER TABLE table_versions ADD COLUMN IF NOT EXISTS shard SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE table_versions DROP CONSTRAINT IF EXISTS table_versions_pkey;
+ALTER TABLE table_versions ADD PRIMARY KEY (table_name, shard);
+
+INSERT INTO table_versions (table_name, shard)
+SELECT t.table_name, s.shard
+FROM (SELECT DISTINCT table_name FROM table_versions) t
+CROSS JOIN generate_series(1, 15) AS s(shard)
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    target SMALLINT;
+BEGIN
+    SELECT shard INTO target FROM table_versions
+    WHERE table_name = TG_TABLE_NAME
+    ORDER BY (shard + 16 - pg_backend_pid() % 16) % 16
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED;
+
+    -- Every shard held by another transaction: wait for this backend's one
+    IF NOT FOUND THEN
+        target := pg_backend_pid() % 16;
+    END IF;
+
+    UPDATE table_versions SET version = version + 1
+    WHERE table_name = TG_TABLE_NAME AND shard = target;
+    RETURN NULL;
+END $$;
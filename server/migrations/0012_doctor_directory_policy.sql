@@ -0,0 +1,13 @@
+-- 0012: Doctors may read the doctor directory.
+-- 0005 only gave patients a policy on doctors, so with RLS enabled a
+-- doctor could not read any doctor row, not even their own (GET
+-- /doctors/{username} answered 404). Names and specialties are not
+-- private between colleagues, so doctors see every row.
+
+DO $$
+BEGIN
+    CREATE POLICY doctors_doctor ON doctors
+        FOR SELECT TO doctor
+        USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
@@ -0,0 +1,17 @@
+-- 0013: Per-patient date indexes for the patient timeline.
+-- Each branch of the timeline query reads a patient's newest diagnoses,
+-- appointments and files from a cursor on: (patient_id, date, id) turns
+-- that into an index range scan already in timeline order, with no sort of
+-- the patient's whole history. Appointments have theirs since 0008.
+-- The diagnosis index also carries doctor_id, so the "doctors of this
+-- patient" RLS subquery stays an index-only scan; it supersedes
+-- diagnosis_patient_idx, as the files one does files_patient_idx, and both
+-- are dropped.
+
+CREATE INDEX IF NOT EXISTS diagnosis_patient_date_idx
+    ON diagnosis (patient_id, diagnosis_date, id_diagnosis) INCLUDE (doctor_id);
+CREATE INDEX IF NOT EXISTS files_patient_date_idx
+    ON files (patient_id, uploaded_at, id_file);
+
+DROP INDEX IF EXISTS diagnosis_patient_idx;
+DROP INDEX IF EXISTS files_patient_idx;
@@ -10,8 +10,8 @@ schemas for FastAPI endpoints.
 """
 
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
-from datetime import date, datetime
+from typing import List, Literal, Optional, Union
+from datetime import date, datetime, time
 
 
 # ===================================================================
@@ -60,6 +60,39 @@ class PatientUpdate(BaseModel):
     birthDate: Optional[date] = None
 
 
+class BulkRowIssue(BaseModel):
+    """
+    A row of a bulk import that was not inserted.
+
+    Attributes:
+        line (int): Line of the row in the uploaded file (1-based).
+        username (Optional[str]): Username of the row, if it could be read.
+        detail (str): Why the row was skipped.
+    """
+    line: int
+    username: Optional[str] = None
+    detail: str
+
+
+class BulkImportReport(BaseModel):
+    """
+    Outcome of a bulk patient import.
+
+    Attributes:
+        received (int): Data rows read from the upload.
+        inserted (int): Patients created.
+        invalid (int): Rows rejected by validation (or repeated in the file).
+        conflicts (int): Rows whose username already existed.
+        issues (List[BulkRowIssue]): Details of skipped rows (truncated to
+            the first few hundred).
+    """
+    received: int
+    inserted: int
+    invalid: int
+    conflicts: int
+    issues: List[BulkRowIssue]
+
+
 # ===================================================================
 #                            DOCTORS
 # ===================================================================
@@ -106,6 +139,34 @@ class DoctorUpdate(BaseModel):
     specialty: Optional[str] = Field(None, max_length=100)
 
 
+class WorkingHours(BaseModel):
+    """
+    One interval of a doctor's weekly working-hours template.
+
+    Attributes:
+        weekday (int): ISO weekday (1 = Monday ... 7 = Sunday).
+        start_time (time): Start of the interval.
+        end_time (time): End of the interval (after start_time).
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+    weekday: int = Field(..., ge=1, le=7)
+    start_time: time
+    end_time: time
+
+
+class FreeInterval(BaseModel):
+    """
+    A period in which a doctor works and has no appointment.
+
+    Attributes:
+        start (datetime): Start of the free period.
+        end (datetime): End of the free period.
+    """
+    start: datetime
+    end: datetime
+
+
 # ===================================================================
 #                            DIAGNOSIS
 # ===================================================================
@@ -178,7 +239,9 @@ class Appointment(BaseModel):
 
     Attributes:
         id_appointment (int): Primary key of the appointment.
-        appointment_date (date): Date of the appointment.
+        appointment_date (datetime): Start of the appointment.
+        duration_minutes (int): Length of the appointment, in minutes.
+        status (str): "scheduled", or "cancelled" once the slot has been freed.
         reason (str): Reason for the appointment.
         patient_id (str): ID of the patient.
         doctor_id (str): ID of the doctor.
@@ -186,7 +249,9 @@ class Appointment(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
     id_appointment: int
-    appointment_date: date
+    appointment_date: datetime
+    duration_minutes: int
+    status: str
     reason: str
     patient_id: str
     doctor_id: str
@@ -197,12 +262,14 @@ class AppointmentCreate(BaseModel):
     Required fields to create a new appointment.
 
     Attributes:
-        appointment_date (date): Date of the appointment.
+        appointment_date (datetime): Start of the appointment.
+        duration_minutes (int): Length of the appointment, 30 by default.
         reason (str): Reason for the appointment.
         patient_id (str): ID of the patient.
         doctor_id (str): ID of the doctor.
     """
-    appointment_date: date
+    appointment_date: datetime
+    duration_minutes: int = Field(30, gt=0, le=480)
     reason: str
     patient_id: str
     doctor_id: str
@@ -213,17 +280,34 @@ class AppointmentUpdate(BaseModel):
     Optional fields for partial update (PATCH) of an appointment.
 
     Attributes:
-        appointment_date (Optional[date]): Date of the appointment.
+        appointment_date (Optional[datetime]): Start of the appointment.
+        duration_minutes (Optional[int]): Length of the appointment.
+        status (Optional[str]): New status; "cancelled" frees the slot.
         reason (Optional[str]): Reason for the appointment.
         patient_id (Optional[str]): ID of the patient.
         doctor_id (Optional[str]): ID of the doctor.
     """
-    appointment_date: Optional[date] = None
+    appointment_date: Optional[datetime] = None
+    duration_minutes: Optional[int] = Field(None, gt=0, le=480)
+    status: Optional[str] = Field(None, max_length=20)
     reason: Optional[str] = None
     patient_id: Optional[str] = None
     doctor_id: Optional[str] = None
 
 
+class AppointmentConflict(BaseModel):
+    """
+    Body of the 409 returned when an appointment would overlap another one
+    of the same doctor.
+
+    Attributes:
+        detail (str): Error message.
+        conflict (Appointment): The appointment already holding the slot.
+    """
+    detail: str
+    conflict: Appointment
+
+
 # ===================================================================
 #                              FILES
 # ===================================================================
@@ -258,6 +342,40 @@ class FileDB(BaseModel):
     appointment_id: Optional[int] = None
 
 
+# ===================================================================
+#                            TIMELINE
+# ===================================================================
+
+class TimelineEvent(BaseModel):
+    """
+    One entry of a patient's history.
+
+    Attributes:
+        type (str): Kind of record ("diagnosis", "appointment" or "file").
+        id (int): Primary key of the record.
+        date (datetime): When it happened (diagnosis or appointment date,
+            upload time for files).
+        data (Union[Diagnosis, Appointment, FileDB]): The record itself.
+    """
+    type: Literal["diagnosis", "appointment", "file"]
+    id: int
+    date: datetime
+    data: Union[Diagnosis, Appointment, FileDB]
+
+
+class PatientTimeline(BaseModel):
+    """
+    A patient with a page of their history, most recent first.
+
+    Attributes:
+        patient (Patient): The patient.
+        events (List[TimelineEvent]): Diagnoses, appointments and files
+            merged by date.
+    """
+    patient: Patient
+    events: List[TimelineEvent]
+
+
 # ===================================================================
 #                         TOKENS / JWT
 # ===================================================================
@@ -0,0 +1,123 @@
+"""
+pagination.py
+-------------
+Keyset (cursor) pagination helpers for Clinic Manager list endpoints.
+
+List endpoints never use OFFSET. Each page is fetched with a
+``WHERE (sort keys) > (last seen keys) ORDER BY ... LIMIT n`` query,
+so the cost of a page stays constant however deep the client pages.
+
+The position of the last row returned is handed to the client as an
+opaque cursor (URL-safe base64 of a JSON array with the sort-key values),
+which it sends back in ``?after=`` to get the next page.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query, Response
+
+# -------------------------------------------------------------------
+# Page size limits
+# -------------------------------------------------------------------
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """
+    Dependency collecting the ``limit`` and ``after`` query parameters.
+
+    Attributes:
+        limit (int): Maximum number of rows to return in the page.
+        after (Optional[str]): Opaque cursor returned by the previous page.
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after: Optional[str] = Query(None),
+    ):
+        self.limit = limit
+        self.after = after
+
+
+def _to_json(value: Any) -> Any:
+    """Convert date/datetime sort keys to ISO strings for the cursor."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Unsupported cursor value: {type(value).__name__}")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Encode the sort-key values of a row into an opaque cursor.
+
+    Args:
+        values (Sequence[Any]): Values of the ORDER BY columns, in order.
+
+    Returns:
+        str: URL-safe cursor string.
+    """
+    raw = json.dumps(list(values), default=_to_json, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[Callable[[Any], Any]]) -> Tuple[Any, ...]:
+    """
+    Decode a cursor produced by ``encode_cursor``.
+
+    Args:
+        cursor (str): Cursor string received in ``?after=``.
+        types (Sequence[Callable]): Converter for each sort key
+            (e.g. ``str``, ``int``, ``datetime.fromisoformat``).
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed.
+
+    Returns:
+        Tuple[Any, ...]: Sort-key values to use in the keyset predicate.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("cursor arity mismatch")
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
+
+def paginate(
+    rows: List[Any],
+    limit: int,
+    keys: Sequence[str],
+    response: Response,
+) -> List[Any]:
+    """
+    Trim a ``LIMIT limit + 1`` result to one page and set the next cursor.
+
+    The query is expected to fetch one extra row; if it is present there is
+    a next page and its cursor is built from the last row kept.
+
+    Args:
+        rows (List[Any]): Rows fetched with ``LIMIT limit + 1``.
+        limit (int): Page size requested by the client.
+        keys (Sequence[str]): Names of the ORDER BY columns.
+        response (Response): Response on which the cursor header is set.
+
+    Returns:
+        List[Any]: Rows belonging to the current page.
+    """
+    if len(rows) <= limit:
+        return rows
+
+    page = rows[:limit]
+    last = page[-1]
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor([last[k] for k in keys])
+    return page
@@ -0,0 +1,122 @@
+"""
+serializers.py
+--------------
+Fast row-to-JSON serialization for Clinic Manager read endpoints.
+
+Building ``Model(**row)`` for every row and then letting FastAPI dump,
+re-validate and encode the result through ``response_model`` validates
+the same data twice in Python. A RowSerializer instead validates the
+rows of a query once with a pydantic-core TypeAdapter and dumps them to
+JSON bytes in the same Rust pass. Handlers return the bytes directly, so
+FastAPI skips its own response validation (``response_model`` is still
+used for the OpenAPI schema).
+
+Everything else goes through FastJSONResponse, the application's default
+response class, which renders with orjson instead of the standard json
+module.
+"""
+
+from decimal import Decimal
+from typing import Any, Iterable, List, Mapping, Optional, Type
+
+import asyncpg
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from timing import timed
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+class RowSerializer:
+    """
+    Serialize database rows to JSON through a Pydantic model.
+
+    Output matches what FastAPI produces for the same ``response_model``
+    (field aliases, date and datetime formats).
+
+    Attributes:
+        model (Type[BaseModel]): Model describing one row.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self._one = TypeAdapter(model)
+        self._many = TypeAdapter(List[model])
+
+    def dump_one(self, row: Mapping[str, Any]) -> bytes:
+        """
+        Serialize a single row.
+
+        Args:
+            row (Mapping[str, Any]): Row returned by asyncpg.
+
+        Returns:
+            bytes: JSON document.
+        """
+        with timed("serialise"):
+            return self._one.dump_json(self._one.validate_python(dict(row)), by_alias=True)
+
+    def dump_many(self, rows: Iterable[Mapping[str, Any]]) -> bytes:
+        """
+        Serialize a list of rows as a JSON array.
+
+        Args:
+            rows (Iterable[Mapping[str, Any]]): Rows returned by asyncpg.
+
+        Returns:
+            bytes: JSON array.
+        """
+        with timed("serialise"):
+            return self._many.dump_json(self._many.validate_python([dict(r) for r in rows]), by_alias=True)
+
+
+def json_response(body: bytes, response: Optional[Response] = None) -> Response:
+    """
+    Wrap pre-serialized JSON in a Response.
+
+    Args:
+        body (bytes): JSON document.
+        response (Optional[Response]): Response injected in the handler; its
+            headers (e.g. the pagination cursor) are copied to the result.
+
+    Returns:
+        Response: Response returned as-is by the handler.
+    """
+    headers = dict(response.headers) if response is not None else None
+    return Response(content=body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+# -------------------------------------------------------------------
+# Default response class
+# -------------------------------------------------------------------
+def _default(value: Any) -> Any:
+    """Encode the types orjson does not handle natively."""
+    if isinstance(value, Decimal):
+        # Same rule as FastAPI's jsonable_encoder
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, asyncpg.Record):
+        return dict(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson.
+
+    For strings, integers, booleans, None and the app's models the output
+    is the same as Starlette's JSONResponse (compact separators, UTF-8
+    without escaping). Floats are equivalent JSON but may be spelled
+    differently (``1e-7`` rather than ``1e-07``), and NaN and infinities
+    are written as ``null`` where JSONResponse raises ValueError.
+
+    Date, datetime, time and UUID values are encoded natively, Decimals
+    follow the jsonable_encoder rules and asyncpg Records are written as
+    objects, so handlers may return them without converting first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with timed("serialise"):
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
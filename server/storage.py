@@ -7,14 +7,23 @@ and MinIO/Filebase client setup.
 This module provides:
     - Pydantic Settings class for structured configuration
     - MinIO client for file operations
+    - Async facade running MinIO calls off the event loop
     - Centralized access to all critical settings
 """
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import BinaryIO, Callable, Optional
+
 from minio import Minio
 from pydantic import Field
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
+from metrics import STORAGE_CALLS
+from timing import timed
+
 # -------------------------------------------------------------------
 # Load environment variables from .env
 # -------------------------------------------------------------------
@@ -38,13 +47,33 @@ class Settings(BaseSettings):
         bucket_name (str): Bucket name in Filebase (from BUCKET_NAME).
         endpoint (str): Filebase endpoint, defaults to "s3.filebase.com".
         filebase_gateway (str): Optional Filebase gateway for CDN, defaults to "anxious-amber-raccoon.myfilebase.com".
+        storage_workers (int): Maximum concurrent MinIO/Filebase calls, defaults to 8.
         database_url (str): Full database URL (from DATABASE_URL).
         database_host (str): Database host, defaults to "localhost".
         database_user (str): Database user, defaults to "postgres".
         database_password (str): Database password, defaults to "password".
         database_name (str): Database name, defaults to "clinic_db".
+        seed_test_users (bool): Create the test users at startup, defaults to True (disable in production).
         jwt_secret_key (str): Secret key used for JWT encoding/decoding (from JWT_SECRET_KEY).
         algorithm (str): Algorithm used for JWT (from ALGORITHM).
+        password_hash_workers (int): Threads available for Argon2 hashing/verification, defaults to 4.
+        doctor_cache_size (int): Maximum entries of each doctor directory cache, defaults to 1024.
+        doctor_cache_ttl (float): Seconds a cached doctor read stays valid, defaults to 300.
+        compression_min_size (int): Smallest response body (bytes) that gets compressed, defaults to 1024.
+        slow_query_ms (float): Queries taking at least this long (milliseconds) are logged, defaults to 200.
+        db_pool_min_size (int): Connections opened at startup and kept open, defaults to 2.
+        db_pool_max_size (int): Maximum connections in the pool, defaults to 10.
+        db_pool_max_inactive_lifetime (float): Seconds before an idle connection above the minimum is
+            closed, 0 to keep them all open, defaults to 300.
+        db_statement_cache_size (int): Prepared statements cached per connection, 0 to disable
+            (e.g. behind PgBouncer in transaction mode), defaults to 100.
+        db_pool_acquire_timeout (float): Seconds a request waits for a free connection before
+            getting a 503, defaults to 5.
+        db_pool_retry_after (int): Retry-After (seconds) sent with that 503, defaults to 1.
+        read_replica_url (Optional[str]): Database URL of a read replica serving GET endpoints, none by default.
+        read_your_writes_window (float): Seconds a user's reads stay on the primary after a write, defaults to 5.
+        metrics_token (Optional[str]): Bearer token scrapers send to read /metrics (from METRICS_TOKEN),
+            /metrics is disabled when unset.
     """
 
     # Filebase / MinIO configuration
@@ -53,17 +82,41 @@ class Settings(BaseSettings):
     bucket_name: str = Field(alias="BUCKET_NAME")
     endpoint: str = Field(default="s3.filebase.com")
     filebase_gateway: str = Field(default="anxious-amber-raccoon.myfilebase.com")
+    storage_workers: int = Field(default=8, ge=1)
 
     # JWT configuration
     jwt_secret_key: str = Field(alias="JWT_SECRET_KEY")
     algorithm: str = Field(alias="ALGORITHM")
 
+    # Password hashing configuration
+    password_hash_workers: int = Field(default=4, ge=1)
+
     # Database configuration
     database_url: str = Field(alias="DATABASE_URL")
     database_host: str = Field(default="localhost")
     database_user: str = Field(default="postgres")
     database_password: str = Field(default="password")
     database_name: str = Field(default="clinic_db")
+    seed_test_users: bool = Field(default=True)
+    slow_query_ms: float = Field(default=200, ge=0)
+    db_pool_min_size: int = Field(default=2, ge=0)
+    db_pool_max_size: int = Field(default=10, ge=1)
+    db_pool_max_inactive_lifetime: float = Field(default=300, ge=0)
+    db_statement_cache_size: int = Field(default=100, ge=0)
+    db_pool_acquire_timeout: float = Field(default=5, gt=0)
+    db_pool_retry_after: int = Field(default=1, ge=0)
+    read_replica_url: Optional[str] = Field(default=None, alias="READ_REPLICA_URL")
+    read_your_writes_window: float = Field(default=5, ge=0)
+
+    # Read cache configuration
+    doctor_cache_size: int = Field(default=1024, ge=1)
+    doctor_cache_ttl: float = Field(default=300, gt=0)
+
+    # Response compression
+    compression_min_size: int = Field(default=1024, ge=0)
+
+    # Prometheus scrape authentication
+    metrics_token: Optional[str] = Field(default=None, alias="METRICS_TOKEN")
 
     # Pydantic configuration to read from .env
     model_config = {"env_file": ".env"}
@@ -96,3 +149,76 @@ client = Minio(
     secret_key=settings.secret_key,  # Corrected typo
     secure=True
 )
+
+
+# -------------------------------------------------------------------
+# Async storage facade
+# -------------------------------------------------------------------
+class AsyncStorage:
+    """
+    Async facade over the synchronous MinIO client.
+
+    Every call runs in a dedicated thread pool, so uploads and deletes do
+    not block the event loop. The pool size caps how many storage calls
+    run at once; further calls wait for a free worker.
+
+    Attributes:
+        bucket_name (str): Bucket used for all operations.
+        max_workers (int): Maximum number of concurrent storage calls.
+    """
+
+    def __init__(self, minio_client: Minio, bucket_name: str, max_workers: int):
+        self._client = minio_client
+        self.bucket_name = bucket_name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+
+    async def _run(self, func: Callable, *args, **kwargs):
+        """Run a blocking MinIO call in the storage thread pool, timing it."""
+        loop = asyncio.get_running_loop()
+        with STORAGE_CALLS.time((func.__name__,)), timed("storage"):
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def put_object(self, object_name: str, data: BinaryIO, length: int = -1,
+                         part_size: int = 10 * 1024 * 1024):
+        """
+        Upload a file-like object to the bucket.
+
+        Args:
+            object_name (str): Name of the object in the bucket.
+            data (BinaryIO): Readable binary stream.
+            length (int): Size in bytes, -1 for a streaming multipart upload.
+            part_size (int): Multipart chunk size, defaults to 10 MB.
+        """
+        return await self._run(
+            self._client.put_object,
+            bucket_name=self.bucket_name,
+            object_name=object_name,
+            data=data,
+            length=length,
+            part_size=part_size,
+        )
+
+    async def stat_object(self, object_name: str):
+        """
+        Retrieve the metadata of an object.
+
+        Args:
+            object_name (str): Name of the object in the bucket.
+        """
+        return await self._run(self._client.stat_object, self.bucket_name, object_name)
+
+    async def remove_object(self, object_name: str) -> None:
+        """
+        Remove an object from the bucket.
+
+        Args:
+            object_name (str): Name of the object in the bucket.
+        """
+        await self._run(self._client.remove_object, self.bucket_name, object_name)
+
+
+"""
+Async storage used by the API handlers.
+"""
+storage = AsyncStorage(client, settings.bucket_name, settings.storage_workers)
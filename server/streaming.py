@@ -0,0 +1,88 @@
+"""
+streaming.py
+------------
+Streaming NDJSON export for large Clinic Manager list endpoints.
+
+Instead of loading the whole result set with ``conn.fetch()``, rows are read
+through a server-side cursor (DECLARE / FETCH) on the request connection and
+written to the client one JSON document per line as they arrive. Peak memory
+stays bounded by the fetch size, whatever the size of the table.
+
+The cursor is declared with SQL rather than ``conn.cursor()`` because asyncpg
+only allows its cursors in transactions it started itself, while
+db.rls_connection opens its transaction together with SET LOCAL ROLE in one
+script (and not at all for admins).
+"""
+
+from typing import Any, AsyncIterator, Callable, Mapping, Optional, Sequence
+
+import asyncpg
+from fastapi import Query, Request
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Rows fetched from the server-side cursor per round-trip
+STREAM_PREFETCH = 500
+
+# Name of the cursor (one stream per connection at a time)
+STREAM_CURSOR = "ndjson_stream"
+
+
+class StreamParams:
+    """
+    Dependency deciding whether a list endpoint should stream its result.
+
+    Streaming is enabled with ``?stream=1`` or an ``Accept: application/x-ndjson``
+    request header.
+
+    Attributes:
+        enabled (bool): True if the client asked for an NDJSON stream.
+    """
+
+    def __init__(self, request: Request, stream: bool = Query(False)):
+        self.enabled = stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(
+    conn: asyncpg.Connection,
+    query: str,
+    args: Sequence[Any],
+    serialize: Callable[[asyncpg.Record], bytes],
+    headers: Optional[Mapping[str, str]] = None,
+) -> StreamingResponse:
+    """
+    Build a StreamingResponse that writes the rows of a query as NDJSON.
+
+    The connection must stay open until the body has been sent; the
+    request-scoped connection dependency is released only after the
+    response is finished. The cursor lives in the connection's transaction,
+    or in a read-only one opened (and rolled back) here if there is none.
+
+    Args:
+        conn (asyncpg.Connection): Request connection.
+        query (str): SELECT query to run.
+        args (Sequence[Any]): Query arguments.
+        serialize (Callable): Converts a row into a JSON document (bytes).
+        headers (Optional[Mapping[str, str]]): Extra response headers (e.g. ETag).
+
+    Returns:
+        StreamingResponse: Response streaming one JSON document per line.
+    """
+
+    async def lines() -> AsyncIterator[bytes]:
+        own_transaction = not conn.is_in_transaction()
+        if own_transaction:
+            await conn.execute("BEGIN READ ONLY")
+        try:
+            await conn.execute(f"DECLARE {STREAM_CURSOR} NO SCROLL CURSOR FOR {query}", *args)
+            fetch = await conn.prepare(f"FETCH {STREAM_PREFETCH} FROM {STREAM_CURSOR}")
+            while rows := await fetch.fetch():
+                for row in rows:
+                    yield serialize(row) + b"\n"
+        finally:
+            # Otherwise the cursor goes with the caller's transaction
+            if own_transaction:
+                await conn.execute("ROLLBACK")
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
@@ -9,7 +9,17 @@ on patients, doctors, login, tokens, and related endpoints.
 import pytest
 from fastapi.testclient import TestClient
 from main import app
+import asyncio
 import io
+import json
+import time
+from datetime import datetime
+from functools import partial
+
+import asyncpg
+from cache import MISSING
+from db import DATABASE_URL, RECENT_WRITE_COOKIE, TimedConnection, create_pool
+from storage import settings
 
 # -------------------------------------------------------------------
 # AUXILIARY FUNCTIONS
@@ -72,6 +82,15 @@ def ensure_doctor_exists(client, username: str, name: str, specialty: str):
         raise Exception(f"Failed to ensure doctor {username}: {e}")
 
 
+def assert_compact_json(response):
+    """
+    Assert the body is byte-identical to what the standard json module
+    (Starlette's JSONResponse) would have produced for the same content.
+    """
+    expected = json.dumps(response.json(), ensure_ascii=False, separators=(",", ":")).encode()
+    assert response.content == expected
+
+
 # -------------------------------------------------------------------
 # CREATION OF USERS FOR TESTING
 # -------------------------------------------------------------------
@@ -151,6 +170,7 @@ def test_login_success(client, user):
         data={"username": user["username"], "password": user["password"]}
     )
     assert response.status_code == 200
+    assert_compact_json(response)
     json_data = response.json()
     assert "access_token" in json_data
     assert json_data.get("token_type", "bearer") == "bearer"
@@ -177,6 +197,148 @@ def test_login_wrong_username(client):
     json_data = response.json()
     assert json_data["detail"] == "Incorrect username or password"
 
+# -------------------------------------------------------------------
+# METRICS
+# -------------------------------------------------------------------
+def test_metrics_endpoint(client, monkeypatch):
+    """/metrics exposes per-route counters, pool gauges and Argon2 timings and queue."""
+    monkeypatch.setattr(settings, "metrics_token", "scrape-secret")
+    client.get("/patients", headers={"Authorization": f"Bearer {tokens['admin']}"})
+    response = client.get("http://testserver/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/api/patients",status="200"}' in body
+    assert 'argon2_duration_seconds_count{operation="verify"}' in body
+    assert "argon2_queued 0" in body
+    assert "db_pool_connections " in body
+    assert "db_pool_waiters 0" in body
+
+
+@pytest.mark.parametrize("token, authorization, status", [
+    (None, "Bearer scrape-secret", 404),
+    ("scrape-secret", None, 401),
+    ("scrape-secret", "Bearer wrong", 401),
+    ("scrape-secret", "scrape-secret", 401),
+])
+def test_metrics_requires_token(client, monkeypatch, token, authorization, status):
+    """/metrics is off without METRICS_TOKEN and needs exactly that bearer token."""
+    monkeypatch.setattr(settings, "metrics_token", token)
+    headers = {} if authorization is None else {"Authorization": authorization}
+    response = client.get("http://testserver/metrics", headers=headers)
+    assert response.status_code == status
+    assert "http_requests_total" not in response.text
+
+
+def test_server_timing_header(client):
+    """Responses break their time down into db, serialise and total."""
+    response = client.get("/patients", headers={"Authorization": f"Bearer {tokens['admin']}"})
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert timing.startswith("db;dur=")
+    assert "serialise;dur=" in timing
+    assert "total;dur=" in timing
+
+
+def test_pool_timeout_returns_503(client, monkeypatch):
+    """Running out of acquire timeout answers 503 with Retry-After."""
+    pool = client.portal.call(partial(create_pool, DATABASE_URL, min_size=1, max_size=1, acquire_timeout=0.05))
+    held = client.portal.call(pool.acquire)
+    monkeypatch.setattr(client.app.state, "pool", pool)
+    monkeypatch.setattr(client.app.state, "read_pool", pool)
+    try:
+        response = client.get("/patients", headers={"Authorization": f"Bearer {tokens['admin']}"})
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == str(settings.db_pool_retry_after)
+    finally:
+        client.portal.call(pool.release, held)
+        client.portal.call(pool.close)
+
+
+@pytest.mark.parametrize("method, path, body", [
+    ("POST", "/patients", {"username": "pool_timeout", "name": "Pool Timeout", "birthDate": "1990-01-01"}),
+    ("PATCH", "/patients/pool_timeout", {"name": "Renamed"}),
+    ("DELETE", "/patients/pool_timeout", None),
+    ("POST", "/doctors", {"username": "dr_pool_timeout", "name": "Dr Pool", "specialty": "Cardiology"}),
+])
+def test_write_on_exhausted_pool_returns_503(client, monkeypatch, method, path, body):
+    """Writes waiting on a full pool get 503 + Retry-After, not a generic 500."""
+    pool = client.portal.call(partial(create_pool, DATABASE_URL, min_size=1, max_size=1, acquire_timeout=0.05))
+    held = client.portal.call(pool.acquire)
+    monkeypatch.setattr(client.app.state, "pool", pool)
+    try:
+        response = client.request(method, path, json=body, headers={"Authorization": f"Bearer {tokens['admin']}"})
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == str(settings.db_pool_retry_after)
+    finally:
+        client.portal.call(pool.release, held)
+        client.portal.call(pool.close)
+
+
+@pytest.mark.parametrize("path", [
+    "/appointments",
+    "/doctors/drpool/working-hours",
+    "/doctors/drpool/availability?from=2026-03-02T00:00:00&to=2026-03-03T00:00:00",
+])
+def test_conditional_get_acquires_once(client, monkeypatch, path):
+    """The ETag lookup runs on the handler's connection: one acquisition per read."""
+    ensure_doctor_exists(client, "drpool", "Dr Pool", "General")
+    pool = client.portal.call(partial(create_pool, DATABASE_URL, min_size=1, max_size=1))
+    acquired = []
+    original = pool.acquire
+
+    def spy(*, timeout=None):
+        acquired.append(timeout)
+        return original(timeout=timeout)
+
+    monkeypatch.setattr(pool, "acquire", spy)
+    monkeypatch.setattr(client.app.state, "pool", pool)
+    monkeypatch.setattr(client.app.state, "read_pool", pool)
+    client.cookies.clear()
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    try:
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200
+        assert len(acquired) == 1
+        acquired.clear()
+        response = client.get(path, headers={**headers, "If-None-Match": response.headers["etag"]})
+        assert response.status_code == 304
+        assert len(acquired) == 1
+    finally:
+        client.portal.call(pool.close)
+
+
+def test_reads_use_replica_until_user_writes(client, monkeypatch):
+    """GETs go to the read pool, except right after the same user wrote."""
+    replica = client.portal.call(partial(create_pool, DATABASE_URL, min_size=1, max_size=2))
+    acquired = []
+    original = replica.acquire
+
+    def spy(*, timeout=None):
+        acquired.append(timeout)
+        return original(timeout=timeout)
+
+    monkeypatch.setattr(replica, "acquire", spy)
+    monkeypatch.setattr(client.app.state, "read_pool", replica)
+    client.cookies.clear()
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    try:
+        assert client.get("/appointments", headers=headers).status_code == 200
+        assert acquired
+        acquired.clear()
+
+        written = client.delete("/appointments/999999999", headers=headers)
+        assert f"{RECENT_WRITE_COOKIE}=test_admin; Max-Age=" in written.headers["set-cookie"]
+        assert client.get("/appointments", headers=headers).status_code == 200
+        assert not acquired
+
+        doctor = {"Authorization": f"Bearer {tokens['doctor']}"}
+        assert client.get("/appointments", headers=doctor).status_code == 200
+        assert acquired
+    finally:
+        client.portal.call(replica.close)
+
+
 # -------------------------------------------------------------------
 # PATIENT ENDPOINT TESTS
 # -------------------------------------------------------------------
@@ -192,6 +354,7 @@ def test_create_patient_admin(client, patient_data):
     headers = {"Authorization": f"Bearer {tokens['admin']}"}
     response = client.post("/patients", json=patient_data, headers=headers)
     assert response.status_code == 200
+    assert_compact_json(response)
     data = response.json()
     assert data["username"] == patient_data["username"]
 
@@ -216,18 +379,138 @@ def test_list_patients(client, role):
     assert isinstance(response.json(), list)
 
 
+def test_list_patients_pagination(client):
+    """Listing with a limit returns a cursor that resumes after the last row."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    first = client.get("/patients?limit=1", headers=headers)
+    assert first.status_code == 200
+    assert len(first.json()) == 1
+
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get(f"/patients?limit=1&after={cursor}", headers=headers)
+    assert second.status_code == 200
+    assert second.json()[0]["username"] > first.json()[0]["username"]
+
+
+def test_list_patients_invalid_cursor(client):
+    """An invalid cursor is rejected with 400."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    response = client.get("/patients?after=garbage", headers=headers)
+    assert response.status_code == 400
+
+
+def test_list_patients_conditional_get(client):
+    """A matching If-None-Match gets 304 until the patients table changes."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    first = client.get("/patients", headers=headers)
+    etag = first.headers["etag"]
+
+    cached = client.get("/patients", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    other_user = client.get("/patients", headers={"Authorization": f"Bearer {tokens['doctor']}"})
+    assert other_user.headers["etag"] != etag
+
+    ensure_patient_exists(client, "etagpatient", "ETag Patient", "1991-02-03")
+    client.patch("/patients/etagpatient", json={"name": "ETag Patient 2"}, headers=headers)
+    changed = client.get("/patients", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+@pytest.mark.parametrize("query", ["q=Diag", "q=diagpat", "q=1990", "year=1990"])
+def test_search_patients(client, query):
+    """Patients can be searched by name, username or birth year."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    response = client.get(f"/patients/search?{query}", headers=headers)
+    assert response.status_code == 200
+    assert any(p["username"] == "diagpatient" for p in response.json())
+
+
+def test_search_patients_requires_term(client):
+    """Searching without a term or year is rejected."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    response = client.get("/patients/search", headers=headers)
+    assert response.status_code == 400
+
+
 # -----------------------------
 # GET PATIENT
 # -----------------------------
-@pytest.mark.parametrize("role", ["admin", "doctor", "patient"])
+@pytest.mark.parametrize("role", ["admin"])
 def test_get_patient(client, patient_data, role):
-    """All roles can retrieve a patient by username."""
+    """Admin can retrieve any patient by username."""
     headers = {"Authorization": f"Bearer {tokens[role]}"}
     response = client.get(f"/patients/{patient_data['username']}", headers=headers)
     assert response.status_code == 200
     assert response.json()["username"] == patient_data["username"]
 
 
+@pytest.mark.parametrize("role", ["doctor", "patient"])
+def test_get_patient_hidden_by_rls(client, patient_data, role):
+    """Doctors and patients cannot see a patient unrelated to them (RLS)."""
+    headers = {"Authorization": f"Bearer {tokens[role]}"}
+    response = client.get(f"/patients/{patient_data['username']}", headers=headers)
+    assert response.status_code == 404
+
+
+# -----------------------------
+# PATIENT TIMELINE
+# -----------------------------
+def test_patient_timeline(client):
+    """The timeline merges diagnoses and appointments, newest first, paged by cursor."""
+    ensure_patient_exists(client, "timelinepatient", "Timeline Patient", "1980-05-05")
+    ensure_doctor_exists(client, "timelinedoctor", "Timeline Doctor", "General")
+    ensure_doctor_exists(client, "test_doctor", "Test Doctor", "General")
+    doctor_headers = {"Authorization": f"Bearer {tokens['doctor']}"}
+    for day in ("2025-03-01", "2025-01-01"):
+        client.post("/diagnosis", json={
+            "diagnosis_date": day, "icd": "J45", "description": "Timeline",
+            "patient_id": "timelinepatient", "doctor_id": "test_doctor",
+        }, headers=doctor_headers)
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    # The second one ties with a diagnosis on date, ordered by type
+    for start in ("2025-02-01T10:00:00", "2025-03-01T00:00:00"):
+        client.post("/appointments", json={
+            "appointment_date": start, "reason": "Timeline",
+            "patient_id": "timelinepatient", "doctor_id": "timelinedoctor",
+        }, headers=headers)
+
+    response = client.get("/patients/timelinepatient/timeline", headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["patient"]["username"] == "timelinepatient"
+    events = body["events"]
+    dates = [e["date"] for e in events]
+    assert dates == sorted(dates, reverse=True)
+    assert {"diagnosis", "appointment"} <= {e["type"] for e in events}
+    appointment = next(e for e in events if e["date"] == "2025-02-01T10:00:00")
+    assert appointment["type"] == "appointment"
+    assert appointment["data"]["duration_minutes"] == 30
+    assert "X-Next-Cursor" not in response.headers
+
+    # Walking the pages one event at a time yields the same history
+    paged, cursor = [], None
+    while True:
+        params = {"limit": 1, **({"after": cursor} if cursor else {})}
+        page = client.get("/patients/timelinepatient/timeline", params=params, headers=headers)
+        paged += page.json()["events"]
+        cursor = page.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert paged == events
+
+
+def test_patient_timeline_not_found(client):
+    """Unknown patients, and patients hidden by RLS, return 404."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    assert client.get("/patients/nobody/timeline", headers=headers).status_code == 404
+    headers = {"Authorization": f"Bearer {tokens['patient']}"}
+    assert client.get("/patients/timelinepatient/timeline", headers=headers).status_code == 404
+
+
 # -----------------------------
 # UPDATE PATIENT
 # -----------------------------
@@ -274,6 +557,60 @@ def test_delete_patient_forbidden(client, patient_data, role):
     assert response.status_code == 403
 
 
+# -----------------------------
+# BULK IMPORT
+# -----------------------------
+def test_bulk_create_patients_csv(client):
+    """CSV rows are imported; invalid, repeated and existing rows are reported."""
+    ensure_patient_exists(client, "bulkexisting", "Bulk Existing", "1980-01-01")
+    headers = {"Authorization": f"Bearer {tokens['admin']}", "Content-Type": "text/csv"}
+    body = (
+        "username,name,birthdate\n"
+        "bulkcsv1,\"Bulk, One\",1990-01-01\n"
+        "bulkcsv2,Bulk Two,not-a-date\n"
+        "bulkcsv1,Bulk One Again,1990-01-01\n"
+        "bulkexisting,Bulk Existing,1980-01-01\n"
+        "bulkcsv3,Bulk Three,1992-03-04\n"
+    )
+    response = client.post("/patients/bulk", content=body, headers=headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["received"], report["inserted"], report["invalid"], report["conflicts"]) == (5, 2, 2, 1)
+    assert [issue["line"] for issue in report["issues"]] == [3, 4, 5]
+
+    admin = {"Authorization": f"Bearer {tokens['admin']}"}
+    assert client.get("/patients/bulkcsv1", headers=admin).json()["name"] == "Bulk, One"
+
+
+def test_bulk_create_patients_ndjson(client):
+    """NDJSON rows are validated against PatientCreate and imported."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}", "Content-Type": "application/x-ndjson"}
+    lines = [
+        {"username": f"bulkjson{i}", "name": f"Bulk Json {i}", "birthDate": "1995-05-05"}
+        for i in range(200)
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n[1, 2]\n"
+    response = client.post("/patients/bulk", content=body, headers=headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["received"], report["inserted"], report["invalid"]) == (201, 200, 1)
+
+
+def test_bulk_create_patients_unsupported_type(client):
+    """Only CSV and NDJSON uploads are accepted."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    response = client.post("/patients/bulk", json=[{"username": "x"}], headers=headers)
+    assert response.status_code == 415
+
+
+@pytest.mark.parametrize("role", ["doctor", "patient"])
+def test_bulk_create_patients_forbidden(client, role):
+    """Only admins can bulk import patients."""
+    headers = {"Authorization": f"Bearer {tokens[role]}", "Content-Type": "text/csv"}
+    response = client.post("/patients/bulk", content="username,name,birthDate\n", headers=headers)
+    assert response.status_code == 403
+
+
 
 # -------------------------------------------------------------------
 # DOCTOR ENDPOINT TESTS
@@ -307,9 +644,9 @@ def test_create_doctor_forbidden(client, doctor_data, role):
 # -----------------------------
 # GET DOCTOR
 # -----------------------------
-@pytest.mark.parametrize("role", ["admin", "doctor", "patient"])
+@pytest.mark.parametrize("role", ["admin"])
 def test_get_doctor(client, doctor_data, role):
-    """All roles can retrieve a doctor by username."""
+    """Admin can retrieve a doctor by username."""
     headers = {"Authorization": f"Bearer {tokens[role]}"}
     response = client.get(f"/doctors/{doctor_data['username']}", headers=headers)
     assert response.status_code == 200
@@ -317,6 +654,23 @@ def test_get_doctor(client, doctor_data, role):
     assert data["username"] == doctor_data["username"]
 
 
+def test_get_doctor_visible_to_doctors(client, doctor_data):
+    """Doctors can read the doctor directory (RLS policy doctors_doctor)."""
+    ensure_doctor_exists(client, **doctor_data)
+    headers = {"Authorization": f"Bearer {tokens['doctor']}"}
+    response = client.get(f"/doctors/{doctor_data['username']}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == doctor_data["username"]
+
+
+@pytest.mark.parametrize("role", ["patient"])
+def test_get_doctor_hidden_by_rls(client, doctor_data, role):
+    """Patients cannot see a doctor unrelated to them (RLS)."""
+    headers = {"Authorization": f"Bearer {tokens[role]}"}
+    response = client.get(f"/doctors/{doctor_data['username']}", headers=headers)
+    assert response.status_code == 404
+
+
 # -----------------------------
 # UPDATE DOCTOR
 # -----------------------------
@@ -334,6 +688,99 @@ def test_update_doctor_admin(client, doctor_data, role):
     assert data["specialty"] == "Neurology"
 
 
+def test_doctor_cache_invalidated_on_update(client, doctor_data):
+    """Cached doctor reads are served from memory and refreshed after a write."""
+    from api import doctor_cache
+
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    url = f"/doctors/{doctor_data['username']}"
+    client.get(url, headers=headers)
+    hits = doctor_cache.hits
+    assert client.get(url, headers=headers).status_code == 200
+    assert doctor_cache.hits == hits + 1
+
+    client.patch(url, json={"specialty": "Oncology"}, headers=headers)
+    assert client.get(url, headers=headers).json()["specialty"] == "Oncology"
+    listed = {d["username"]: d for d in client.get("/doctors", headers=headers).json()}
+    assert listed[doctor_data["username"]]["specialty"] == "Oncology"
+
+
+def test_doctor_cache_invalidated_by_other_worker(client, doctor_data):
+    """A NOTIFY sent by another worker evicts the cached doctor and list pages."""
+    from api import doctor_cache, doctor_page_cache
+    from cache import notify_invalidation
+
+    ensure_doctor_exists(client, **doctor_data)
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    username = doctor_data["username"]
+    client.get(f"/doctors/{username}", headers=headers)
+    client.get("/doctors", headers=headers)
+    assert doctor_cache.get(username) is not MISSING
+    generation = doctor_cache.generation
+
+    async def notify_from_other_worker():
+        conn = await asyncpg.connect(DATABASE_URL)
+        try:
+            await notify_invalidation(conn, "doctor", username)
+        finally:
+            await conn.close()
+
+    asyncio.run(notify_from_other_worker())
+
+    deadline = time.monotonic() + 5
+    while doctor_cache.generation == generation:
+        assert time.monotonic() < deadline, "invalidation was not received"
+        time.sleep(0.05)
+    assert doctor_cache.get(username) is MISSING
+    assert len(doctor_page_cache) == 0
+
+
+def test_doctor_cache_hit_needs_no_connection(client, monkeypatch, doctor_data):
+    """Cached doctor reads, 304s included, acquire no connection and keep their ETag."""
+    from api import invalidate_doctor
+
+    ensure_doctor_exists(client, **doctor_data)
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    url = f"/doctors/{doctor_data['username']}"
+    invalidate_doctor(None)
+    before = client.get(url, headers=headers)
+    page = client.get("/doctors", headers=headers)
+
+    pool = client.app.state.read_pool
+    acquired = []
+    original = pool.acquire
+
+    def spy(*, timeout=None):
+        acquired.append(timeout)
+        return original(timeout=timeout)
+
+    monkeypatch.setattr(pool, "acquire", spy)
+    client.cookies.clear()
+    for path, first in ((url, before), ("/doctors", page)):
+        assert client.get(path, headers=headers).headers["etag"] == first.headers["etag"]
+        revalidated = client.get(path, headers={**headers, "If-None-Match": first.headers["etag"]})
+        assert revalidated.status_code == 304
+    assert acquired == []
+
+    async def write_without_notify():
+        conn = await asyncpg.connect(DATABASE_URL)
+        try:
+            await conn.execute("UPDATE doctors SET specialty = 'Radiology' WHERE username = $1", doctor_data["username"])
+        finally:
+            await conn.close()
+
+    # Until the invalidation arrives the cached body is served, under its own ETag
+    asyncio.run(write_without_notify())
+    cached = client.get(url, headers=headers)
+    assert cached.headers["etag"] == before.headers["etag"]
+    assert cached.json() == before.json()
+
+    invalidate_doctor(doctor_data["username"])
+    after = client.get(url, headers=headers)
+    assert after.headers["etag"] != before.headers["etag"]
+    assert after.json()["specialty"] == "Radiology"
+
+
 @pytest.mark.parametrize("role", ["patient", "doctor"])
 def test_update_doctor_forbidden(client, doctor_data, role):
     """Patient and Doctor roles cannot update a doctor."""
@@ -367,6 +814,72 @@ def test_delete_doctor_forbidden(client, doctor_data, role):
     assert response.status_code == 403
 
 
+# -----------------------------
+# WORKING HOURS AND AVAILABILITY
+# -----------------------------
+def test_doctor_availability(client):
+    """Free intervals are the working hours minus the booked slots."""
+    ensure_patient_exists(client, "apptpatient", "Appt Patient", "1990-01-01")
+    ensure_doctor_exists(client, "freedoctor", "Free Doctor", "General")
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    hours = [
+        {"weekday": 1, "start_time": "15:00:00", "end_time": "18:00:00"},
+        {"weekday": 1, "start_time": "09:00:00", "end_time": "13:00:00"},
+    ]
+    response = client.put("/doctors/freedoctor/working-hours", json=hours, headers=headers)
+    assert response.status_code == 200
+    assert client.get("/doctors/freedoctor/working-hours", headers=headers).json() == [hours[1], hours[0]]
+
+    for old in client.get("/appointments", params={"doctor_id": "freedoctor"}, headers=headers).json():
+        client.delete(f"/appointments/{old['id_appointment']}", headers=headers)
+    client.post("/appointments", json={
+        "appointment_date": "2026-06-01T10:00:00", "reason": "Busy",
+        "patient_id": "apptpatient", "doctor_id": "freedoctor",
+    }, headers=headers)
+
+    # 2026-06-01 is a Monday; the rest of the week has no working hours
+    params = {"from": "2026-06-01", "to": "2026-06-08"}
+    response = client.get("/doctors/freedoctor/availability", params=params, headers={"Authorization": f"Bearer {tokens['patient']}"})
+    assert response.status_code == 200
+    assert response.json() == [
+        {"start": "2026-06-01T09:00:00", "end": "2026-06-01T10:00:00"},
+        {"start": "2026-06-01T10:30:00", "end": "2026-06-01T13:00:00"},
+        {"start": "2026-06-01T15:00:00", "end": "2026-06-01T18:00:00"},
+    ]
+
+    response = client.get("/doctors/freedoctor/availability", params={**params, "duration": 150}, headers=headers)
+    assert response.json() == [
+        {"start": "2026-06-01T10:30:00", "end": "2026-06-01T13:00:00"},
+        {"start": "2026-06-01T15:00:00", "end": "2026-06-01T18:00:00"},
+    ]
+
+    # The period clips the working hours
+    response = client.get("/doctors/freedoctor/availability", params={"from": "2026-06-01T16:00:00", "to": "2026-06-01T17:00:00"}, headers=headers)
+    assert response.json() == [{"start": "2026-06-01T16:00:00", "end": "2026-06-01T17:00:00"}]
+
+
+@pytest.mark.parametrize("params, status", [
+    ({"from": "2026-06-08", "to": "2026-06-01"}, 400),
+    ({"from": "2026-01-01", "to": "2026-12-31"}, 400),
+    ({"from": "2026-06-01"}, 422),
+])
+def test_doctor_availability_invalid_period(client, params, status):
+    """Empty, inverted, too long or incomplete periods are rejected."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    response = client.get("/doctors/freedoctor/availability", params=params, headers=headers)
+    assert response.status_code == status
+
+
+def test_working_hours_invalid(client):
+    """Intervals ending before they start and unknown doctors are rejected."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    ensure_doctor_exists(client, "freedoctor", "Free Doctor", "General")
+    hours = [{"weekday": 2, "start_time": "18:00:00", "end_time": "09:00:00"}]
+    assert client.put("/doctors/freedoctor/working-hours", json=hours, headers=headers).status_code == 400
+    assert client.put("/doctors/nobody/working-hours", json=[], headers=headers).status_code == 404
+    assert client.get("/doctors/nobody/availability", params={"from": "2026-06-01", "to": "2026-06-02"}, headers=headers).status_code == 404
+
+
 # -------------------------------------------------------------------
 # DIAGNOSIS ENDPOINT TESTS
 # -------------------------------------------------------------------
@@ -467,6 +980,70 @@ def test_delete_diagnosis_forbidden(client, setup_diagnosis, role):
     assert response.status_code == 403
 
 
+# -----------------------------
+# ROW-LEVEL SECURITY
+# -----------------------------
+def test_rls_doctor_sees_own_patients(client):
+    """A doctor sees the patients they diagnosed and only their own diagnoses."""
+    ensure_patient_exists(client, "diagpatient", "Diag Patient", "1990-01-01")
+    ensure_doctor_exists(client, "test_doctor", "Test Doctor", "General")
+    headers = {"Authorization": f"Bearer {tokens['doctor']}"}
+    response = client.post("/diagnosis", json={
+        "diagnosis_date": "2025-01-01",
+        "icd": "I10",
+        "description": "RLS Diagnosis",
+        "patient_id": "diagpatient",
+        "doctor_id": "test_doctor"
+    }, headers=headers)
+    assert response.status_code == 200
+
+    response = client.get("/patients/diagpatient", headers=headers)
+    assert response.status_code == 200
+
+    response = client.get("/diagnosis?limit=1000", headers=headers)
+    assert response.status_code == 200
+    assert all(d["doctor_id"] == "test_doctor" for d in response.json())
+
+
+def test_rls_patient_sees_own_diagnosis(client):
+    """A patient only sees their own diagnoses."""
+    headers = {"Authorization": f"Bearer {tokens['patient']}"}
+    response = client.get("/diagnosis?limit=1000", headers=headers)
+    assert response.status_code == 200
+    assert all(d["patient_id"] == "test_patient" for d in response.json())
+
+
+# -----------------------------
+# BATCH LOOKUP
+# -----------------------------
+def test_batch_diagnosis_by_ids(client):
+    """?ids= returns the diagnoses in request order and reports missing IDs."""
+    ensure_patient_exists(client, "diagpatient", "Diag Patient", "1990-01-01")
+    ensure_doctor_exists(client, "test_doctor", "Test Doctor", "General")
+    headers = {"Authorization": f"Bearer {tokens['doctor']}"}
+    created = [
+        client.post("/diagnosis", json={
+            "diagnosis_date": "2025-02-01", "icd": "J45", "description": f"Batch {i}",
+            "patient_id": "diagpatient", "doctor_id": "test_doctor",
+        }, headers=headers).json()["id_diagnosis"]
+        for i in range(3)
+    ]
+    requested = [created[2], 2_000_000_000, created[0], created[1], created[0]]
+    response = client.get("/diagnosis", params={"ids": ",".join(map(str, requested))}, headers=headers)
+    assert response.status_code == 200
+    assert [d["id_diagnosis"] for d in response.json()] == [created[2], created[0], created[1]]
+    assert response.headers["x-missing-ids"] == "2000000000"
+
+
+@pytest.mark.parametrize("path", ["/diagnosis", "/appointments", "/files"])
+@pytest.mark.parametrize("ids", ["1,a", "", "0", ",".join(map(str, range(1, 1002)))], ids=["nan", "empty", "zero", "too-many"])
+def test_batch_invalid_ids(client, path, ids):
+    """Malformed, empty, out-of-range and oversized ID lists are rejected."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    response = client.get(path, params={"ids": ids}, headers=headers)
+    assert response.status_code == 400
+
+
 # -------------------------------------------------------------------
 # APPOINTMENTS ENDPOINT TESTS
 # -------------------------------------------------------------------
@@ -494,12 +1071,15 @@ def setup_appointment(client):
         "doctor_id": "apptdoctor"
     }
 
-    # Create the appointment; ignore if it already exists
+    # Create the appointment; reuse it if the slot is already booked
     response = client.post("/appointments", json=appt_data, headers=headers)
-    if response.status_code not in (200, 400):  # 400 if already exists
+    if response.status_code not in (200, 409):  # 409 if the slot is taken
         assert response.status_code == 200
-
-    appointment_id = response.json().get("id_appointment", "apptpatient_apptdoctor_2025-12-10")
+    if response.status_code == 200:
+        assert_compact_json(response)
+        appointment_id = response.json()["id_appointment"]
+    else:
+        appointment_id = response.json()["conflict"]["id_appointment"]
     return {"id_appointment": appointment_id, "data": appt_data}
 
 
@@ -525,23 +1105,177 @@ def test_create_appointment_forbidden(client, setup_appointment, role):
 # -----------------------------
 # LIST APPOINTMENTS
 # -----------------------------
-@pytest.mark.parametrize("role", ["admin", "doctor", "patient"])
-def test_list_appointments(client, setup_appointment, role):
-    """All roles can list appointments."""
+@pytest.mark.parametrize("role, visible", [("admin", True), ("doctor", False), ("patient", False)])
+def test_list_appointments(client, setup_appointment, role, visible):
+    """All roles can list appointments, doctors and patients only see their own (RLS)."""
     appointment_id = setup_appointment["id_appointment"]
     headers = {"Authorization": f"Bearer {tokens[role]}"}
     response = client.get("/appointments", headers=headers)
     assert response.status_code == 200
     data = response.json()
-    assert any(a["id_appointment"] == appointment_id for a in data)
+    assert any(a["id_appointment"] == appointment_id for a in data) == visible
+
+
+def test_list_appointments_stream(client, setup_appointment):
+    """Appointments can be exported as an NDJSON stream."""
+    appointment_id = setup_appointment["id_appointment"]
+    headers = {"Authorization": f"Bearer {tokens['admin']}", "Accept": "application/x-ndjson"}
+    response = client.get("/appointments", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert any(a["id_appointment"] == appointment_id for a in rows)
+
+
+def test_list_appointments_stream_rls(client, setup_appointment):
+    """Streams run under the patient's role: only their own appointments."""
+    headers = {"Authorization": f"Bearer {tokens['patient']}", "Accept": "application/x-ndjson"}
+    response = client.get("/appointments", headers=headers)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert all(a["patient_id"] == "test_patient" for a in rows)
+    assert not any(a["id_appointment"] == setup_appointment["id_appointment"] for a in rows)
+
+
+def test_list_appointments_filtered(client, setup_appointment):
+    """Date range, doctor, patient and status filters narrow the list."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    ensure_doctor_exists(client, "agendadoctor", "Agenda Doctor", "General")
+    for day in ("2026-03-02T09:00:00", "2026-03-04T09:00:00", "2026-03-09T09:00:00"):
+        client.post("/appointments", json={
+            "appointment_date": day, "reason": "Agenda",
+            "patient_id": "apptpatient", "doctor_id": "agendadoctor",
+        }, headers=headers)
+
+    params = {"doctor_id": "agendadoctor", "from": "2026-03-02", "to": "2026-03-09"}
+    response = client.get("/appointments", params=params, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [a["appointment_date"] for a in data] == ["2026-03-04T09:00:00", "2026-03-02T09:00:00"]
+    assert all(a["doctor_id"] == "agendadoctor" for a in data)
+
+    paged = client.get("/appointments", params={**params, "limit": 1}, headers=headers)
+    cursor = paged.headers["X-Next-Cursor"]
+    rest = client.get("/appointments", params={**params, "limit": 1, "after": cursor}, headers=headers)
+    assert paged.json() + rest.json() == data
+
+    response = client.get("/appointments", params={**params, "status": "cancelled"}, headers=headers)
+    assert response.json() == []
+    response = client.get("/appointments", params={**params, "patient_id": "nobody"}, headers=headers)
+    assert response.json() == []
+
+
+def test_create_appointment_overlap(client):
+    """Booking an overlapping slot of the same doctor returns 409 with the clash."""
+    ensure_patient_exists(client, "apptpatient", "Appt Patient", "1990-01-01")
+    ensure_doctor_exists(client, "slotdoctor", "Slot Doctor", "General")
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    booking = {"reason": "Slot", "patient_id": "apptpatient", "doctor_id": "slotdoctor"}
+    for old in client.get("/appointments", params={"doctor_id": "slotdoctor"}, headers=headers).json():
+        client.delete(f"/appointments/{old['id_appointment']}", headers=headers)
+
+    first = client.post("/appointments", json={**booking, "appointment_date": "2026-04-01T10:00:00", "duration_minutes": 60}, headers=headers)
+    assert first.status_code == 200
+
+    clash = client.post("/appointments", json={**booking, "appointment_date": "2026-04-01T10:30:00"}, headers=headers)
+    assert clash.status_code == 409
+    assert clash.json()["conflict"]["id_appointment"] == first.json()["id_appointment"]
+
+    # Back-to-back slots do not overlap ([start, end) ranges)
+    after = client.post("/appointments", json={**booking, "appointment_date": "2026-04-01T11:00:00"}, headers=headers)
+    assert after.status_code == 200
+
+    moved = client.patch(f"/appointments/{after.json()['id_appointment']}", json={"appointment_date": "2026-04-01T10:15:00"}, headers=headers)
+    assert moved.status_code == 409
+    assert moved.json()["conflict"]["id_appointment"] == first.json()["id_appointment"]
+
+
+def test_cancel_appointment_frees_slot(client):
+    """Cancelling an appointment lets another one take its slot."""
+    ensure_patient_exists(client, "apptpatient", "Appt Patient", "1990-01-01")
+    ensure_doctor_exists(client, "canceldoctor", "Cancel Doctor", "General")
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    booking = {"reason": "Cancel", "patient_id": "apptpatient", "doctor_id": "canceldoctor",
+               "appointment_date": "2026-04-03T10:00:00"}
+    for old in client.get("/appointments", params={"doctor_id": "canceldoctor"}, headers=headers).json():
+        client.delete(f"/appointments/{old['id_appointment']}", headers=headers)
+
+    first = client.post("/appointments", json=booking, headers=headers).json()
+    assert first["status"] == "scheduled"
+    assert client.post("/appointments", json=booking, headers=headers).status_code == 409
+
+    cancelled = client.patch(f"/appointments/{first['id_appointment']}", json={"status": "cancelled"}, headers=headers)
+    assert cancelled.status_code == 200
+    assert cancelled.json()["status"] == "cancelled"
+    second = client.post("/appointments", json=booking, headers=headers)
+    assert second.status_code == 200
+
+    # Rescheduling the cancelled one now clashes with its replacement
+    restored = client.patch(f"/appointments/{first['id_appointment']}", json={"status": "scheduled"}, headers=headers)
+    assert restored.status_code == 409
+    assert restored.json()["conflict"]["id_appointment"] == second.json()["id_appointment"]
+
+
+def test_update_appointment_deleted_during_conflict(client, monkeypatch):
+    """A conflicting PATCH of an appointment deleted meanwhile returns 404, not 500."""
+    ensure_patient_exists(client, "apptpatient", "Appt Patient", "1990-01-01")
+    ensure_doctor_exists(client, "gonedoctor", "Gone Doctor", "General")
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    booking = {"reason": "Gone", "patient_id": "apptpatient", "doctor_id": "gonedoctor"}
+    for old in client.get("/appointments", params={"doctor_id": "gonedoctor"}, headers=headers).json():
+        client.delete(f"/appointments/{old['id_appointment']}", headers=headers)
+    client.post("/appointments", json={**booking, "appointment_date": "2026-04-02T10:00:00"}, headers=headers)
+    later = client.post("/appointments", json={**booking, "appointment_date": "2026-04-02T11:00:00"}, headers=headers)
+
+    # Delete the appointment right after the UPDATE fails, before the handler re-reads it
+    fetchrow = TimedConnection.fetchrow
+
+    async def delete_first(self, query, *args, **kwargs):
+        if query.startswith("SELECT appointment_date, duration_minutes, doctor_id"):
+            await self.execute("DELETE FROM appointments WHERE id_appointment = $1", *args)
+        return await fetchrow(self, query, *args, **kwargs)
+
+    monkeypatch.setattr(TimedConnection, "fetchrow", delete_first)
+    moved = client.patch(f"/appointments/{later.json()['id_appointment']}", json={"appointment_date": "2026-04-02T10:00:00"}, headers=headers)
+    assert moved.status_code == 404
+
+
+def test_create_appointment_concurrent_bookings(client):
+    """Of many concurrent bookings of one slot exactly one succeeds."""
+    ensure_patient_exists(client, "apptpatient", "Appt Patient", "1990-01-01")
+    ensure_doctor_exists(client, "racedoctor", "Race Doctor", "General")
+
+    async def book(pool):
+        try:
+            await pool.execute(
+                "INSERT INTO appointments (appointment_date, reason, patient_id, doctor_id) VALUES ($1, 'Race', 'apptpatient', 'racedoctor')",
+                datetime(2026, 5, 1, 12, 0),
+            )
+            return True
+        except asyncpg.exceptions.ExclusionViolationError:
+            return False
+
+    async def race():
+        async with asyncpg.create_pool(DATABASE_URL, min_size=10, max_size=10) as pool:
+            await pool.execute("DELETE FROM appointments WHERE doctor_id = 'racedoctor'")
+            return await asyncio.gather(*(book(pool) for _ in range(10)))
+
+    assert sum(asyncio.run(race())) == 1
+
+
+def test_list_appointments_invalid_range(client):
+    """An empty or inverted date range is rejected."""
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    response = client.get("/appointments", params={"from": "2026-03-09", "to": "2026-03-02"}, headers=headers)
+    assert response.status_code == 400
 
 
 # -----------------------------
 # GET APPOINTMENT
 # -----------------------------
-@pytest.mark.parametrize("role", ["admin", "doctor", "patient"])
+@pytest.mark.parametrize("role", ["admin"])
 def test_get_appointment(client, setup_appointment, role):
-    """All roles can retrieve an appointment."""
+    """Admin can retrieve any appointment."""
     appointment_id = setup_appointment["id_appointment"]
     headers = {"Authorization": f"Bearer {tokens[role]}"}
     response = client.get(f"/appointments/{appointment_id}", headers=headers)
@@ -650,9 +1384,9 @@ def test_upload_file_forbidden(client, role, setup_file):
 # -----------------------------
 # LIST FILES
 # -----------------------------
-@pytest.mark.parametrize("role", ["admin", "doctor", "patient"])
-def test_list_files(client, role, setup_file):
-    """All roles can list files."""
+@pytest.mark.parametrize("role, visible", [("admin", True), ("doctor", False), ("patient", False)])
+def test_list_files(client, role, visible, setup_file):
+    """All roles can list files, doctors and patients only see their own (RLS)."""
     file_id = setup_file
     headers = {"Authorization": f"Bearer {tokens[role]}"}
 
@@ -660,15 +1394,25 @@ def test_list_files(client, role, setup_file):
     assert response.status_code == 200
     data = response.json()
     assert isinstance(data, list)
-    assert any(f["id_file"] == file_id for f in data)
+    assert any(f["id_file"] == file_id for f in data) == visible
+
+
+def test_list_files_stream(client, setup_file):
+    """Files can be exported as an NDJSON stream with ?stream=1."""
+    file_id = setup_file
+    headers = {"Authorization": f"Bearer {tokens['admin']}"}
+    response = client.get("/files?stream=1", headers=headers)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert any(f["id_file"] == file_id for f in rows)
 
 
 # -----------------------------
 # GET FILE
 # -----------------------------
-@pytest.mark.parametrize("role", ["admin", "doctor", "patient"])
+@pytest.mark.parametrize("role", ["admin"])
 def test_get_file(client, role, setup_file):
-    """All roles can retrieve a file by its ID."""
+    """Admin can retrieve any file by its ID."""
     file_id = setup_file
     headers = {"Authorization": f"Bearer {tokens[role]}"}
 
@@ -679,6 +1423,14 @@ def test_get_file(client, role, setup_file):
     assert data["original_name"] == "testfile.txt"
 
 
+@pytest.mark.parametrize("role", ["doctor", "patient"])
+def test_get_file_hidden_by_rls(client, role, setup_file):
+    """Doctors and patients cannot see files of unrelated patients (RLS)."""
+    headers = {"Authorization": f"Bearer {tokens[role]}"}
+    response = client.get(f"/files/{setup_file}", headers=headers)
+    assert response.status_code == 404
+
+
 # -----------------------------
 # DELETE FILE
 # -----------------------------
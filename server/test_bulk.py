@@ -0,0 +1,73 @@
+# test_bulk.py
+# -----------------------------
+# Tests for the bulk import parsers
+# -----------------------------
+# This module tests that CSV and NDJSON uploads are split into rows
+# correctly whatever the chunk boundaries of the request stream.
+# -----------------------------
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from bulk import parse_upload
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def parse(media_type: str, data: bytes, size: int = 7):
+    """Run the parser over the upload split into small chunks."""
+    async def collect():
+        return [row async for row in parse_upload(media_type, _chunks(data, size))]
+    return asyncio.run(collect())
+
+
+# ---------------------------
+# CSV
+# ---------------------------
+def test_csv_rows_and_lines():
+    """
+    Header names are matched case-insensitively and rows keep their line number.
+    """
+    data = "﻿Username,NAME,birthdate\r\nana,Ana Puig,1990-01-01\r\n\r\nbiel,Biel,1991-02-03".encode()
+    assert parse("text/csv; charset=utf-8", data) == [
+        (2, {"username": "ana", "name": "Ana Puig", "birthDate": "1990-01-01"}),
+        (4, {"username": "biel", "name": "Biel", "birthDate": "1991-02-03"}),
+    ]
+
+
+def test_csv_quoted_newline_and_bad_row():
+    """
+    Quoted fields may span lines; rows with the wrong column count are None.
+    """
+    data = 'username,name,birthDate\nana,"Ana\nPuig",1990-01-01\nbad,row\nòscar,Òscar,1990-01-01\n'.encode()
+    rows = parse("text/csv", data, size=3)
+    assert rows[0] == (2, {"username": "ana", "name": "Ana\nPuig", "birthDate": "1990-01-01"})
+    assert rows[1] == (4, None)
+    assert rows[2][1]["username"] == "òscar"
+
+
+# ---------------------------
+# NDJSON
+# ---------------------------
+def test_ndjson_rows():
+    """
+    Each line is one object; other JSON values or garbage give None.
+    """
+    data = b'{"username": "ana"}\n\n[1]\nnot json\n{"username": "biel"}'
+    assert parse("application/x-ndjson", data) == [
+        (1, {"username": "ana"}), (3, None), (4, None), (5, {"username": "biel"}),
+    ]
+
+
+def test_unsupported_media_type():
+    """
+    Other content types are rejected with 415.
+    """
+    with pytest.raises(HTTPException) as exc:
+        parse_upload("application/json", _chunks(b"[]", 2))
+    assert exc.value.status_code == 415
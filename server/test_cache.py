@@ -0,0 +1,95 @@
+# test_cache.py
+# -----------------------------
+# Tests for the in-process read cache
+# -----------------------------
+# This module tests LRU eviction, TTL expiry, invalidation and the
+# hit/miss counters of TTLCache.
+# -----------------------------
+
+import cache
+from cache import MISSING, TTLCache, apply_invalidation, invalidate_all, register_invalidator
+
+
+# ---------------------------
+# LOOKUPS AND EVICTION
+# ---------------------------
+def test_hit_and_miss_counters():
+    """
+    Lookups are counted as hits or misses.
+    """
+    c = TTLCache(maxsize=4, ttl=60)
+    assert c.get("a") is MISSING
+    c.set("a", 1)
+    assert c.get("a") == 1
+    assert c.stats() == {"size": 1, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_lru_eviction():
+    """
+    When full, the least recently used entry is evicted.
+    """
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.get("b") is MISSING
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.evictions == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    """
+    Entries older than the TTL are treated as missing and dropped.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c = TTLCache(maxsize=2, ttl=10)
+    c.set("a", 1)
+    now[0] += 9
+    assert c.get("a") == 1
+    now[0] += 2
+    assert c.get("a") is MISSING
+    assert len(c) == 0
+
+
+# ---------------------------
+# INVALIDATION
+# ---------------------------
+def test_invalidate_and_clear():
+    """
+    invalidate() drops one key, clear() drops all of them.
+    """
+    c = TTLCache(maxsize=4, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.invalidate("a")
+    assert c.get("a") is MISSING and c.get("b") == 2
+    c.clear()
+    assert len(c) == 0
+
+
+def test_stale_set_is_dropped():
+    """
+    A value fetched before an invalidation is not stored.
+    """
+    c = TTLCache(maxsize=4, ttl=60)
+    generation = c.generation
+    c.invalidate("a")
+    c.set("a", "stale", generation)
+    assert c.get("a") is MISSING
+    c.set("a", "fresh", c.generation)
+    assert c.get("a") == "fresh"
+
+
+def test_apply_invalidation_routes_by_entity(monkeypatch):
+    """
+    Invalidation messages reach the callback registered for their entity.
+    """
+    monkeypatch.setattr(cache, "_invalidators", {})
+    received = []
+    register_invalidator("test_entity", received.append)
+    apply_invalidation("test_entity:drtest")
+    apply_invalidation("unknown:drtest")
+    invalidate_all()
+    assert received == ["drtest", None]
@@ -0,0 +1,144 @@
+# test_compress.py
+# -----------------------------
+# Tests for the response compression middleware
+# -----------------------------
+# This module runs CompressionMiddleware on a small Starlette app and
+# checks negotiation, the size threshold, skipped media types and
+# incremental compression of streaming responses.
+# -----------------------------
+
+import asyncio
+import zlib
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from compress import CompressionMiddleware, negotiate
+
+BIG = b'{"url":"https://gateway.example/ipfs/bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf"}' * 100
+CHUNKS = [b'{"id_file":%d,"url":"https://gateway.example/ipfs/bafy"}\n' % i for i in range(50)]
+
+
+async def big(request):
+    return Response(BIG, media_type="application/json", headers={"ETag": '"abc"'})
+
+
+async def small(request):
+    return Response(b'{"ok":true}', media_type="application/json")
+
+
+async def image(request):
+    return Response(BIG, media_type="image/png")
+
+
+async def encoded(request):
+    return Response(zlib.compress(BIG), media_type="application/json", headers={"Content-Encoding": "deflate"})
+
+
+async def lines():
+    for chunk in CHUNKS:
+        yield chunk
+
+
+async def stream(scope, receive, send):
+    await StreamingResponse(lines(), media_type="application/x-ndjson")(scope, receive, send)
+
+
+app = Starlette(routes=[
+    Route("/big", big), Route("/small", small), Route("/image", image),
+    Route("/encoded", encoded),
+])
+app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+# ---------------------------
+# NEGOTIATION
+# ---------------------------
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+    ("*", "gzip"),
+])
+def test_negotiate_gzip(header, expected, monkeypatch):
+    """
+    gzip is chosen when accepted; q=0 and identity-only disable compression.
+    """
+    import compress
+    monkeypatch.setattr(compress, "CODINGS", [("gzip", compress._gzip)])
+    assert negotiate(header) == expected
+
+
+# ---------------------------
+# MIDDLEWARE
+# ---------------------------
+def test_large_body_compressed(client):
+    """
+    Bodies over the threshold are gzipped, with length, Vary and ETag updated.
+    """
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.headers["etag"] == '"abc-gzip"'
+    assert int(response.headers["content-length"]) < len(BIG)
+    assert response.content == BIG
+
+
+@pytest.mark.parametrize("path", ["/small", "/image", "/encoded"])
+def test_body_not_recompressed(client, path):
+    """
+    Small bodies, compressed media types and encoded bodies are left alone.
+    """
+    response = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert response.headers.get("content-encoding") in (None, "deflate")
+
+
+def test_identity_when_not_accepted(client):
+    """
+    Without Accept-Encoding the body and ETag are untouched.
+    """
+    response = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"abc"'
+
+
+def test_stream_compressed_incrementally():
+    """
+    Streaming bodies are compressed chunk by chunk: one encoded message per
+    chunk, each decodable as soon as it arrives.
+    """
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "method": "GET", "path": "/stream", "raw_path": b"/stream",
+        "query_string": b"", "root_path": "", "scheme": "http", "server": ("testserver", 80),
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    asyncio.run(CompressionMiddleware(stream, minimum_size=500)(scope, receive, send))
+
+    start, *bodies = messages
+    headers = dict(start["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+
+    decoder = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    received = [decoder.decompress(m["body"]) for m in bodies]
+    assert received[:len(CHUNKS)] == CHUNKS
+    assert bodies[-1]["more_body"] is False
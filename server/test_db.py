@@ -1,5 +1,320 @@
+import asyncio
+
+import asyncpg
+import pytest
+import pytest_asyncio
+
+import db
+from db import (
+    DATABASE_URL, RECENT_WRITE_COOKIE, PoolTimeoutError, ReadYourWritesMiddleware, create_pool,
+    init_db, recent_write_marker, rls_connection,
+)
+from etag import table_versions
+from metrics import DB_POOL_ACQUIRE
+from fastapi import HTTPException
+from model import UserToken
+from users import create_user, quote_ident
+
+
 async def test_connection():
     conn = await get_connection()
     value = await conn.fetchval("SELECT 1")
     await conn.close()
-    print("DB OK:", value)
\ No newline at end of file
+    print("DB OK:", value)
+
+
+# -------------------------------------------------------------------
+# INDEX USAGE (EXPLAIN)
+# -------------------------------------------------------------------
+# These tests check that the RLS subqueries, cascade lookups and list
+# sort keys are answered by the indexes of migrations 0002, 0003 and 0008
+# (applied by init_db). Sequential scans are disabled so the planner picks
+# an index even on tiny test tables whenever a usable one exists.
+# -------------------------------------------------------------------
+
+@pytest_asyncio.fixture
+async def conn():
+    """
+    Provide a connection to an initialized database with seq scans disabled.
+    """
+    pool = await asyncpg.create_pool(dsn=DATABASE_URL, min_size=1, max_size=1)
+    try:
+        await init_db(pool)
+        async with pool.acquire() as c:
+            async with c.transaction():
+                await c.execute("SET LOCAL enable_seqscan = off")
+                yield c
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query, index", [
+    # RLS policy subqueries
+    ("SELECT patient_id FROM diagnosis WHERE doctor_id = 'drtest'", "diagnosis_doctor_idx"),
+    ("SELECT doctor_id FROM diagnosis WHERE patient_id = 'ptest'", "diagnosis_patient_date_idx"),
+    ("SELECT id_appointment FROM appointments WHERE doctor_id = 'drtest'", "appointments_doctor_date_idx"),
+    # ON DELETE CASCADE lookups
+    ("SELECT 1 FROM appointments WHERE patient_id = 'ptest'", "appointments_patient_date_idx"),
+    ("SELECT 1 FROM files WHERE patient_id = 'ptest'", "files_patient_date_idx"),
+    ("SELECT 1 FROM files WHERE diagnosis_id = 1", "files_diagnosis_idx"),
+    ("SELECT 1 FROM files WHERE appointment_id = 1", "files_appointment_idx"),
+    # List endpoint sort keys
+    ("SELECT * FROM appointments ORDER BY appointment_date DESC, id_appointment DESC LIMIT 10",
+     "appointments_date_idx"),
+    ("SELECT * FROM files ORDER BY uploaded_at DESC, id_file DESC LIMIT 10", "files_uploaded_idx"),
+    # Filtered appointment agenda
+    ("SELECT * FROM appointments WHERE doctor_id = 'drtest' AND appointment_date >= '2026-03-02' "
+     "AND appointment_date < '2026-03-09' ORDER BY appointment_date DESC, id_appointment DESC LIMIT 10",
+     "appointments_doctor_date_idx"),
+    # Patient timeline branches, from a cursor
+    ("SELECT * FROM diagnosis WHERE patient_id = 'ptest' AND diagnosis_date <= '2026-03-02'::timestamp "
+     "ORDER BY diagnosis_date DESC, id_diagnosis DESC LIMIT 11", "diagnosis_patient_date_idx"),
+    ("SELECT * FROM files WHERE patient_id = 'ptest' AND uploaded_at <= '2026-03-02'::timestamp "
+     "ORDER BY uploaded_at DESC, id_file DESC LIMIT 11", "files_patient_date_idx"),
+])
+async def test_index_used(conn, query, index):
+    """
+    The query plan scans the expected index.
+    """
+    plan = "\n".join(r[0] for r in await conn.fetch(f"EXPLAIN {query}"))
+    assert index in plan, plan
+
+
+# -------------------------------------------------------------------
+# CONNECTION POOL
+# -------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_pool_acquire_timeout():
+    """A full pool raises PoolTimeoutError once the acquire timeout runs out."""
+    pool = await create_pool(DATABASE_URL, min_size=1, max_size=1, acquire_timeout=0.05)
+    try:
+        async with pool.acquire():
+            with pytest.raises(PoolTimeoutError):
+                await pool.acquire()
+        assert pool.waiters == 0
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_meters_every_acquire_form():
+    """Awaiting acquire(), ``async with`` and the fetch shortcuts are all timed."""
+    def observed():
+        series = DB_POOL_ACQUIRE._series.get(())
+        return sum(series.counts) if series else 0
+
+    pool = await create_pool(DATABASE_URL, min_size=1, max_size=1)
+    try:
+        before = observed()
+        conn = await pool.acquire()
+        await pool.release(conn)
+        async with pool.acquire() as conn:
+            assert await conn.fetchval("SELECT 1") == 1
+        assert await pool.fetchval("SELECT 1") == 1
+        assert observed() - before == 3
+        assert pool.waiters == 0
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_warm_reopens_min_connections():
+    """warm() reopens the minimum connections closed while idle."""
+    pool = await create_pool(DATABASE_URL, min_size=2, max_size=4,
+                             max_inactive_connection_lifetime=0.05)
+    try:
+        assert pool.get_size() == 2
+        await asyncio.sleep(0.2)
+        assert pool.get_size() == 0
+        await pool.warm()
+        assert pool.get_size() == 2
+        assert pool.get_idle_size() == 2
+    finally:
+        await pool.close()
+
+
+# -------------------------------------------------------------------
+# READ-YOUR-WRITES TRACKING
+# -------------------------------------------------------------------
+
+async def run_write_marker(window: float, writer=None) -> list:
+    """Response headers of one request through ReadYourWritesMiddleware."""
+    async def app(scope, receive, send):
+        if writer is not None:
+            scope.setdefault("state", {})["writer"] = writer
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await ReadYourWritesMiddleware(app, window)({"type": "http", "headers": []}, None, send)
+    return sent[0]["headers"]
+
+
+@pytest.mark.asyncio
+async def test_write_sets_recent_write_cookie():
+    """Writes get a cookie naming their user for the (rounded up) window."""
+    headers = await run_write_marker(4.5, writer="dr smith")
+    assert headers == [(
+        b"set-cookie",
+        f"{RECENT_WRITE_COOKIE}=dr%20smith; Max-Age=5; Path=/; HttpOnly; SameSite=Lax".encode(),
+    )]
+    assert recent_write_marker("dr smith") == "dr%20smith"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("window, writer", [(5, None), (0, "drtest")])
+async def test_no_recent_write_cookie(window, writer):
+    """Reads, and every request with a window of 0, get no cookie."""
+    assert await run_write_marker(window, writer) == []
+
+
+# -------------------------------------------------------------------
+# ROLE-SCOPED CONNECTIONS
+# -------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_rls_connection_round_trips(monkeypatch):
+    """Patients get BEGIN + SET ROLE in one script; admins get no transaction."""
+    pool = await create_pool(DATABASE_URL, min_size=1, max_size=1)
+    try:
+        await init_db(pool)
+        queries = []
+        original = db.record_query
+        monkeypatch.setattr(db, "record_query", lambda q, *a: (queries.append(q), original(q, *a)))
+
+        async with rls_connection(pool, UserToken(username="test_patient", role="patient")) as conn:
+            assert conn.is_in_transaction()
+            assert queries == ['BEGIN READ ONLY; SET LOCAL ROLE "test_patient"']
+            assert await conn.fetchval("SELECT current_user") == "test_patient"
+        assert "ROLLBACK" in queries
+
+        queries.clear()
+        async with rls_connection(pool, UserToken(username="test_admin", role="admin")) as conn:
+            assert not conn.is_in_transaction()
+        assert not [q for q in queries if q.startswith(("BEGIN", "ROLLBACK"))]
+
+        with pytest.raises(HTTPException) as error:
+            async with rls_connection(pool, UserToken(username="no_such_role", role="patient")):
+                pass
+        assert error.value.status_code == 403
+        async with pool.acquire() as conn:
+            assert not conn.is_in_transaction()
+    finally:
+        await pool.close()
+
+
+# -------------------------------------------------------------------
+# CHANGE COUNTERS
+# -------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_table_version_writers_do_not_block():
+    """A write open in one transaction does not hold up the counter of others."""
+    pool = await create_pool(DATABASE_URL, min_size=2, max_size=2)
+    try:
+        await init_db(pool)
+        await pool.execute("DELETE FROM doctors WHERE username IN ('shard_a', 'shard_b')")
+        before = await table_versions(pool, ("doctors",))
+        async with pool.acquire() as slow, pool.acquire() as fast:
+            async with slow.transaction():
+                await slow.execute("INSERT INTO doctors (username, name) VALUES ('shard_a', 'Shard A')")
+                await asyncio.wait_for(
+                    fast.execute("INSERT INTO doctors (username, name) VALUES ('shard_b', 'Shard B')"), 2
+                )
+                assert await table_versions(fast, ("doctors",)) == (before[0] + 1,)
+        assert await table_versions(pool, ("doctors",)) == (before[0] + 2,)
+    finally:
+        await pool.execute("DELETE FROM doctors WHERE username IN ('shard_a', 'shard_b')")
+        await pool.close()
+
+
+# -------------------------------------------------------------------
+# TEST USER SEEDING
+# -------------------------------------------------------------------
+
+SEED_USERS = [("seed_patient", "pass123", "patient"), ("seed_doctor", "pass123", "doctor")]
+
+
+@pytest_asyncio.fixture
+async def seed_users(monkeypatch):
+    """Seed a dedicated set of users, removed again after the test."""
+    monkeypatch.setattr(db, "test_users", SEED_USERS)
+    pool = await create_pool(DATABASE_URL, min_size=1, max_size=3)
+    try:
+        await init_db(pool)
+        yield pool
+    finally:
+        names = [username for username, _, _ in SEED_USERS]
+        await pool.execute("DELETE FROM users WHERE username = ANY($1)", names)
+        for name in names:
+            await pool.execute(f'DROP ROLE IF EXISTS "{name}"')
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_seed_users_concurrently(seed_users):
+    """Workers seeding a fresh database at once do not race on CREATE ROLE."""
+    names = [username for username, _, _ in SEED_USERS]
+    await seed_users.execute("DELETE FROM users WHERE username = ANY($1)", names)
+    for name in names:
+        await seed_users.execute(f'DROP ROLE IF EXISTS "{name}"')
+
+    pools = [await create_pool(DATABASE_URL, min_size=1, max_size=1) for _ in range(3)]
+    try:
+        await asyncio.gather(*(db.seed_test_users(p) for p in pools))
+    finally:
+        for p in pools:
+            await p.close()
+
+    roles = await seed_users.fetch("SELECT rolname FROM pg_roles WHERE rolname = ANY($1)", names)
+    assert sorted(r["rolname"] for r in roles) == sorted(names)
+
+
+@pytest.mark.asyncio
+async def test_seed_users_skips_hashing_when_seeded(seed_users, monkeypatch):
+    """Seeding an already seeded database computes no Argon2 hash."""
+    names = [username for username, _, _ in SEED_USERS]
+    await seed_users.execute("DELETE FROM users WHERE username = ANY($1)", names)
+
+    hashed = []
+    hash_password_async = db.hash_password_async
+
+    async def spy(password):
+        hashed.append(password)
+        return await hash_password_async(password)
+
+    monkeypatch.setattr(db, "hash_password_async", spy)
+    await db.seed_test_users(seed_users)
+    assert len(hashed) == len(SEED_USERS)
+
+    hashed.clear()
+    await db.seed_test_users(seed_users)
+    assert hashed == []
+
+
+# -------------------------------------------------------------------
+# USER ROLES
+# -------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_create_user_quotes_role_names():
+    """Usernames are quoted as identifiers when their role is created and granted."""
+    username = 'quote"user'
+    pool = await create_pool(DATABASE_URL, min_size=1, max_size=1)
+    try:
+        await init_db(pool)
+        await create_user(username, "pass123", pool, "doctor")
+        granted = await pool.fetchval(
+            "SELECT pg_has_role($1, 'doctor', 'MEMBER')", username
+        )
+        assert granted
+    finally:
+        await pool.execute("DELETE FROM users WHERE username = $1", username)
+        await pool.execute(f"DROP ROLE IF EXISTS {quote_ident(username)}")
+        await pool.close()
@@ -0,0 +1,37 @@
+# test_etag.py
+# -----------------------------
+# Tests for the conditional GET helpers
+# -----------------------------
+# This module tests ETag generation and If-None-Match matching.
+# -----------------------------
+
+import pytest
+
+from etag import etag_matches, make_etag
+
+
+def test_make_etag_strong_and_stable():
+    """
+    ETags are quoted (strong), deterministic and depend on every part.
+    """
+    etag = make_etag((3, 7), "test_admin", "/api/patients")
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == make_etag((3, 7), "test_admin", "/api/patients")
+    assert etag != make_etag((3, 8), "test_admin", "/api/patients")
+    assert etag != make_etag((3, 7), "test_doctor", "/api/patients")
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", "abc"', True),
+    ("*", True),
+    ('"xyz"', False),
+])
+def test_etag_matches(header, expected):
+    """
+    If-None-Match uses weak comparison and accepts lists and '*'.
+    """
+    assert etag_matches(header, '"abc"') is expected
@@ -0,0 +1,101 @@
+# test_metrics.py
+# -----------------------------
+# Tests for the Prometheus metrics module
+# -----------------------------
+# This module checks the text exposition format of counters, gauges and
+# histograms, and the per-route instrumentation on a small FastAPI app.
+# -----------------------------
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+from metrics import Counter, Gauge, Histogram, InstrumentedRoute
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Give every test an empty registry."""
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+
+
+# ---------------------------
+# METRIC TYPES
+# ---------------------------
+def test_counter_render():
+    """Counters keep one series per label set and escape label values."""
+    counter = Counter("requests_total", "Requests.", ("route",))
+    counter.inc(("/a",))
+    counter.inc(("/a",), 2)
+    counter.inc(('/b"',))
+    assert counter.render().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a"} 3',
+        'requests_total{route="/b\\""} 1',
+    ]
+
+
+def test_gauge_function():
+    """A gauge bound to a function reads it on every render."""
+    gauge = Gauge("pool_size", "Size.")
+    values = iter([3, 5])
+    gauge.set_function(lambda: next(values))
+    assert gauge.render().endswith("pool_size 3")
+    assert gauge.render().endswith("pool_size 5")
+
+
+def test_histogram_buckets_are_cumulative():
+    """Buckets count values <= their bound, +Inf equals the count."""
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, ("/a",))
+    lines = histogram.render().splitlines()[2:]
+    assert lines == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 3.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_histogram_timer():
+    """The timer context observes one value per block."""
+    histogram = Histogram("work_seconds", "Work.")
+    with histogram.time():
+        pass
+    assert "work_seconds_count 1" in histogram.render()
+
+
+# ---------------------------
+# ROUTE INSTRUMENTATION
+# ---------------------------
+def test_instrumented_route(monkeypatch):
+    """Requests are counted by route template, method and status."""
+    labels = ("method", "route")
+    monkeypatch.setattr(metrics, "HTTP_REQUESTS", Counter("http_requests_total", "Requests.", (*labels, "status")))
+    monkeypatch.setattr(metrics, "HTTP_LATENCY", Histogram("http_request_duration_seconds", "Latency.", labels))
+    monkeypatch.setattr(metrics, "HTTP_IN_PROGRESS", Gauge("http_requests_in_progress", "In flight.", labels))
+
+    router = APIRouter(route_class=InstrumentedRoute)
+
+    @router.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.add_route("/metrics", metrics.metrics_endpoint)
+
+    with TestClient(app) as client:
+        client.get("/api/items/1")
+        client.get("/api/items/2")
+        client.get("/api/items/x")
+        body = client.get("/metrics").text
+
+    assert 'http_requests_total{method="GET",route="/api/items/{item_id}",status="200"} 2' in body
+    assert 'http_requests_total{method="GET",route="/api/items/{item_id}",status="422"} 1' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/items/{item_id}"} 3' in body
+    assert 'http_requests_in_progress{method="GET",route="/api/items/{item_id}"} 0' in body
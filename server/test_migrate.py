@@ -0,0 +1,189 @@
+# test_migrate.py
+# -----------------------------
+# Tests for the schema migration loader
+# -----------------------------
+# This module tests that migration files are discovered, ordered and
+# validated before being applied by migrate.migrate(), and applies the
+# bundled ones to a scratch schema seeded with data of older versions.
+# -----------------------------
+
+import asyncio
+from datetime import datetime
+
+import asyncpg
+import pytest
+import pytest_asyncio
+
+import migrate
+from db import DATABASE_URL
+from migrate import MIGRATION_LOCK_ID, Migration, load_migrations, migrations
+
+SCRATCH_SCHEMA = "migrate_test"
+
+
+def test_migrations_ordered_and_unique():
+    """
+    Bundled migrations are sorted by version and versions are unique.
+    """
+    versions = [m.version for m in migrations]
+    assert versions == sorted(set(versions))
+    assert versions[0] == 1
+
+
+def test_load_migrations_order(tmp_path):
+    """
+    Files are ordered by numeric version, not by name.
+    """
+    (tmp_path / "10_later.sql").write_text("SELECT 10;")
+    (tmp_path / "2_early.sql").write_text("SELECT 2;")
+    loaded = load_migrations(tmp_path)
+    assert [(m.version, m.name) for m in loaded] == [(2, "early"), (10, "later")]
+
+
+@pytest.mark.parametrize("names", [["bad-name.sql"], ["1_a.sql", "0001_b.sql"]])
+def test_load_migrations_invalid(tmp_path, names):
+    """
+    Malformed file names and duplicated versions are rejected.
+    """
+    for name in names:
+        (tmp_path / name).write_text("SELECT 1;")
+    with pytest.raises(RuntimeError):
+        load_migrations(tmp_path)
+
+
+# -------------------------------------------------------------------
+# APPLYING MIGRATIONS
+# -------------------------------------------------------------------
+@pytest_asyncio.fixture
+async def scratch_pool():
+    """
+    Provide a pool whose unqualified tables live in an empty schema,
+    dropped again after the test. ``public`` stays on the search path for
+    the extensions.
+    """
+    pool = await asyncpg.create_pool(
+        DATABASE_URL, min_size=1, max_size=3,
+        server_settings={"search_path": f"{SCRATCH_SCHEMA}, public"},
+    )
+    await pool.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE; CREATE SCHEMA {SCRATCH_SCHEMA}")
+    # Created up front so that it, not public.schema_version, is found
+    await pool.execute(migrate.schema_version_table)
+    try:
+        yield pool
+    finally:
+        await pool.execute(f"DROP SCHEMA {SCRATCH_SCHEMA} CASCADE")
+        await pool.close()
+
+
+async def migrate_to(pool, version, monkeypatch):
+    """Apply the bundled migrations up to ``version`` included."""
+    monkeypatch.setattr(migrate, "migrations", [m for m in migrations if m.version <= version])
+    return await migrate.migrate(pool)
+
+
+async def applied(pool):
+    """Return the (version, name) rows of schema_version."""
+    rows = await pool.fetch("SELECT version, name FROM schema_version ORDER BY version")
+    return [tuple(r) for r in rows]
+
+
+@pytest.mark.asyncio
+async def test_migrate_records_versions(scratch_pool, monkeypatch):
+    """
+    Every bundled migration is applied once and recorded in schema_version.
+    """
+    assert await migrate_to(scratch_pool, migrations[-1].version, monkeypatch) == len(migrations)
+    assert await applied(scratch_pool) == [(m.version, m.name) for m in migrations]
+
+
+@pytest.mark.asyncio
+async def test_migrate_current_schema_takes_no_lock(scratch_pool, monkeypatch):
+    """
+    With nothing pending, migrate() returns without waiting for the lock.
+    """
+    monkeypatch.setattr(migrate, "migrations", [Migration(1, "one", "CREATE TABLE one (id INT)")])
+    assert await migrate.migrate(scratch_pool) == 1
+
+    async with scratch_pool.acquire() as holder:
+        await holder.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            assert await asyncio.wait_for(migrate.migrate(scratch_pool), 1) == 0
+        finally:
+            await holder.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+
+@pytest.mark.asyncio
+async def test_migrate_rolls_back_failed_migration(scratch_pool, monkeypatch):
+    """
+    A failing migration is rolled back alone; earlier ones stay applied and
+    it is retried on the next run.
+    """
+    monkeypatch.setattr(migrate, "migrations", [
+        Migration(1, "one", "CREATE TABLE one (id INT)"),
+        Migration(2, "two", "CREATE TABLE two (id INT); SELECT 1 / 0"),
+    ])
+    with pytest.raises(asyncpg.exceptions.DivisionByZeroError):
+        await migrate.migrate(scratch_pool)
+    assert await applied(scratch_pool) == [(1, "one")]
+    assert await scratch_pool.fetchval("SELECT to_regclass('two')") is None
+
+    monkeypatch.setattr(migrate, "migrations", [
+        migrate.migrations[0],
+        Migration(2, "two", "CREATE TABLE two (id INT)"),
+    ])
+    assert await migrate.migrate(scratch_pool) == 1
+    assert await applied(scratch_pool) == [(1, "one"), (2, "two")]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_migrate_serialized(scratch_pool, monkeypatch):
+    """
+    Workers migrating at once apply each migration exactly once.
+    """
+    monkeypatch.setattr(migrate, "migrations", [
+        Migration(1, "one", "CREATE TABLE one (id INT); SELECT pg_sleep(0.2)"),
+        Migration(2, "two", "CREATE TABLE two (id INT)"),
+    ])
+    counts = await asyncio.gather(migrate.migrate(scratch_pool), migrate.migrate(scratch_pool))
+    assert sorted(counts) == [0, 2]
+    assert await applied(scratch_pool) == [(1, "one"), (2, "two")]
+
+
+@pytest.mark.asyncio
+async def test_slots_cancel_legacy_overlaps(scratch_pool, monkeypatch):
+    """
+    0009 keeps the earliest of a doctor's overlapping legacy appointments
+    and cancels the rest instead of failing on the exclusion constraint.
+    """
+    await migrate_to(scratch_pool, 8, monkeypatch)
+    await scratch_pool.execute("""
+        INSERT INTO patients VALUES ('p1', 'Patient', '1990-01-01');
+        INSERT INTO doctors VALUES ('d1', 'Doctor One', NULL), ('d2', 'Doctor Two', NULL);
+    """)
+    day = datetime(2025, 3, 10)
+    rows = [
+        (day, "d1", "scheduled"),                          # kept: earliest
+        (day, "d1", "scheduled"),                          # same slot
+        (day.replace(minute=20), "d1", "scheduled"),       # overlaps the first
+        (day.replace(minute=40), "d1", "scheduled"),       # only overlaps a cancelled one
+        (day, "d1", "cancelled"),                          # already cancelled
+        (day, "d2", "scheduled"),                          # another doctor
+        (day.replace(day=11), "d1", "scheduled"),          # another day
+    ]
+    ids = [
+        await scratch_pool.fetchval(
+            "INSERT INTO appointments (appointment_date, doctor_id, status, patient_id) "
+            "VALUES ($1, $2, $3, 'p1') RETURNING id_appointment",
+            *row,
+        )
+        for row in rows
+    ]
+
+    await migrate_to(scratch_pool, 9, monkeypatch)
+
+    status = dict(await scratch_pool.fetch("SELECT id_appointment, status FROM appointments"))
+    assert [status[i] for i in ids] == [
+        "scheduled", "cancelled", "cancelled", "scheduled", "cancelled", "scheduled", "scheduled",
+    ]
+    durations = await scratch_pool.fetch("SELECT DISTINCT duration_minutes FROM appointments")
+    assert [r["duration_minutes"] for r in durations] == [30]
@@ -0,0 +1,61 @@
+# test_pagination.py
+# -----------------------------
+# Tests for keyset pagination helpers
+# -----------------------------
+# This module tests cursor encoding/decoding and page trimming
+# used by the list endpoints.
+# -----------------------------
+
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException, Response
+
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate
+
+
+# ---------------------------
+# CURSOR ENCODING / DECODING
+# ---------------------------
+def test_cursor_roundtrip():
+    """
+    A cursor decodes back to the same sort-key values.
+    """
+    values = (datetime(2025, 12, 10, 9, 30), 42)
+    cursor = encode_cursor(values)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, (datetime.fromisoformat, int)) == values
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor(["a", "b"]), ""])
+def test_decode_invalid_cursor(cursor):
+    """
+    Malformed cursors or cursors with the wrong number of keys are rejected with 400.
+    """
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, (str,))
+    assert exc.value.status_code == 400
+
+
+# ---------------------------
+# PAGE TRIMMING
+# ---------------------------
+def test_paginate_sets_next_cursor():
+    """
+    When an extra row is fetched, the page is trimmed and the cursor points to its last row.
+    """
+    rows = [{"username": u} for u in ("a", "b", "c")]
+    response = Response()
+    page = paginate(rows, 2, ("username",), response)
+    assert [r["username"] for r in page] == ["a", "b"]
+    assert decode_cursor(response.headers[NEXT_CURSOR_HEADER], (str,)) == ("b",)
+
+
+def test_paginate_last_page():
+    """
+    The last page carries no next cursor.
+    """
+    rows = [{"username": "a"}]
+    response = Response()
+    assert paginate(rows, 2, ("username",), response) == rows
+    assert NEXT_CURSOR_HEADER not in response.headers
@@ -0,0 +1,99 @@
+# test_serializers.py
+# -----------------------------
+# Tests for the JSON serialization helpers
+# -----------------------------
+# This module checks that the fast serializers produce the same bytes
+# as FastAPI's default encoding path, and pins where they differ (floats).
+# -----------------------------
+
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from model import Appointment, Patient
+from serializers import FastJSONResponse, RowSerializer
+
+
+# ---------------------------
+# DEFAULT RESPONSE CLASS
+# ---------------------------
+@pytest.mark.parametrize("content", [
+    {"username": "pacient1", "name": "Núria Pérez", "birthDate": "1990-01-01"},
+    [{"id": 1, "tags": ["a", "b"], "ok": True, "note": None}, {"id": 2}],
+    {"detail": "Incorrect username or password"},
+    "plain ✓ string",
+])
+def test_render_matches_json_response(content):
+    """
+    Plain JSON content renders byte-for-byte like Starlette's JSONResponse.
+    """
+    assert FastJSONResponse(content).body == JSONResponse(content).body
+
+
+@pytest.mark.parametrize("value", [
+    date(1990, 1, 1),
+    datetime(2025, 12, 10, 9, 30),
+    datetime(2025, 12, 10, 9, 30, 15, 123456),
+    datetime(2025, 12, 10, 9, 30, tzinfo=timezone.utc),
+    Decimal("12"),
+    Decimal("12.50"),
+])
+def test_render_native_types(value):
+    """
+    Dates, datetimes and Decimals are encoded like jsonable_encoder does.
+    """
+    content = {"value": value, "items": [value]}
+    assert FastJSONResponse(content).body == JSONResponse(jsonable_encoder(content)).body
+
+
+@pytest.mark.parametrize("value", [0.5, 1e16, 0.1 + 0.2, 1e-7])
+def test_render_floats_equivalent(value):
+    """
+    Floats decode to the same value as JSONResponse, spelling aside.
+    """
+    assert json.loads(FastJSONResponse({"value": value}).body) == json.loads(JSONResponse({"value": value}).body)
+
+
+def test_render_float_spelling():
+    """
+    orjson drops the exponent's leading zero that json.dumps writes.
+    """
+    assert FastJSONResponse(1e-7).body == b"1e-7"
+    assert JSONResponse(1e-7).body == b"1e-07"
+
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf")])
+def test_render_non_finite_floats(value):
+    """
+    NaN and infinities render as null, where JSONResponse refuses them.
+    """
+    assert FastJSONResponse({"value": value}).body == b'{"value":null}'
+    with pytest.raises(ValueError):
+        JSONResponse({"value": value})
+
+
+# ---------------------------
+# ROW SERIALIZER
+# ---------------------------
+def test_row_serializer_matches_model_dump():
+    """
+    RowSerializer output equals the model's own JSON dump, aliases included.
+    """
+    row = {"username": "pacient1", "name": "Pacient", "birthdate": date(1990, 1, 1)}
+    expected = Patient(**row).model_dump_json(by_alias=True).encode()
+    serializer = RowSerializer(Patient)
+    assert serializer.dump_one(row) == expected
+    assert serializer.dump_many([row, row]) == b"[" + expected + b"," + expected + b"]"
+
+
+def test_row_serializer_dates():
+    """
+    Dates are written in ISO 8601, as FastAPI does.
+    """
+    row = {"id_appointment": 1, "appointment_date": datetime(2025, 12, 10, 9, 30), "duration_minutes": 30,
+           "status": "scheduled", "reason": "Routine check", "patient_id": "p", "doctor_id": "d"}
+    assert b'"appointment_date":"2025-12-10T09:30:00"' in RowSerializer(Appointment).dump_one(row)
@@ -3,10 +3,16 @@
 # Tests for Filebase/MinIO storage client
 # -----------------------------
 # This module tests the MinIO client connection and ensures that
-# the expected bucket exists.
+# the expected bucket exists, and that AsyncStorage runs the client
+# calls off the event loop.
 # -----------------------------
 
-from storage import client
+import io
+import threading
+
+import pytest
+
+from storage import AsyncStorage, client
 
 
 def test_list():
@@ -16,4 +22,44 @@ def test_list():
     """
     buckets = client.list_buckets()
     bucket_names = [bucket.name for bucket in buckets]
-    assert "dawbio2-test" in bucket_names, f"Bucket 'dawbio2-test' not found. Available buckets: {bucket_names}"
\ No newline at end of file
+    assert "dawbio2-test" in bucket_names, f"Bucket 'dawbio2-test' not found. Available buckets: {bucket_names}"
+
+class FakeMinio:
+    """Stand-in for the MinIO client recording the thread of every call."""
+
+    def __init__(self):
+        self.threads = []
+
+    def put_object(self, bucket_name, object_name, data, length, part_size):
+        self.threads.append(threading.current_thread())
+        return ("etag", bucket_name, object_name, data.read(), length, part_size)
+
+    def stat_object(self, bucket_name, object_name):
+        self.threads.append(threading.current_thread())
+        if object_name == "missing":
+            raise FileNotFoundError(object_name)
+        return {"bucket": bucket_name, "object": object_name}
+
+
+@pytest.mark.asyncio
+async def test_async_storage_runs_off_event_loop():
+    """Calls run in the storage pool and return what the client returns."""
+    fake = FakeMinio()
+    storage = AsyncStorage(fake, "bucket", max_workers=2)
+
+    result = await storage.put_object("a.txt", io.BytesIO(b"data"), length=4)
+    assert result == ("etag", "bucket", "a.txt", b"data", 4, 10 * 1024 * 1024)
+    assert await storage.stat_object("a.txt") == {"bucket": "bucket", "object": "a.txt"}
+
+    assert len(fake.threads) == 2
+    for thread in fake.threads:
+        assert thread is not threading.current_thread()
+        assert thread.name.startswith("storage")
+
+
+@pytest.mark.asyncio
+async def test_async_storage_propagates_errors():
+    """Exceptions raised by the client reach the caller unchanged."""
+    storage = AsyncStorage(FakeMinio(), "bucket", max_workers=1)
+    with pytest.raises(FileNotFoundError, match="missing"):
+        await storage.stat_object("missing")
@@ -0,0 +1,90 @@
+# test_timing.py
+# -----------------------------
+# Tests for per-request timing and the slow-query log
+# -----------------------------
+# This module checks query fingerprints, the Server-Timing header added by
+# ServerTimingMiddleware and the logging of slow queries, without a
+# database.
+# -----------------------------
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from db import _status_rows, fingerprint, record_query
+from storage import settings
+from timing import RequestTiming, ServerTimingMiddleware, current_timing, timed
+
+
+# ---------------------------
+# QUERY FINGERPRINTS
+# ---------------------------
+def test_fingerprint_normalizes_literals():
+    """Literals and whitespace do not change the fingerprint; placeholders do."""
+    a = fingerprint("SELECT * FROM t1 WHERE id = 5 AND name = 'x'")
+    b = fingerprint("SELECT *  FROM t1\n WHERE id = 42 AND name = 'it''s'")
+    assert a == b
+    assert a[1] == "SELECT * FROM t1 WHERE id = ? AND name = ?"
+    assert fingerprint("SELECT $1::int")[1] == "SELECT $1::int"
+    assert fingerprint("SELECT $1")[0] != fingerprint("SELECT $2")[0]
+
+
+def test_status_rows():
+    """Row counts are read from command statuses."""
+    assert _status_rows("UPDATE 3") == 3
+    assert _status_rows("INSERT 0 1") == 1
+    assert _status_rows("BEGIN") is None
+
+
+# ---------------------------
+# SLOW-QUERY LOG
+# ---------------------------
+@pytest.fixture
+def log_messages():
+    messages = []
+    sink = logger.add(messages.append, level="WARNING", format="{message}")
+    yield messages
+    logger.remove(sink)
+
+
+def test_slow_query_logged_with_route(monkeypatch, log_messages):
+    """Queries over the threshold are logged with the request's route."""
+    monkeypatch.setattr(settings, "slow_query_ms", 100)
+    timing = RequestTiming({"path": "/api/patients"})
+    token = current_timing.set(timing)
+    try:
+        record_query("SELECT 1", 0.01, 1)
+        record_query("SELECT pg_sleep(0.2)", 0.2, 1)
+    finally:
+        current_timing.reset(token)
+    assert timing.queries == 2
+    assert timing.db == pytest.approx(0.21)
+    assert len(log_messages) == 1
+    assert "route=/api/patients" in log_messages[0]
+    assert "SELECT pg_sleep(?)" in log_messages[0]
+
+
+# ---------------------------
+# SERVER-TIMING HEADER
+# ---------------------------
+def test_server_timing_middleware():
+    """Time recorded during the request ends up in its Server-Timing header."""
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        record_query("SELECT 1", 0.002, 1)
+        with timed("storage"):
+            pass
+        return {"ok": True}
+
+    app.add_middleware(ServerTimingMiddleware)
+
+    with TestClient(app) as client:
+        header = client.get("/work").headers["server-timing"]
+
+    metrics = [m.strip().split(";")[0] for m in header.split(",")]
+    assert metrics == ["db", "storage", "total"]
+    assert header.startswith('db;dur=2.0;desc="1 queries"')
+    assert current_timing.get() is None
@@ -10,7 +10,10 @@ from datetime import datetime, timedelta
 import pytest
 import jwt
 
-from users import hash_password, verify_password, create_access_token, decode_access_token
+from users import (
+    hash_password, verify_password, create_access_token, decode_access_token,
+    hash_password_async, verify_password_async, hash_pool,
+)
 from model import UserToken
 from storage import settings
 
@@ -29,6 +32,21 @@ async def test_hash_and_verify_password():
     assert not verify_password("wrongpassword", hashed)
 
 
+@pytest.mark.asyncio
+async def test_hash_and_verify_password_async():
+    """
+    Test hashing and verifying in the thread pool.
+    Ensures results match the synchronous functions and the pool drains.
+    """
+    password = "mysecretpassword"
+    completed = hash_pool.completed
+    hashed = await hash_password_async(password)
+    assert await verify_password_async(password, hashed)
+    assert not await verify_password_async("wrongpassword", hashed)
+    assert hash_pool.completed == completed + 3
+    assert hash_pool.stats()["in_flight"] == 0
+
+
 # ---------------------------
 # JWT CREATION / DECODING
 # ---------------------------
@@ -0,0 +1,134 @@
+"""
+timing.py
+---------
+Per-request timing for Clinic Manager.
+
+ServerTimingMiddleware gives every HTTP request a RequestTiming, stored in a
+context variable so code anywhere below the handler can add to it without
+passing it around:
+
+    - db: time spent in queries and waiting for a pool connection (db.py)
+    - serialise: JSON encoding of rows and responses (serializers.py)
+    - storage: MinIO/Filebase calls (storage.py)
+
+The breakdown is sent back in a ``Server-Timing`` header, which browsers
+show in the network panel next to the request. The header leaves with the
+response start, so work done while a body is streamed (e.g. the NDJSON
+exports) is not included.
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SERVER_TIMING_HEADER = "Server-Timing"
+
+
+class RequestTiming:
+    """
+    Time accumulated by one request, in seconds.
+
+    Attributes:
+        db (float): Time spent running queries.
+        queries (int): Number of queries run.
+        acquire (float): Time spent waiting for a pool connection.
+        serialise (float): Time spent encoding JSON.
+        storage (float): Time spent in object storage calls.
+        start (float): ``perf_counter`` value when the request arrived.
+    """
+
+    __slots__ = ("scope", "db", "queries", "acquire", "serialise", "storage", "start")
+
+    def __init__(self, scope: Optional[Scope] = None):
+        self.scope = scope
+        self.db = 0.0
+        self.queries = 0
+        self.acquire = 0.0
+        self.serialise = 0.0
+        self.storage = 0.0
+        self.start = time.perf_counter()
+
+    @property
+    def route(self) -> str:
+        """Route template of the request (e.g. ``/api/patients/{username}``)."""
+        if self.scope is None:
+            return "-"
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or self.scope.get("path", "-")
+
+    def header(self) -> str:
+        """
+        Format the timings as a ``Server-Timing`` header value.
+
+        Returns:
+            str: e.g. ``db;dur=3.1;desc="4 queries", serialise;dur=0.4, total;dur=5.2``.
+        """
+        metrics = [f'db;dur={(self.db + self.acquire) * 1000:.1f};desc="{self.queries} queries"']
+        if self.acquire:
+            metrics.append(f"db-acquire;dur={self.acquire * 1000:.1f}")
+        if self.serialise:
+            metrics.append(f"serialise;dur={self.serialise * 1000:.1f}")
+        if self.storage:
+            metrics.append(f"storage;dur={self.storage * 1000:.1f}")
+        metrics.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+# Timing of the request being handled, None outside of a request
+current_timing: ContextVar[Optional[RequestTiming]] = ContextVar("current_timing", default=None)
+
+
+class timed:
+    """
+    Context manager adding the time spent in its block to the current request.
+
+    Args:
+        kind (str): RequestTiming attribute to add to ("serialise" or "storage").
+    """
+
+    __slots__ = ("kind", "start")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        timing = current_timing.get()
+        if timing is not None:
+            setattr(timing, self.kind, getattr(timing, self.kind) + time.perf_counter() - self.start)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware timing each HTTP request and adding a Server-Timing header.
+
+    Args:
+        app (ASGIApp): Wrapped application.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming(scope)
+        token = current_timing.set(timing)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(SERVER_TIMING_HEADER, timing.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_timing.reset(token)
@@ -2,13 +2,15 @@
 users.py
 -------
 This module contains user-related utility functions for:
-    - Password hashing and verification using Argon2
+    - Password hashing and verification using Argon2 (off the event loop)
     - JWT creation and validation
     - Database operations for user management
 """
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional
 from loguru import logger
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
@@ -17,6 +19,7 @@ import asyncpg
 from jwt import ExpiredSignatureError, InvalidTokenError
 
 from storage import settings
+from metrics import PASSWORD_HASH, PASSWORD_HASH_IN_FLIGHT, PASSWORD_HASH_QUEUED
 from model import UserToken
 
 # -------------------------------------------------------------------
@@ -54,6 +57,99 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         return False
 
 
+class PasswordHashPool:
+    """
+    Bounded thread pool running Argon2 off the event loop.
+
+    argon2-cffi releases the GIL while hashing, so a few threads are enough
+    to keep login bursts from stalling every other request. At most
+    ``max_workers`` hashes run at once; extra calls wait in the queue.
+
+    Attributes:
+        max_workers (int): Maximum number of concurrent Argon2 computations.
+        in_flight (int): Calls submitted and not finished (running + queued).
+        completed (int): Total number of finished calls.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.in_flight = 0
+        self.completed = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="argon2")
+
+    @property
+    def queued(self) -> int:
+        """Number of calls waiting for a free worker."""
+        return max(0, self.in_flight - self.max_workers)
+
+    async def run(self, func: Callable, *args):
+        """
+        Run a blocking function in the pool and await its result.
+
+        Args:
+            func (Callable): Function to run (hash or verify).
+            *args: Arguments passed to the function.
+
+        Returns:
+            Any: Result of the function.
+        """
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        """
+        Return a snapshot of the pool usage.
+
+        Returns:
+            dict: 'max_workers', 'in_flight', 'queued' and 'completed' counters.
+        """
+        return {
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+        }
+
+
+hash_pool = PasswordHashPool(settings.password_hash_workers)
+PASSWORD_HASH_IN_FLIGHT.set_function(lambda: hash_pool.in_flight)
+PASSWORD_HASH_QUEUED.set_function(lambda: hash_pool.queued)
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Hash a plain password using Argon2 without blocking the event loop.
+
+    Args:
+        password (str): Plain text password.
+
+    Returns:
+        str: Argon2 hashed password.
+    """
+    with PASSWORD_HASH.time(("hash",)):
+        return await hash_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a password against an Argon2 hash without blocking the event loop.
+
+    Args:
+        plain_password (str): Password entered by the user.
+        hashed_password (str): Stored Argon2 hashed password.
+
+    Returns:
+        bool: True if password matches, False otherwise.
+    """
+    with PASSWORD_HASH.time(("verify",)):
+        return await hash_pool.run(verify_password, plain_password, hashed_password)
+
+
 # -------------------------------------------------------------------
 # 2) JWT CREATION
 # -------------------------------------------------------------------
@@ -129,6 +225,33 @@ async def get_user(username: str, pool) -> Optional[dict]:
         )
 
 
+def quote_ident(name: str) -> str:
+    """
+    Quote a Postgres identifier (role name) for safe use in SQL text.
+
+    Args:
+        name (str): Identifier to quote.
+
+    Returns:
+        str: Identifier wrapped in double quotes with inner quotes doubled.
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+async def ensure_user_role(conn: asyncpg.Connection, username: str, role: str) -> None:
+    """
+    Create the per-user Postgres role if missing and grant it the group role.
+
+    Args:
+        conn (asyncpg.Connection): Database connection.
+        username (str): Username, used as the role name.
+        role (str): Group role to grant ('patient', 'doctor', 'admin').
+    """
+    if not await conn.fetchval("SELECT 1 FROM pg_roles WHERE rolname = $1", username):
+        await conn.execute(f"CREATE ROLE {quote_ident(username)} NOLOGIN")
+    await conn.execute(f"GRANT {quote_ident(role)} TO {quote_ident(username)}")
+
+
 async def create_user(username: str, password: str, pool: asyncpg.Pool, role: str):
     """
     Create a new user in the database and set up their Postgres role.
@@ -140,12 +263,12 @@ async def create_user(username: str, password: str, pool: asyncpg.Pool, role: st
         role (str): Role to assign ('patient', 'doctor', 'admin').
 
     Steps:
-        1. Hash the password using Argon2.
+        1. Hash the password using Argon2 (in the hashing thread pool).
         2. Insert user into 'users' table.
         3. Create a corresponding Postgres role (NOLOGIN).
         4. Grant privileges of the given role to the new user.
     """
-    hashed = hash_password(password)
+    hashed = await hash_password_async(password)
 
     async with pool.acquire() as conn:
         async with conn.transaction():
@@ -159,7 +282,7 @@ async def create_user(username: str, password: str, pool: asyncpg.Pool, role: st
             )
 
             # 2) Create ROLE in Postgres (no login)
-            await conn.execute(f'CREATE ROLE "{username}" NOLOGIN')
+            await conn.execute(f"CREATE ROLE {quote_ident(username)} NOLOGIN")
 
             # 3) Grant privileges according to role
-            await conn.execute(f'GRANT {role} TO "{username}"')
\ No newline at end of file
+            await conn.execute(f"GRANT {quote_ident(role)} TO {quote_ident(username)}")
\ No newline at end of file